@@ -0,0 +1,72 @@
+"""Benchmarks for Django Flexible Subscriptions.
+
+    Benchmarks configure their own minimal Django project. By default
+    an in-memory SQLite database is used; set the following environment
+    variables to benchmark against another database:
+
+    * ``DFS_BENCHMARK_ENGINE`` (e.g. ``django.db.backends.postgresql``)
+    * ``DFS_BENCHMARK_NAME``
+    * ``DFS_BENCHMARK_USER``
+    * ``DFS_BENCHMARK_PASSWORD``
+    * ``DFS_BENCHMARK_HOST``
+    * ``DFS_BENCHMARK_PORT``
+"""
+import os
+
+import django
+from django.conf import settings
+
+
+def setup_django():
+    """Configures Django and creates the benchmark database tables."""
+    if settings.configured:
+        return
+
+    settings.configure(
+        DATABASES={
+            'default': {
+                'ENGINE': os.environ.get(
+                    'DFS_BENCHMARK_ENGINE', 'django.db.backends.sqlite3'
+                ),
+                'NAME': os.environ.get('DFS_BENCHMARK_NAME', ':memory:'),
+                'USER': os.environ.get('DFS_BENCHMARK_USER', ''),
+                'PASSWORD': os.environ.get('DFS_BENCHMARK_PASSWORD', ''),
+                'HOST': os.environ.get('DFS_BENCHMARK_HOST', ''),
+                'PORT': os.environ.get('DFS_BENCHMARK_PORT', ''),
+            }
+        },
+        INSTALLED_APPS=[
+            'django.contrib.admin',
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'django.contrib.messages',
+            'django.contrib.sessions',
+            'django.contrib.sites',
+            'subscriptions',
+        ],
+        MIDDLEWARE=[
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.contrib.auth.middleware.AuthenticationMiddleware',
+            'django.contrib.messages.middleware.MessageMiddleware',
+        ],
+        ROOT_URLCONF='subscriptions.urls',
+        TEMPLATES=[
+            {
+                'BACKEND': 'django.template.backends.django.DjangoTemplates',
+                'APP_DIRS': True,
+                'OPTIONS': {
+                    'context_processors': [
+                        'django.contrib.auth.context_processors.auth',
+                        'django.contrib.messages.context_processors.messages',
+                    ],
+                },
+            },
+        ],
+        STATIC_URL='/static/',
+        USE_TZ=True,
+    )
+    django.setup()
+
+    from django.core.management import call_command  # pylint: disable=import-outside-toplevel
+
+    call_command('migrate', verbosity=0)
@@ -0,0 +1,257 @@
+"""Synthetic datasets for the benchmarks.
+
+    All data is created with ``bulk_create`` and a seeded random number
+    generator, so the same arguments always produce the same dataset.
+"""
+import random
+from datetime import timedelta
+from uuid import UUID
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.utils import timezone
+
+from subscriptions import models
+
+
+BULK_BATCH_SIZE = 5000
+
+
+def bulk_create(model, instances):
+    """Creates instances in chunks to limit memory use on large datasets.
+
+        The database backend decides the number of rows per INSERT.
+    """
+    chunk = []
+
+    for instance in instances:
+        chunk.append(instance)
+
+        if len(chunk) == BULK_BATCH_SIZE:
+            model.objects.bulk_create(chunk)
+            chunk = []
+
+    if chunk:
+        model.objects.bulk_create(chunk)
+
+
+def seeded_uuid(generator):
+    """Returns a UUID generated from the provided random generator."""
+    return UUID(int=generator.getrandbits(128), version=4)
+
+
+def create_users(count):
+    """Creates user instances and returns their IDs."""
+    user_model = get_user_model()
+    offset = user_model.objects.count()
+
+    bulk_create(
+        user_model,
+        (
+            user_model(
+                username='benchmark_{}'.format(offset + i),
+                email='benchmark_{}@email.com'.format(offset + i),
+            )
+            for i in range(count)
+        ),
+    )
+
+    return list(
+        user_model.objects.order_by('pk').values_list('pk', flat=True)[offset:]
+    )
+
+
+def create_costs(count, generator):
+    """Creates plans with a group and cost and returns the cost IDs."""
+    costs = []
+
+    for i in range(count):
+        group = Group.objects.create(
+            name='Benchmark Group {}'.format(seeded_uuid(generator))
+        )
+        plan = models.SubscriptionPlan.objects.create(
+            id=seeded_uuid(generator),
+            plan_name='Benchmark Plan {}'.format(i),
+            group=group,
+        )
+        costs.append(models.PlanCost.objects.create(
+            id=seeded_uuid(generator),
+            plan=plan,
+            recurrence_period=1,
+            recurrence_unit=models.MONTH,
+            cost=generator.choice(['4.99', '9.99', '19.99', '99.00']),
+        ).pk)
+
+    return costs
+
+
+def create_tags(count, plan_ids, generator):
+    """Creates tags and assigns 1 to 3 of them to each plan."""
+    bulk_create(
+        models.PlanTag,
+        (models.PlanTag(tag='Benchmark Tag {}'.format(i)) for i in range(count)),
+    )
+    tag_ids = list(
+        models.PlanTag.objects.filter(
+            tag__startswith='Benchmark Tag'
+        ).values_list('pk', flat=True)
+    )
+    through = models.SubscriptionPlan.tags.through
+
+    bulk_create(
+        through,
+        (
+            through(subscriptionplan_id=plan_id, plantag_id=tag_id)
+            for plan_id in plan_ids
+            for tag_id in generator.sample(tag_ids, min(len(tag_ids), generator.randint(1, 3)))
+        ),
+    )
+
+
+def create_plan_list(plan_ids):
+    """Creates an active plan list showing each of the provided plans."""
+    plan_list = models.PlanList.objects.create(
+        title='Benchmark Plans', slug='benchmark-plans', active=True,
+    )
+
+    bulk_create(
+        models.PlanListDetail,
+        (
+            models.PlanListDetail(
+                plan_id=plan_id,
+                plan_list=plan_list,
+                html_content='<p>Benchmark plan {}</p>'.format(order),
+                order=order,
+            )
+            for order, plan_id in enumerate(plan_ids)
+        ),
+    )
+
+    return plan_list
+
+
+def build_subscriptions(count, generator, current, user_ids, cost_ids):
+    """Yields UserSubscription instances in a realistic mix of states."""
+    for _ in range(count):
+        state = generator.random()
+        start = current - timedelta(days=generator.randint(1, 1000))
+        subscription = models.UserSubscription(
+            id=seeded_uuid(generator),
+            user_id=generator.choice(user_ids),
+            subscription_id=generator.choice(cost_ids),
+            date_billing_start=start,
+            date_billing_last=current - timedelta(days=generator.randint(1, 30)),
+            date_billing_next=current + timedelta(days=generator.randint(1, 30)),
+            active=True,
+            cancelled=False,
+        )
+
+        if state < 0.05:
+            # Expired
+            subscription.date_billing_end = current - timedelta(days=1)
+        elif state < 0.10:
+            # New
+            subscription.active = False
+            subscription.date_billing_last = None
+            subscription.date_billing_next = None
+        elif state < 0.20:
+            # Due
+            subscription.date_billing_next = current - timedelta(
+                hours=generator.randint(1, 72)
+            )
+        elif state < 0.40:
+            # Cancelled
+            subscription.active = False
+            subscription.cancelled = True
+            subscription.date_billing_end = start + timedelta(days=30)
+
+        yield subscription
+
+
+def build_transactions(count, generator, current, user_ids, cost_ids):
+    """Yields SubscriptionTransaction instances over the past 3 years."""
+    for _ in range(count):
+        amount = generator.choice(['4.99', '9.99', '19.99', '99.00', '1234.56'])
+
+        yield models.SubscriptionTransaction(
+            id=seeded_uuid(generator),
+            user_id=generator.choice(user_ids),
+            subscription_id=generator.choice(cost_ids),
+            date_transaction=current - timedelta(
+                seconds=generator.randint(0, 3 * 365 * 24 * 60 * 60)
+            ),
+            amount=amount,
+            amount_minor_units=int(amount.replace('.', '')),
+        )
+
+
+def create_subscriptions(count, seed=0, users=None, costs=10):
+    """Creates UserSubscription instances in a realistic mix of states.
+
+        Approximately 5% of the subscriptions are expired, 5% are new
+        and 10% are due for billing. The remainder are active and not
+        due, or cancelled.
+
+        Parameters:
+            count (int): The number of subscriptions to create.
+            seed (int): The seed for the random number generator.
+            users (int): The number of users to spread the
+                subscriptions across (defaults to 1 per 2
+                subscriptions).
+            costs (int): The number of plan costs to create.
+
+        Returns:
+            obj: The datetime the subscription states are relative to.
+    """
+    generator = random.Random(seed)
+    current = timezone.now()
+    user_ids = create_users(users or max(count // 2, 1))
+    cost_ids = create_costs(costs, generator)
+
+    bulk_create(
+        models.UserSubscription,
+        build_subscriptions(count, generator, current, user_ids, cost_ids),
+    )
+
+    return current
+
+
+def create_dataset(users, seed=0, plans=20, tags=10):
+    """Creates a complete dataset for the dashboard and billing benchmarks.
+
+        Each user has 1 subscription and 1 transaction on average.
+        Every plan is tagged and shown on a single active plan list.
+
+        Parameters:
+            users (int): The number of users, subscriptions and
+                transactions to create.
+            seed (int): The seed for the random number generator.
+            plans (int): The number of plans (each with 1 cost) to
+                create.
+            tags (int): The number of tags to create.
+
+        Returns:
+            obj: The datetime the subscription states are relative to.
+    """
+    generator = random.Random(seed)
+    current = timezone.now()
+    user_ids = create_users(users)
+    cost_ids = create_costs(plans, generator)
+    plan_ids = list(
+        models.PlanCost.objects.filter(pk__in=cost_ids).order_by(
+            'plan__plan_name'
+        ).values_list('plan_id', flat=True)
+    )
+
+    create_tags(tags, plan_ids, generator)
+    create_plan_list(plan_ids)
+    bulk_create(
+        models.UserSubscription,
+        build_subscriptions(users, generator, current, user_ids, cost_ids),
+    )
+    bulk_create(
+        models.SubscriptionTransaction,
+        build_transactions(users, generator, current, user_ids, cost_ids),
+    )
+
+    return current
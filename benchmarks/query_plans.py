@@ -0,0 +1,116 @@
+"""Shows the query plans and timings of the billing run batch queries.
+
+    The batch query of each billing run phase (as run by the
+    ``Manager``, continuing from a keyset cursor part way through the
+    phase) is explained and timed with the UserSubscription indexes in
+    place, then again after the indexes are dropped, so the change in
+    plan can be compared.
+
+    Usage:
+        python -m benchmarks.query_plans --rows 1000000
+"""
+import argparse
+import time
+
+from benchmarks import setup_django
+
+
+def build_queries(current):
+    """Returns the billing run batch querysets to benchmark."""
+    # pylint: disable=import-outside-toplevel
+    from subscriptions import models
+    from subscriptions.management.commands._manager import Manager
+
+    manager = Manager()
+    subscriptions = models.UserSubscription.objects.order_by('pk')
+    queries = []
+
+    for phase, field, predicate in manager.get_phase_filters(current):
+        queryset = manager.get_phase_queryset(phase, predicate, current)
+        ordering = (field, 'pk')
+
+        # Continues from the middle of the phase, as later batches do
+        rows = queryset.order_by(*ordering).values_list(*ordering)
+        cursor = rows[rows.count() // 2] if rows.exists() else None
+
+        queries.append(
+            (phase, manager.get_batch_queryset(queryset, ordering, cursor))
+        )
+
+    queries.append((
+        'user active',
+        subscriptions.filter(
+            user_id=subscriptions.values_list('user_id', flat=True)[0],
+            active=True,
+        ),
+    ))
+
+    return queries
+
+
+def analyze(connection):
+    """Refreshes the planner statistics where the database supports it."""
+    if connection.vendor in ('sqlite', 'postgresql'):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+def report(queries, repeat):
+    """Prints the query plan and best timing of each query."""
+    for name, queryset in queries:
+        timings = []
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset.values_list('pk', flat=True))
+            timings.append(time.perf_counter() - start)
+
+        print('--- {} ({:.2f} ms) ---'.format(name, min(timings) * 1000))
+        print(queryset.explain())
+
+
+def main():
+    """Creates the dataset and reports the plans with and without indexes."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--rows', type=int, default=1000000,
+        help='Number of subscriptions to create.',
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='Number of times to time each query.',
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Seed for the dataset random number generator.',
+    )
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection  # pylint: disable=import-outside-toplevel
+
+    from benchmarks.datasets import create_subscriptions  # pylint: disable=import-outside-toplevel
+    from subscriptions import models  # pylint: disable=import-outside-toplevel
+
+    print('Creating {} subscriptions...'.format(args.rows))
+    current = create_subscriptions(args.rows, seed=args.seed)
+    queries = build_queries(current)
+
+    analyze(connection)
+
+    print('\n=== With indexes ===')
+    report(queries, args.repeat)
+
+    with connection.schema_editor() as schema_editor:
+        for index in models.UserSubscription._meta.indexes:  # pylint: disable=protected-access
+            schema_editor.remove_index(models.UserSubscription, index)
+
+    analyze(connection)
+
+    print('\n=== Without indexes ===')
+    report(queries, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""Measures the main code paths against synthetic datasets.
+
+    For each dataset size a complete dataset (users, plans, costs,
+    tags, a plan list, subscriptions and transactions) is created and
+    the following are measured:
+
+    * the dashboard list views,
+    * the ``SubscribeList`` view,
+    * ``Currency.format_currency`` and ``Currency.format_many`` over
+      every transaction amount (a few repeated price points) and over
+      as many distinct amounts,
+    * ``Currency.format_minor_units`` over as many distinct integer
+      amounts,
+    * summing the transaction amounts as decimals and as minor units,
+      and
+    * ``Manager.process_subscriptions`` (rolled back after each run).
+
+    The wall time (best of the repeats), the number of database
+    queries and the peak Python memory allocated are reported for each
+    benchmark.
+
+    Usage:
+        python -m benchmarks.suite --size 10000 --size 100000 --size 1000000
+"""
+import argparse
+import json
+from decimal import Decimal
+import time
+import tracemalloc
+
+from benchmarks import setup_django
+
+
+RESULT_ROW = '{:<32} {:>10} {:>12} {:>10} {:>12}'
+
+
+class QueryCounter():
+    """Database execute wrapper that counts the queries run."""
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+
+        return execute(sql, params, many, context)
+
+
+def measure(func, repeat):
+    """Runs a benchmark and returns its measurements.
+
+        The function is timed ``repeat`` times and the best time is
+        kept. Peak memory is measured in a separate run, as tracing
+        memory allocations slows down execution.
+
+        Parameters:
+            func (func): The benchmark to run.
+            repeat (int): The number of times to time the benchmark.
+
+        Returns:
+            dict: The wall time (in seconds), query count and peak
+                memory (in bytes) of the benchmark.
+    """
+    from django.db import connection  # pylint: disable=import-outside-toplevel
+
+    timings = []
+
+    for _ in range(repeat):
+        counter = QueryCounter()
+
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+
+    try:
+        func()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_time': min(timings),
+        'queries': counter.count,
+        'peak_memory': peak_memory,
+    }
+
+
+def build_benchmarks():
+    """Returns the names and functions of the benchmarks to run."""
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+    from django.db.models import Sum
+    from django.test import Client
+    from django.urls import reverse
+
+    from subscriptions import models
+    from subscriptions.conf import SETTINGS
+    from subscriptions.management.commands._manager import Manager
+
+    admin = get_user_model().objects.create_superuser(
+        username='benchmark_admin', email='admin@email.com', password='password',
+    )
+    client = Client()
+    client.force_login(admin)
+
+    plan_list = models.PlanList.objects.first()
+    amounts = list(
+        models.SubscriptionTransaction.objects.values_list('amount', flat=True)
+    )
+    distinct_amounts = [Decimal(cents) / 100 for cents in range(len(amounts))]
+    distinct_minor_units = list(range(len(amounts)))
+
+    def get_page(url):
+        def get():
+            response = client.get(url)
+
+            if response.status_code != 200:
+                raise RuntimeError(
+                    '{} returned status {}'.format(url, response.status_code)
+                )
+
+        return get
+
+    def format_amounts(values):
+        def format_each():
+            # Each repeat starts with an empty cache, rather than
+            # measuring the values cached by the previous repeat
+            SETTINGS['currency'].cache_clear()
+
+            for value in values:
+                SETTINGS['currency'].format_currency(value)
+
+        return format_each
+
+    def format_many(values):
+        return lambda: SETTINGS['currency'].format_many(values)
+
+    def format_minor_units(values):
+        def format_each():
+            for value in values:
+                SETTINGS['currency'].format_minor_units(value)
+
+        return format_each
+
+    def sum_transactions():
+        SETTINGS['currency'].format_currency(
+            models.SubscriptionTransaction.objects.aggregate(
+                total=Sum('amount')
+            )['total']
+        )
+
+    def sum_transactions_minor_units():
+        SETTINGS['currency'].format_minor_units(
+            models.SubscriptionTransaction.objects.aggregate(
+                total=Sum('amount_minor_units')
+            )['total']
+        )
+
+    def process_subscriptions():
+        with transaction.atomic():
+            Manager().process_subscriptions()
+            transaction.set_rollback(True)
+
+    return [
+        ('subscription list', get_page(reverse('dfs_subscription_list'))),
+        ('subscription list (last page)', get_page(
+            '{}?page=last'.format(reverse('dfs_subscription_list'))
+        )),
+        ('transaction list', get_page(reverse('dfs_transaction_list'))),
+        ('transaction list (last page)', get_page(
+            '{}?page=last'.format(reverse('dfs_transaction_list'))
+        )),
+        ('plan list', get_page(reverse('dfs_plan_list'))),
+        ('tag list', get_page(reverse('dfs_tag_list'))),
+        ('plan list list', get_page(reverse('dfs_plan_list_list'))),
+        ('plan list details', get_page(reverse(
+            'dfs_plan_list_detail_list', kwargs={'plan_list_id': plan_list.pk}
+        ))),
+        ('subscribe list', get_page(reverse('dfs_subscribe_list'))),
+        ('format_currency (repeated)', format_amounts(amounts)),
+        ('format_many (repeated)', format_many(amounts)),
+        ('format_currency (distinct)', format_amounts(distinct_amounts)),
+        ('format_many (distinct)', format_many(distinct_amounts)),
+        ('format_minor_units (distinct)', format_minor_units(distinct_minor_units)),
+        ('revenue sum (decimal)', sum_transactions),
+        ('revenue sum (minor units)', sum_transactions_minor_units),
+        ('process_subscriptions', process_subscriptions),
+    ]
+
+
+def run(size, repeat, seed):
+    """Creates a dataset of the provided size and runs all benchmarks.
+
+        Parameters:
+            size (int): The number of users, subscriptions and
+                transactions to create.
+            repeat (int): The number of times to time each benchmark.
+            seed (int): The seed for the dataset random number
+                generator.
+
+        Returns:
+            list: A dictionary of the measurements of each benchmark.
+    """
+    from django.core.management import call_command  # pylint: disable=import-outside-toplevel
+
+    from benchmarks.datasets import create_dataset  # pylint: disable=import-outside-toplevel
+
+    call_command('flush', interactive=False, verbosity=0)
+    create_dataset(size, seed=seed)
+
+    results = []
+
+    for name, func in build_benchmarks():
+        result = measure(func, repeat)
+        result.update({'name': name, 'size': size})
+        results.append(result)
+
+    return results
+
+
+def main():
+    """Runs the benchmarks for each dataset size and reports the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--size', type=int, action='append', dest='sizes',
+        help='Number of users, subscriptions and transactions to create '
+             '(may be repeated; defaults to 10000).',
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='Number of times to time each benchmark.',
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Seed for the dataset random number generator.',
+    )
+    parser.add_argument(
+        '--json', action='store_true',
+        help='Output the results as JSON.',
+    )
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test.utils import setup_test_environment  # pylint: disable=import-outside-toplevel
+
+    setup_test_environment()
+
+    results = []
+
+    for size in args.sizes or [10000]:
+        if not args.json:
+            print('Creating a dataset of {} users...'.format(size))
+
+        size_results = run(size, args.repeat, args.seed)
+        results.extend(size_results)
+
+        if not args.json:
+            print(RESULT_ROW.format('Benchmark', 'Size', 'Time (ms)', 'Queries', 'Peak (KiB)'))
+
+            for result in size_results:
+                print(RESULT_ROW.format(
+                    result['name'],
+                    result['size'],
+                    '{:.2f}'.format(result['wall_time'] * 1000),
+                    result['queries'],
+                    '{:.1f}'.format(result['peak_memory'] / 1024),
+                ))
+
+            print()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -17,7 +17,7 @@ setup(
     author_email='studybuffalo@gmail.com',
     keywords='Django, subscriptions, recurrent billing',
     platforms=['linux', 'windows'],
-    packages=find_packages(exclude=['sandbox*', 'tests*']),
+    packages=find_packages(exclude=['benchmarks*', 'sandbox*', 'tests*']),
     package_data={
         'subscriptions': [
             'management/commands/*.py',
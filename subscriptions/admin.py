@@ -13,6 +13,7 @@ class PlanCostInline(admin.TabularInline):
         'recurrence_period',
         'recurrence_unit',
         'cost',
+        'currency_locale',
     )
     extra = 0
 
@@ -1,4 +1,5 @@
 """Functions for general package configuration."""
+from functools import lru_cache
 import warnings
 
 from django.conf import settings
@@ -116,6 +117,9 @@ def compile_settings():
     )
     subscribe_view = string_to_module_and_class(subscribe_view_path)
 
+    # Whether dashboard lists are paginated by cursor instead of page
+    keyset_pagination = getattr(settings, 'DFS_KEYSET_PAGINATION', False)
+
     # MANAGEMENT COMMANDS SETTINGS
     # ------------------------------------------------------------------------
     # Get module and class for the Management Command Manager class
@@ -126,13 +130,62 @@ def compile_settings():
     )
     management_manager = string_to_module_and_class(manager_object)
 
+    # METRICS SETTINGS
+    # ------------------------------------------------------------------------
+    # Get module and class to collect metrics with
+    metrics_object = getattr(
+        settings, 'DFS_METRICS_CLASS', 'subscriptions.metrics.Metrics'
+    )
+    metrics = string_to_module_and_class(metrics_object)
+
     return {
         'enable_admin': enable_admin,
         'currency': currency,
         'base_template': base_template,
         'subscribe_view': subscribe_view,
+        'keyset_pagination': keyset_pagination,
         'management_manager': management_manager,
+        'metrics': metrics,
     }
 
 
 SETTINGS = compile_settings()
+
+
+@lru_cache(maxsize=None)
+def _build_currency(currency_locale):
+    """Returns the cached Currency object of a CURRENCY locale."""
+    return Currency(currency_locale)
+
+
+def get_currency(currency_locale=None):
+    """Returns the Currency object for a currency locale.
+
+        Currency objects are immutable once created, so one object is
+        built per locale and shared between all callers, rather than
+        constructing a formatter for each value.
+
+        Parameters:
+            currency_locale (str): A locale from ``CURRENCY``. The
+                ``DFS_CURRENCY`` Currency is returned when blank.
+
+        Returns:
+            obj: The Currency object for the locale.
+
+        Raises:
+            ValueError: The locale is not supported.
+    """
+    if not currency_locale:
+        return SETTINGS['currency']
+
+    currency_locale = currency_locale.lower()
+
+    if currency_locale == SETTINGS['currency'].locale:
+        return SETTINGS['currency']
+
+    if currency_locale not in CURRENCY:
+        raise ValueError(
+            '{} is not a supported currency locale.'.format(currency_locale)
+        )
+
+    return _build_currency(currency_locale)
@@ -1,5 +1,7 @@
 """Module to handle details involving currency formating."""
+from collections import namedtuple
 from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
 
 
 # Convenience values for sign positions
@@ -234,18 +236,81 @@ CURRENCY = {
 }
 
 
+FormatPlan = namedtuple(
+    'FormatPlan',
+    [
+        'quantum', 'frac_digits', 'decimal_point', 'grouping', 'thousands_sep',
+        'translation', 'prefix', 'suffix', 'minor_units_template',
+        'minor_units_divisor', 'minor_units_translation',
+    ],
+)
+FormatPlan.__doc__ = """Precompiled details to format one kind of currency value.
+
+    Attributes:
+        quantum (dec): The exponent to round values to.
+        frac_digits (int): The number of fractional digits shown.
+        decimal_point (str): The decimal separator ('' if the currency
+            has no fractional digits).
+        grouping (int): The number of digits per group.
+        thousands_sep (str): The separator between digit groups.
+        translation (dict): A ``str.translate`` table converting the
+            separators of Python's ``{:,f}`` format to the currency
+            separators (None unless digits are grouped by 3).
+        prefix (str): The symbols and sign before the number.
+        suffix (str): The symbols and sign after the number.
+        minor_units_template (str): A format string for the whole and
+            fractional parts of an integer number of minor units (None
+            unless digits are grouped by 3 and all minor units are
+            shown).
+        minor_units_divisor (int): The number of minor units in a
+            major unit.
+        minor_units_translation (dict): The ``translation`` of the
+            minor units template (None if Python's separators are the
+            currency separators).
+"""
+
+
 class Currency():
     """Defines and outputs formatted currency strings.
 
+        The formatting of local and international, positive and
+        negative values is compiled into a ``FormatPlan`` when the
+        instance is created. ``format_currency`` only reads these
+        plans, so a single instance can be shared between threads.
+
+        Formatted values are kept in a bounded least recently used
+        cache, as most values are one of a few price points. Use
+        ``cache_info`` to see the cache hits and misses.
+
+        Amounts may also be handled as integer minor units (e.g. cents,
+        following ``frac_digits``) with ``to_minor_units``,
+        ``from_minor_units`` and ``format_minor_units``, which formats
+        integers without any Decimal arithmetic.
+
         Parameters:
             currency_locale (str or dict): a currency locale string or
                 a dictionary defining custom currency formating
                 conventions.
+            cache_size (int): the maximum number of formatted values
+                to cache (0 disables the cache).
+
+        Attributes:
+            international (bool): whether the formatting helper
+                methods use the international conventions when not
+                told otherwise. Not used by ``format_currency``.
     """
-    def __init__(self, currency_locale):
+    def __init__(self, currency_locale, cache_size=1024):
         self.international = False
         self.locale = None
         self.conventions = self._assign_currency_conventions(currency_locale)
+        self.plans = {
+            (international, negative_value): self._compile_plan(
+                international, negative_value
+            )
+            for international in (False, True)
+            for negative_value in (False, True)
+        }
+        self._format_cached = lru_cache(maxsize=cache_size)(self._format_value_with_plan)
 
     def _assign_currency_conventions(self, currency_locale):
         """Assigns currency conventions based on specified locale.
@@ -288,29 +353,83 @@ class Currency():
 
         return CURRENCY[self.locale]
 
-    def _determine_frac_digits(self):
+    def _compile_plan(self, international, negative_value):
+        """Compiles the formatting details for one kind of value.
+
+            Parameters:
+                international (bool): whether to follow international
+                    formatting or not.
+                negative_value (bool): whether the plan is for
+                    negative values or not.
+
+            Returns:
+                obj: a FormatPlan instance.
+        """
+        digits = self._determine_frac_digits(international)
+        decimal_point = str(self.conventions['mon_decimal_point']) if digits > 0 else ''
+        thousands_sep = str(self.conventions['mon_thousands_sep'])
+        prefix, suffix = self._determine_affixes(negative_value, international)
+
+        # Python's own grouping is used for the common 3 digit groups
+        if self.conventions['mon_grouping'] == 3:
+            translation = str.maketrans({',': thousands_sep, '.': decimal_point})
+        else:
+            translation = None
+
+        # Minor units are formatted in one call when they need no rounding
+        if translation is not None and digits == self.conventions['frac_digits']:
+            minor_units_template = '{{:,d}}.{{:0{}d}}'.format(digits) if digits else '{:,d}'
+        else:
+            minor_units_template = None
+
+        if thousands_sep == ',' and decimal_point in ('.', ''):
+            minor_units_translation = None
+        else:
+            minor_units_translation = translation
+
+        return FormatPlan(
+            quantum=Decimal(10) ** -digits,
+            frac_digits=digits,
+            decimal_point=decimal_point,
+            grouping=self.conventions['mon_grouping'],
+            thousands_sep=thousands_sep,
+            translation=translation,
+            prefix=prefix,
+            suffix=suffix,
+            minor_units_template=minor_units_template,
+            minor_units_divisor=10 ** digits,
+            minor_units_translation=minor_units_translation,
+        )
+
+    def _determine_frac_digits(self, international=None):
         """Determines number of fractional digits to round to.
 
+            Parameters:
+                international (bool): whether to follow international
+                    formatting (defaults to ``self.international``).
+
             Returns:
                 int: the number of fractional digits for currency display.
         """
-        if self.international:
+        if self.international if international is None else international:
             return self.conventions['int_frac_digits']
 
         return self.conventions['frac_digits']
 
-    def _split_value(self, value):
+    def _split_value(self, value, international=None):
         """Splits provided value into whole and fractional parts.
 
             Parameters:
                 value (dec): the value to split into components.
+                international (bool): whether to follow international
+                    formatting (defaults to ``self.international``).
 
             Returns:
                 tuple: the whole number and fractional number
                     components as strings.
         """
         # Determine number of fractional digits to use for this value
-        digits = self._determine_frac_digits()
+        digits = self._determine_frac_digits(international)
 
         # Round to required number of digits:
         #   - uses ROUND_HALF_UP, to give the most intuitive result to a
@@ -349,17 +468,19 @@ class Currency():
 
         return grouped_num_whole
 
-    def _format_value(self, num_whole, num_frac):
+    def _format_value(self, num_whole, num_frac, international=None):
         """Returns formatted value with appropriate decimal seperator.
 
             Parameters:
                 num_whole (str): the whole number portion of the value.
                 num_frac (str): the fractional portion of the value.
+                international (bool): whether to follow international
+                    formatting (defaults to ``self.international``).
 
             Returns:
                 str: combined value, separated by the decimal separator.
         """
-        frac_digits = self._determine_frac_digits()
+        frac_digits = self._determine_frac_digits(international)
 
         # Determines decimal separator (only required if currency uses fractions)
         if frac_digits > 0:
@@ -372,18 +493,20 @@ class Currency():
             num_whole, dec_separator, num_frac
         )
 
-    def _determine_symbol_details(self, negative_value):
+    def _determine_symbol_details(self, negative_value, international=None):
         """Determines positioning of required symbols.
 
             Parameters:
                 negative_value (bool): whether this is a negative
                     value or not.
+                international (bool): whether to follow international
+                    formatting (defaults to ``self.international``).
 
             Returns:
                 obj: Currency symbol and positioning details.
         """
         # Determine which symbol to use
-        if self.international:
+        if self.international if international is None else international:
             symbol = self.conventions['int_curr_symbol']
         else:
             symbol = self.conventions['currency_symbol']
@@ -407,57 +530,141 @@ class Currency():
             'sign_position': self.conventions['p_sign_posn'],
         }
 
-    def add_symbols(self, value, negative_value):
-        """Adds currency and positive/negative symbols to the value.
+    def _determine_affixes(self, negative_value, international=None):
+        """Determines the text placed before and after the number.
 
             Parameters:
-                value (str): the formatted value to add
-                    symbols to.
                 negative_value (bool): whether this is a negative
                     value or not.
+                international (bool): whether to follow international
+                    formatting (defaults to ``self.international``).
 
             Returns:
-                str: the final value formatted as a currency value.
+                tuple: the prefix and suffix strings.
         """
-        # '<' and '>' are used as markers of number start and end
-        placeholder_value = '<{}>'.format(value)
-
-        # Determine details of additional formatting
-        symbol = self._determine_symbol_details(negative_value)
+        symbol = self._determine_symbol_details(negative_value, international)
 
         if symbol['precedes']:
-            placeholder_value = '{}{}{}'.format(
-                symbol['symbol'], symbol['separated'], placeholder_value
-            )
+            prefix = '{}{}'.format(symbol['symbol'], symbol['separated'])
+            suffix = ''
         else:
-            placeholder_value = '{}{}{}'.format(
-                placeholder_value, symbol['separated'], symbol['symbol']
-            )
+            prefix = ''
+            suffix = '{}{}'.format(symbol['separated'], symbol['symbol'])
 
         # Insert the proper sign for positive/negative values
         if symbol['sign_position'] == 0:
-            placeholder_value = '({})'.format(placeholder_value)
+            prefix, suffix = '({}'.format(prefix), '{})'.format(suffix)
         elif symbol['sign_position'] == 1:
-            placeholder_value = '{}{}'.format(symbol['sign'], placeholder_value)
+            prefix = '{}{}'.format(symbol['sign'], prefix)
         elif symbol['sign_position'] == 2:
-            placeholder_value = '{}{}'.format(placeholder_value, symbol['sign'])
+            suffix = '{}{}'.format(suffix, symbol['sign'])
         elif symbol['sign_position'] == 3:
-            placeholder_value = placeholder_value.replace('<', symbol['sign'])
+            prefix = '{}{}'.format(prefix, symbol['sign'])
         elif symbol['sign_position'] == 4:
-            placeholder_value = placeholder_value.replace('>', symbol['sign'])
+            suffix = '{}{}'.format(symbol['sign'], suffix)
         else:
-            placeholder_value = '{}{}'.format(symbol['sign'], placeholder_value)
+            prefix = '{}{}'.format(symbol['sign'], prefix)
+
+        return prefix, suffix
 
-        # Remove the placeholders for number start/end
-        formatted_currency = (
-            placeholder_value.replace('<', '').replace('>', '')
+    def add_symbols(self, value, negative_value, international=None):
+        """Adds currency and positive/negative symbols to the value.
+
+            Parameters:
+                value (str): the formatted value to add
+                    symbols to.
+                negative_value (bool): whether this is a negative
+                    value or not.
+                international (bool): whether to follow international
+                    formatting (defaults to ``self.international``).
+
+            Returns:
+                str: the final value formatted as a currency value.
+        """
+        prefix, suffix = self._determine_affixes(negative_value, international)
+
+        return '{}{}{}'.format(prefix, value, suffix)
+
+    @staticmethod
+    def _apply_plan(plan, value):
+        """Formats an absolute value with a plan.
+
+            Parameters:
+                plan (obj): the FormatPlan for the kind of value.
+                value (dec): the value to format.
+
+            Returns:
+                str: The formatted currency value.
+        """
+        # Round with ROUND_HALF_UP, to give the most intuitive result
+        # to a typical user; signs are added by the plan
+        value = abs(value).quantize(plan.quantum, rounding=ROUND_HALF_UP)
+
+        if plan.translation is not None:
+            return ''.join((
+                plan.prefix,
+                '{:,f}'.format(value).translate(plan.translation),
+                plan.suffix,
+            ))
+
+        num_whole, _, num_frac = '{:f}'.format(value).partition('.')
+
+        return ''.join((
+            plan.prefix,
+            Currency._group_digits(plan, num_whole),
+            plan.decimal_point,
+            num_frac,
+            plan.suffix,
+        ))
+
+    @staticmethod
+    def _group_digits(plan, num_whole):
+        """Groups the digits of a whole number with a plan.
+
+            Parameters:
+                plan (obj): the FormatPlan for the kind of value.
+                num_whole (str): the whole number portion of the value.
+
+            Returns:
+                str: the whole number with the grouping applied.
+        """
+        grouping = plan.grouping
+
+        if not grouping or len(num_whole) <= grouping:
+            return num_whole
+
+        first = len(num_whole) % grouping or grouping
+
+        return plan.thousands_sep.join(
+            [num_whole[:first]] + [
+                num_whole[index:index + grouping]
+                for index in range(first, len(num_whole), grouping)
+            ]
         )
 
-        return formatted_currency
+    def _format_value_with_plan(self, value, international):
+        """Formats a value with the plan for its kind of value.
+
+            Parameters:
+                value (dec): The decimal to represent as a currency.
+                international (bool): Whether this should follow
+                    international formatting or not.
+
+            Returns:
+                str: The formatted currency value.
+        """
+        if not isinstance(value, Decimal):
+            value = Decimal(value)
+
+        return self._apply_plan(self.plans[international, value < 0], value)
 
     def format_currency(self, value, international=False):
         """Returns the provided value in the proper currency format.
 
+            Uses the precompiled plan for the kind of value and does
+            not modify the instance, so it is safe to call from
+            multiple threads. Results are cached per value.
+
             Parameters:
                 value (dec): The decimal to represent as a currency.
                 international (bool): Whether this should follow
@@ -466,22 +673,145 @@ class Currency():
             Returns:
                 str: The formatted currency value.
         """
-        # Assign international status for currency format
-        self.international = international
+        return self._format_cached(value, bool(international))
+
+    def cache_info(self):
+        """Returns the statistics of the formatted value cache.
+
+            Returns:
+                obj: A named tuple of the cache ``hits``, ``misses``,
+                    ``maxsize`` and ``currsize``.
+        """
+        return self._format_cached.cache_info()
+
+    def cache_clear(self):
+        """Clears the formatted value cache and its statistics."""
+        self._format_cached.cache_clear()
+
+    def format_many(self, values, international=False):
+        """Returns the provided values in the proper currency format.
+
+            Formats a whole column of values in one call. The plans are
+            looked up once and each distinct value is only formatted
+            once, which suits the few price points of most columns.
+
+            Parameters:
+                values (iterable): The decimals to represent as
+                    currencies.
+                international (bool): Whether these should follow
+                    international formatting or not.
+
+            Returns:
+                list: The formatted currency values, in order.
+        """
+        positive_plan = self.plans[bool(international), False]
+        negative_plan = self.plans[bool(international), True]
+        apply_plan = self._apply_plan
+        formatted_values = {}
+        get_formatted = formatted_values.get
+        results = []
+        append = results.append
 
-        # Convert value to decimal for future operations
-        value = Decimal(value)
+        for value in values:
+            if not isinstance(value, Decimal):
+                value = Decimal(value)
 
-        # Split value into whole and fractional parts
-        num_whole, num_frac = self._split_value(value)
+            formatted = get_formatted(value)
 
-        # Apply any grouping to the whole number component
-        grouped_num_whole = self._group_whole_num(num_whole)
+            if formatted is None:
+                formatted = apply_plan(
+                    negative_plan if value < 0 else positive_plan, value
+                )
+                formatted_values[value] = formatted
 
-        # Rejoin whole and fractional numbers with decimal separator
-        formatted_value = self._format_value(grouped_num_whole, num_frac)
+            append(formatted)
 
-        # Add currency and positive/negative symbols
-        formatted_currency = self.add_symbols(formatted_value, bool(value < 0))
+        return results
+
+    def to_minor_units(self, value):
+        """Returns a value as an integer number of minor units.
+
+            Minor units are the smallest units of the currency (e.g.
+            cents), following the ``frac_digits`` convention. Values
+            with more fractional digits are rounded with
+            ROUND_HALF_UP, as they are when formatted.
+
+            Parameters:
+                value (dec): The decimal to convert.
+
+            Returns:
+                int: The number of minor units.
+        """
+        if not isinstance(value, Decimal):
+            value = Decimal(value)
+
+        return int(
+            value.scaleb(self.conventions['frac_digits']).quantize(
+                Decimal(1), rounding=ROUND_HALF_UP,
+            )
+        )
+
+    def from_minor_units(self, value):
+        """Returns an integer number of minor units as a decimal.
+
+            Parameters:
+                value (int): The number of minor units.
+
+            Returns:
+                dec: The value in major units (e.g. dollars).
+        """
+        return Decimal(value).scaleb(-self.conventions['frac_digits'])
+
+    def format_minor_units(self, value, international=False):
+        """Returns an integer number of minor units in currency format.
+
+            The value is split with integer arithmetic, so sums of
+            minor unit amounts can be formatted without creating
+            Decimal objects. Digits grouped by 3 are formatted with the
+            precompiled ``minor_units_template`` of the plan. The
+            result matches ``format_currency`` of the same amount.
+
+            Parameters:
+                value (int): The number of minor units (e.g. cents).
+                international (bool): Whether this should follow
+                    international formatting or not.
+
+            Returns:
+                str: The formatted currency value.
+        """
+        plan = self.plans[bool(international), value < 0]
+        value = abs(value)
+
+        if plan.minor_units_template is not None:
+            formatted = plan.minor_units_template.format(
+                *divmod(value, plan.minor_units_divisor)
+            )
+
+            if plan.minor_units_translation is not None:
+                formatted = formatted.translate(plan.minor_units_translation)
+
+            return ''.join((plan.prefix, formatted, plan.suffix))
+
+        shift = self.conventions['frac_digits'] - plan.frac_digits
+
+        # Rounds with ROUND_HALF_UP when fewer digits are displayed
+        # than are stored (e.g. international formatting)
+        if shift > 0:
+            value = (value + 5 * 10 ** (shift - 1)) // 10 ** shift
+        elif shift < 0:
+            value *= 10 ** -shift
+
+        if plan.frac_digits:
+            num_whole, num_frac = divmod(value, 10 ** plan.frac_digits)
+            num_frac = '{:0{}d}'.format(num_frac, plan.frac_digits)
+        else:
+            num_whole, num_frac = value, ''
+
+        if plan.translation is not None:
+            num_whole = '{:,d}'.format(num_whole).translate(plan.translation)
+        else:
+            num_whole = self._group_digits(plan, str(num_whole))
 
-        return formatted_currency
+        return ''.join((
+            plan.prefix, num_whole, plan.decimal_point, num_frac, plan.suffix
+        ))
@@ -5,7 +5,7 @@ from django.core import validators
 from django.forms import ModelForm
 from django.utils import timezone
 
-from subscriptions.conf import SETTINGS
+from subscriptions.conf import get_currency
 from subscriptions.models import SubscriptionPlan, PlanCost
 
 
@@ -33,7 +33,7 @@ class PlanCostForm(ModelForm):
     """Form to use with inlineformset_factory and SubscriptionPlanForm."""
     class Meta:
         model = PlanCost
-        fields = ['recurrence_period', 'recurrence_unit', 'cost']
+        fields = ['recurrence_period', 'recurrence_unit', 'cost', 'currency_locale']
 
 
 class PaymentForm(forms.Form):
@@ -151,7 +151,7 @@ class SubscriptionPlanCostForm(forms.Form):
 
         for cost in costs:
             radio_text = '{} {}'.format(
-                SETTINGS['currency'].format_currency(cost.cost),
+                get_currency(cost.currency_locale).format_currency(cost.cost),
                 cost.display_billing_frequency_text
             )
             PLAN_COST_CHOICES.append((cost.id, radio_text))
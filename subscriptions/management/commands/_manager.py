@@ -1,43 +1,860 @@
 """Utility/helper functions for Django Flexible Subscriptions."""
-from django.db.models import Q
+import asyncio
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Count, F, Min, Q
 from django.utils import timezone
 
-from subscriptions import models
+from subscriptions import metrics, models, recurrence
+
+
+# Policies for subscriptions that missed more than one billing period
+# ----------------------------------------------------------------------------
+CATCH_UP_ALL = 'all'
+CATCH_UP_LATEST = 'latest'
+CATCH_UP_SKIP = 'skip'
+CATCH_UP_CHOICES = (CATCH_UP_ALL, CATCH_UP_LATEST, CATCH_UP_SKIP)
+
+
+def percentile(values, percent):
+    """Returns the nearest-rank percentile of the provided values.
+
+        Parameters:
+            values (list): The values to calculate the percentile of.
+            percent (float): The percentile to return (0 - 100).
+
+        Returns:
+            float: The percentile value, or None if there are no values.
+    """
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+
+    return ordered[rank - 1]
+
+
+class PhaseStats():
+    """Performance statistics for one phase of a billing run.
+
+        Attributes:
+            phase (str): The billing run phase.
+            scanned (int): The number of subscriptions retrieved.
+            processed (int): The number of subscriptions expired,
+                activated or renewed.
+            payment_successes (int): The number of accepted payments.
+            payment_failures (int): The number of declined payments.
+            payment_latencies (list): The seconds taken by a uniform
+                sample of at most ``latency_sample_size``
+                ``process_payment`` calls, used to estimate the latency
+                percentiles.
+            queries (int): The number of database queries made.
+            wall_time (float): The seconds taken by the phase.
+    """
+    latency_sample_size = 1000
+
+    def __init__(self, phase):
+        self.phase = phase
+        self.scanned = 0
+        self.processed = 0
+        self.payment_successes = 0
+        self.payment_failures = 0
+        self.payment_latencies = []
+        self.queries = 0
+        self.wall_time = 0.0
+        self._latency_count = 0
+        self._latency_lock = threading.Lock()
+        self._random = random.Random()
+
+    def record_payment_latency(self, seconds):
+        """Adds the duration of a payment to the latency sample.
+
+            Keeps a reservoir sample so memory use does not grow with
+            the number of payments. Safe to call from payment threads.
+
+            Parameters:
+                seconds (float): The seconds the payment took.
+        """
+        with self._latency_lock:
+            self._latency_count += 1
+
+            if len(self.payment_latencies) < self.latency_sample_size:
+                self.payment_latencies.append(seconds)
+                return
+
+            index = self._random.randrange(self._latency_count)
+
+            if index < self.latency_sample_size:
+                self.payment_latencies[index] = seconds
+
+    def as_dict(self):
+        """Returns the statistics as a JSON serializable dictionary."""
+        return {
+            'phase': self.phase,
+            'scanned': self.scanned,
+            'processed': self.processed,
+            'payment_successes': self.payment_successes,
+            'payment_failures': self.payment_failures,
+            'payment_latency': {
+                'p50': percentile(self.payment_latencies, 50),
+                'p90': percentile(self.payment_latencies, 90),
+                'p99': percentile(self.payment_latencies, 99),
+            },
+            'queries': self.queries,
+            'wall_time': self.wall_time,
+        }
+
+
+class BillingStats():
+    """Performance statistics for a billing run.
+
+        Attributes:
+            phases (list): PhaseStats instances for each processed phase.
+            wall_time (float): The seconds taken by the billing run.
+    """
+    def __init__(self):
+        self.phases = []
+        self.wall_time = 0.0
+
+    def as_dict(self):
+        """Returns the statistics as a JSON serializable dictionary."""
+        return {
+            'phases': [phase.as_dict() for phase in self.phases],
+            'wall_time': self.wall_time,
+        }
 
 
 class Manager():
-    """Manager object to help manage subscriptions & billing."""
+    """Manager object to help manage subscriptions & billing.
 
-    def process_subscriptions(self):
-        """Calls all required subscription processing functions."""
-        current = timezone.now()
+        Attributes:
+            batch_size (int): The number of UserSubscription instances
+                to retrieve from the database at once while processing
+                subscriptions.
+            worker_id (str): An identifier for this billing worker. When
+                provided, each batch is claimed before processing so
+                that multiple workers can safely run at the same time.
+            lease_duration (obj): A timedelta of how long a worker lease
+                on a batch lasts when row locking is not supported by
+                the database.
+            payment_workers (int): The maximum number of payments to
+                process at the same time for a batch. Payments are
+                processed one at a time unless this is greater than 1
+                or ``process_payment`` is a coroutine function.
+            catch_up (str): How to bill due subscriptions that missed
+                more than one billing period. ``None`` bills one period
+                per run; ``'all'`` charges every missed period,
+                ``'latest'`` charges only the latest period and
+                ``'skip'`` charges none of them. The next billing date
+                is then advanced past all missed periods at once.
+            catch_up_limit (int): The maximum number of billing periods
+                to handle per subscription in one run when ``catch_up``
+                is set.
+            stop_event (obj): A ``threading.Event`` that stops
+                processing after the current batch once set. The
+                billing run is left incomplete so it can be resumed.
+            stats (obj): A BillingStats instance for the last call to
+                ``process_subscriptions``.
+            phase_stats (obj): The PhaseStats instance of the phase
+                being processed.
+            metrics (obj): The Metrics instance to emit metrics to
+                (defaults to the ``DFS_METRICS_CLASS`` instance).
+    """
+    batch_size = 1000
+    worker_id = None
+    lease_duration = timedelta(hours=1)
+    payment_workers = 1
+    catch_up = None
+    catch_up_limit = 100
+    stop_event = None
+    stats = None
+    phase_stats = None
+
+    def __init__(self, **kwargs):
+        """Assigns any provided keyword arguments as attributes."""
+        self.metrics = metrics.get_metrics()
+
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def process_subscriptions(self, billing_run=None, attempted_after=None):
+        """Calls all required subscription processing functions.
+
+            Progress is recorded in a BillingRun instance after each
+            batch so that an interrupted run can be resumed. Runs with
+            a ``worker_id`` only record the number of subscriptions
+            processed, as other workers process the rows in between
+            and the run cannot be resumed.
+
+            Parameters:
+                billing_run (obj): An incomplete BillingRun instance to
+                    resume processing from (a new BillingRun is
+                    created if not provided).
+                attempted_after (datetime): If provided, new and due
+                    subscriptions an earlier run attempted to bill
+                    after this datetime are skipped while they are
+                    still due (e.g. after a declined payment).
+
+            Returns:
+                obj: The completed BillingRun instance.
+        """
+        if billing_run is None:
+            billing_run = models.BillingRun.objects.create(
+                date_started=timezone.now(), worker_id=self.worker_id
+            )
+
+        # Resumed runs use the original start to select the same rows
+        current = billing_run.date_started
+
+        process_batch_methods = {
+            # Handle expired subscriptions
+            models.PHASE_EXPIRED: self.get_process_batch('process_expired'),
+            # Handle new subscriptions
+            models.PHASE_NEW: self.get_process_batch('process_new'),
+            # Handle subscriptions with billing due
+            models.PHASE_DUE: self.get_process_batch('process_due'),
+        }
+        phases = [
+            (
+                phase,
+                self.get_phase_queryset(phase, predicate, current),
+                (field, 'pk'),
+                process_batch_methods[phase],
+            )
+            for phase, field, predicate in self.get_phase_filters(current, attempted_after)
+        ]
+        phase_order = [phase for phase, _, _, _ in phases]
+        self.stats = BillingStats()
+        run_start = time.perf_counter()
+
+        try:
+            for phase, queryset, ordering, process_batch in phases:
+                # Skip any phases completed before the run was interrupted
+                if phase_order.index(phase) < phase_order.index(billing_run.phase):
+                    continue
+
+                self.phase_stats = PhaseStats(phase)
+                self.stats.phases.append(self.phase_stats)
+                phase_start = time.perf_counter()
+
+                with connections[queryset.db].execute_wrapper(self.count_query):
+                    if billing_run.phase != phase:
+                        billing_run.phase = phase
+                        billing_run.last_processed_id = None
+                        billing_run.last_processed_date = None
+                        billing_run.save(update_fields=[
+                            'phase', 'last_processed_id', 'last_processed_date',
+                        ])
+
+                    self.process_batches(queryset, process_batch, billing_run, ordering)
+
+                self.phase_stats.wall_time = time.perf_counter() - phase_start
+                self.emit_phase_metrics(self.phase_stats)
+
+                if self.stopping:
+                    return billing_run
+
+            billing_run.date_completed = timezone.now()
+            billing_run.save(update_fields=['date_completed'])
+        finally:
+            self.phase_stats = None
+            self.stats.wall_time = time.perf_counter() - run_start
+
+        return billing_run
 
-        # Handle expired subscriptions
-        expired_subscriptions = models.UserSubscription.objects.filter(
-            Q(active=True) & Q(cancelled=False)
-            & Q(date_billing_end__lte=current)
+    def get_process_batch(self, name):
+        """Returns the method processing the batches of a phase.
+
+            If a subclass overrides the single subscription method of
+            the phase (``process_expired``, ``process_new`` or
+            ``process_due``), it is called for each subscription of a
+            batch instead of the batch method. New and due
+            subscriptions are then marked as attempted with one update
+            per batch.
+
+            Parameters:
+                name (str): The name of the single subscription method.
+
+            Returns:
+                callable: A method accepting a list of UserSubscription
+                    instances.
+        """
+        if getattr(type(self), name) is getattr(Manager, name):
+            return getattr(self, '{}_batch'.format(name))
+
+        process_subscription = getattr(self, name)
+
+        def process_batch(subscriptions):
+            for subscription in subscriptions:
+                process_subscription(subscription)
+
+            if name != 'process_expired':
+                models.UserSubscription.objects.filter(
+                    pk__in=[subscription.pk for subscription in subscriptions]
+                ).update(date_billing_attempt=timezone.now())
+
+        return process_batch
+
+    def emit_phase_metrics(self, phase_stats):
+        """Emits the metrics of a completed billing run phase.
+
+            Parameters:
+                phase_stats (obj): The PhaseStats instance of the phase.
+        """
+        labels = {'phase': phase_stats.phase}
+        self.metrics.observe(metrics.BILLING_PHASE_DURATION, phase_stats.wall_time, labels)
+        self.metrics.increment(metrics.BILLING_SCANNED, phase_stats.scanned, labels)
+        self.metrics.increment(metrics.BILLING_PROCESSED, phase_stats.processed, labels)
+
+    def count_query(self, execute, sql, params, many, context):
+        """Database execute wrapper counting the queries of a phase."""
+        if self.phase_stats is not None:
+            self.phase_stats.queries += 1
+
+        return execute(sql, params, many, context)
+
+    def record_stats(self, **counts):
+        """Adds the provided counts to the current PhaseStats.
+
+            Parameters:
+                **counts: Amounts to add, keyed by PhaseStats attribute.
+        """
+        if self.phase_stats is None:
+            return
+
+        for name, count in counts.items():
+            setattr(self.phase_stats, name, getattr(self.phase_stats, name) + count)
+
+    @staticmethod
+    def get_phase_filters(current, attempted_after=None):
+        """Returns the filters selecting the subscriptions of each phase.
+
+            Each filter is supported by a composite index on
+            UserSubscription.
+
+            Parameters:
+                current (datetime): The datetime subscriptions are
+                    processed up to.
+                attempted_after (datetime): If provided, new and due
+                    subscriptions awaiting a retry of a billing attempt
+                    made after this datetime are not selected.
+
+            Returns:
+                list: Tuples of the billing run phase, the date field
+                    the phase compares and the Q object filter, in
+                    processing order.
+        """
+        new_filter = Q(active=False) & Q(cancelled=False) & Q(date_billing_start__lte=current)
+        due_filter = Q(active=True) & Q(cancelled=False) & Q(date_billing_next__lte=current)
+
+        if attempted_after is not None:
+            new_filter &= ~Manager.get_retry_filter('date_billing_start', attempted_after)
+            due_filter &= ~Manager.get_retry_filter('date_billing_next', attempted_after)
+
+        return [
+            (
+                models.PHASE_EXPIRED,
+                'date_billing_end',
+                Q(active=True) & Q(cancelled=False) & Q(date_billing_end__lte=current),
+            ),
+            (models.PHASE_NEW, 'date_billing_start', new_filter),
+            (models.PHASE_DUE, 'date_billing_next', due_filter),
+        ]
+
+    @staticmethod
+    def get_retry_filter(field, attempted_after):
+        """Returns the filter selecting subscriptions awaiting a retry.
+
+            A subscription awaits a retry when it was attempted after
+            ``attempted_after`` and the attempt did not move its billing
+            date past the attempt (e.g. a declined payment).
+            Subscriptions that were never attempted are not selected.
+
+            Parameters:
+                field (str): The billing date field of the phase.
+                attempted_after (datetime): The earliest billing attempt
+                    to select.
+
+            Returns:
+                obj: A Q object filter.
+        """
+        return Q(date_billing_attempt__gt=attempted_after) & Q(
+            **{'{}__lte'.format(field): F('date_billing_attempt')}
         )
 
-        for subscription in expired_subscriptions:
-            self.process_expired(subscription)
+    def get_phase_queryset(self, phase, predicate, current):
+        """Returns the UserSubscription queryset processed in a phase.
+
+            Renewing a due subscription moves its ``date_billing_next``
+            forward, which may still be before ``current`` for
+            subscriptions behind by several periods (or with more
+            missed periods than ``catch_up_limit``). Subscriptions
+            already attempted during this run are excluded so they are
+            not met again further along the phase keyset.
+
+            Parameters:
+                phase (str): The billing run phase.
+                predicate (obj): The Q object filter of the phase.
+                current (datetime): The start of the billing run.
+
+            Returns:
+                obj: A UserSubscription queryset.
+        """
+        queryset = self.get_subscriptions().filter(predicate)
+
+        if phase == models.PHASE_DUE:
+            queryset = queryset.exclude(date_billing_attempt__gte=current)
+
+        return queryset
 
-        # Handle new subscriptions
-        new_subscriptions = models.UserSubscription.objects.filter(
-            Q(active=False) & Q(cancelled=False)
-            & Q(date_billing_start__lte=current)
+    def get_backlog(self, current=None):
+        """Returns the number of subscriptions waiting for each phase.
+
+            Uses one aggregate query per phase, answered from the phase
+            indexes, so it can be polled frequently. The backlog is also
+            emitted as gauges to ``metrics``.
+
+            Parameters:
+                current (datetime): The datetime to measure the backlog
+                    at (defaults to now).
+
+            Returns:
+                dict: Keyed by phase, the ``count`` of subscriptions
+                    waiting, the ``oldest`` date they became due and its
+                    ``age`` in seconds (``None`` if none are waiting).
+        """
+        current = current or timezone.now()
+        backlog = {}
+
+        for phase, field, predicate in self.get_phase_filters(current):
+            result = models.UserSubscription.objects.filter(predicate).aggregate(
+                count=Count('*'), oldest=Min(field)
+            )
+            age = None
+
+            if result['oldest'] is not None:
+                age = (current - result['oldest']).total_seconds()
+
+            backlog[phase] = {
+                'count': result['count'],
+                'oldest': result['oldest'],
+                'age': age,
+            }
+
+            labels = {'phase': phase}
+            self.metrics.gauge(metrics.BILLING_BACKLOG, result['count'], labels)
+            self.metrics.gauge(metrics.BILLING_BACKLOG_AGE, age or 0, labels)
+
+        return backlog
+
+    @property
+    def stopping(self):
+        """Whether processing has been asked to stop."""
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    @staticmethod
+    def get_next_wakeup(retry_interval=None):
+        """Returns the earliest datetime a subscription needs processing.
+
+            Parameters:
+                retry_interval (timedelta): If provided, new and due
+                    subscriptions awaiting a retry (see
+                    ``get_retry_filter``) need processing
+                    ``retry_interval`` after their last billing attempt
+                    rather than at their billing date.
+
+            Returns:
+                datetime: The earliest expiry, billing start or next
+                    billing date of an uncancelled subscription, or None
+                    if there are none.
+        """
+        pending = models.UserSubscription.objects.filter(cancelled=False)
+        lookups = [
+            (True, 'date_billing_end'),
+            (False, 'date_billing_start'),
+            (True, 'date_billing_next'),
+        ]
+        dates = []
+
+        for active, field in lookups:
+            queryset = pending.filter(active=active)
+
+            if retry_interval is not None and field != 'date_billing_end':
+                retry_filter = Manager.get_retry_filter(field, timezone.now() - retry_interval)
+                attempted = queryset.filter(retry_filter).aggregate(
+                    date=Min('date_billing_attempt')
+                )['date']
+
+                if attempted is not None:
+                    dates.append(attempted + retry_interval)
+
+                queryset = queryset.exclude(retry_filter)
+
+            dates.append(queryset.aggregate(date=Min(field))['date'])
+
+        dates = [date for date in dates if date is not None]
+
+        return min(dates) if dates else None
+
+    @staticmethod
+    def checkpoint(billing_run, batch, cursor=None):
+        """Records the processing of a batch in the BillingRun.
+
+            Parameters:
+                billing_run (obj): The BillingRun instance.
+                batch (list): The processed UserSubscription instances.
+                cursor (tuple): The phase date and primary key of the
+                    last subscription before it was processed. If None,
+                    only the number of subscriptions is recorded (e.g.
+                    for worker runs, which cannot be resumed).
+        """
+        count_field = '{}_count'.format(billing_run.phase)
+        setattr(
+            billing_run, count_field, getattr(billing_run, count_field) + len(batch)
+        )
+
+        if cursor is None:
+            billing_run.save(update_fields=[count_field])
+            return
+
+        billing_run.last_processed_id = cursor[-1]
+        billing_run.last_processed_date = cursor[0] if len(cursor) > 1 else None
+        billing_run.save(update_fields=[
+            'last_processed_id', 'last_processed_date', count_field,
+        ])
+
+    @staticmethod
+    def get_resume_cursor(billing_run, ordering):
+        """Returns the keyset cursor to resume a BillingRun phase from.
+
+            Parameters:
+                billing_run (obj): The BillingRun instance.
+                ordering (tuple): The field names the phase is ordered
+                    by.
+
+            Returns:
+                tuple: The cursor, or None to process the phase from
+                    the start.
+        """
+        if billing_run is None or billing_run.last_processed_id is None:
+            return None
+
+        if len(ordering) == 1:
+            return (billing_run.last_processed_id,)
+
+        return (billing_run.last_processed_date, billing_run.last_processed_id)
+
+    @staticmethod
+    def get_subscriptions():
+        """Returns a UserSubscription queryset for processing.
+
+            Joins all related models used during processing so that
+            handling each subscription does not require any further
+            queries to retrieve them.
+
+            Returns:
+                obj: A UserSubscription queryset.
+        """
+        return models.UserSubscription.objects.select_related(
+            'user', 'subscription__plan__group',
         )
 
-        for subscription in new_subscriptions:
-            self.process_new(subscription)
+    @staticmethod
+    def get_retained_memberships(subscriptions):
+        """Finds the group memberships granted by other subscriptions.
+
+            Parameters:
+                subscriptions (list): UserSubscription instances being
+                    expired.
 
-        # Handle subscriptions with billing due
-        due_subscriptions = models.UserSubscription.objects.filter(
-            Q(active=True) & Q(cancelled=False)
-            & Q(date_billing_next__lte=current)
+            Returns:
+                set: Tuples of the user ID and group ID of each group
+                    that the users of the provided subscriptions are
+                    still granted by another active subscription.
+        """
+        return set(
+            models.UserSubscription.objects.filter(
+                user_id__in={subscription.user_id for subscription in subscriptions},
+                active=True,
+                cancelled=False,
+                subscription__plan__group__isnull=False,
+            ).exclude(
+                pk__in=[subscription.pk for subscription in subscriptions]
+            ).order_by().values_list(
+                'user_id', 'subscription__plan__group_id'
+            ).distinct()
         )
 
-        for subscription in due_subscriptions:
-            self.process_due(subscription)
+    @staticmethod
+    def get_keyset_filter(ordering, cursor):
+        """Returns a Q object for the rows after a keyset cursor.
+
+            The rows are compared in order of the fields, e.g.
+            ``(date, pk) > (x, y)``. The first field is also bounded
+            on its own so the index range scan starts at the cursor.
+
+            Parameters:
+                ordering (tuple): The field names the rows are ordered
+                    by, ending with ``pk``.
+                cursor (tuple): The values of the fields for the last
+                    row already returned.
+
+            Returns:
+                obj: The Q object of the rows after the cursor.
+        """
+        condition = Q(**{'{}__gt'.format(ordering[-1]): cursor[-1]})
+
+        for field, value in reversed(list(zip(ordering[:-1], cursor[:-1]))):
+            condition = Q(**{'{}__gt'.format(field): value}) | (
+                Q(**{field: value}) & condition
+            )
+
+        if len(ordering) > 1:
+            condition &= Q(**{'{}__gte'.format(ordering[0]): cursor[0]})
+
+        return condition
+
+    @staticmethod
+    def get_cursor(instance, ordering):
+        """Returns the keyset cursor values of an instance.
+
+            Parameters:
+                instance (obj): A UserSubscription instance.
+                ordering (tuple): The field names the rows are ordered
+                    by.
+
+            Returns:
+                tuple: The values of the ordering fields.
+        """
+        return tuple(getattr(instance, field) for field in ordering)
+
+    def get_batch_queryset(self, queryset, ordering=('pk',), cursor=None):
+        """Returns the query of the batch following a keyset cursor.
+
+            Each phase is ordered by its date field and the primary
+            key, matching the phase indexes, so every batch is read
+            from the index without sorting the remaining rows.
+
+            Parameters:
+                queryset (obj): A UserSubscription queryset.
+                ordering (tuple): The field names to order by, ending
+                    with ``pk``.
+                cursor (tuple): If provided, only rows after these
+                    ordering values are returned.
+
+            Returns:
+                obj: The sliced queryset of the batch.
+        """
+        queryset = queryset.order_by(*ordering)
+
+        if cursor is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, cursor))
+
+        return queryset[:self.batch_size]
+
+    def iterate_batches(self, queryset, cursor=None, ordering=('pk',)):
+        """Yields the queryset results in batches of ``batch_size``.
+
+            Uses keyset pagination on the ordering fields so that only
+            a single batch is held in memory at a time and each batch
+            query remains efficient regardless of how many rows have
+            already been processed.
+
+            Parameters:
+                queryset (obj): A UserSubscription queryset.
+                cursor (tuple): If provided, only rows after these
+                    ordering values are returned.
+                ordering (tuple): The field names to order by, ending
+                    with ``pk``.
+
+            Yields:
+                list: The next batch of UserSubscription instances.
+        """
+        while True:
+            batch = list(self.get_batch_queryset(queryset, ordering, cursor))
+
+            if not batch:
+                return
+
+            # Read before the batch is processed, which may change it
+            cursor = self.get_cursor(batch[-1], ordering)
+
+            yield batch
+
+            # A partial batch means no further rows remain
+            if len(batch) < self.batch_size:
+                return
+
+    def process_batches(self, queryset, process_batch, billing_run=None, ordering=('pk',)):
+        """Passes each batch of the queryset to the provided function.
+
+            If a ``worker_id`` is set, batches are claimed before they
+            are processed so that concurrent workers never process the
+            same subscription.
+
+            Parameters:
+                queryset (obj): A UserSubscription queryset.
+                process_batch (func): A function accepting a list of
+                    UserSubscription instances.
+                billing_run (obj): A BillingRun instance to record
+                    progress in. Processing continues after its last
+                    processed subscription.
+                ordering (tuple): The field names to order and batch
+                    the subscriptions by, ending with ``pk``.
+        """
+        def process_and_checkpoint(batch):
+            # Worker runs are not resumed, so only record their counts
+            cursor = None if self.worker_id else self.get_cursor(batch[-1], ordering)
+            self.record_stats(scanned=len(batch))
+            process_batch(batch)
+
+            if billing_run:
+                self.checkpoint(billing_run, batch, cursor)
+
+        if self.worker_id is None:
+            cursor = self.get_resume_cursor(billing_run, ordering)
+
+            for batch in self.iterate_batches(queryset, cursor, ordering):
+                if self.stopping:
+                    return
+
+                process_and_checkpoint(batch)
+        elif connections[queryset.db].features.has_select_for_update_skip_locked:
+            self.process_locked_batches(queryset, process_and_checkpoint, ordering)
+        else:
+            self.process_leased_batches(queryset, process_and_checkpoint, ordering)
+
+    def process_locked_batches(self, queryset, process_batch, ordering=('pk',)):
+        """Processes batches claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``.
+
+            Each batch is locked and processed within a single database
+            transaction. Rows locked by other workers are skipped.
+
+            Only the UserSubscription rows are locked. Where the
+            database cannot limit the lock to one table (``FOR UPDATE
+            OF``, e.g. MySQL), the keys of the batch are locked without
+            any joins and the related rows are then loaded by key.
+
+            Parameters:
+                queryset (obj): A UserSubscription queryset.
+                process_batch (func): A function accepting a list of
+                    UserSubscription instances.
+                ordering (tuple): The field names to order and batch
+                    the subscriptions by, ending with ``pk``.
+        """
+        lock_of = connections[queryset.db].features.has_select_for_update_of
+        cursor = None
+
+        while not self.stopping:
+            with transaction.atomic():
+                if lock_of:
+                    # Prevents locking the joined related model rows
+                    batch = list(self.get_batch_queryset(
+                        queryset.select_for_update(skip_locked=True, of=('self',)),
+                        ordering,
+                        cursor,
+                    ))
+                else:
+                    batch = self.get_locked_batch(queryset, ordering, cursor)
+
+                if not batch:
+                    return
+
+                cursor = self.get_cursor(batch[-1], ordering)
+                process_batch(batch)
+
+    def get_locked_batch(self, queryset, ordering, cursor):
+        """Locks the next batch by key, then loads its related rows.
+
+            Used where ``SELECT ... FOR UPDATE`` would also lock the
+            rows of every joined table (users, plan costs, plans and
+            groups), which would block other workers processing
+            subscriptions of the same plans. Must be called within a
+            transaction.
+
+            Parameters:
+                queryset (obj): A UserSubscription queryset.
+                ordering (tuple): The field names to order by, ending
+                    with ``pk``.
+                cursor (tuple): If provided, only rows after these
+                    ordering values are returned.
+
+            Returns:
+                list: The locked UserSubscription instances, in order.
+        """
+        locked_pks = [
+            row[-1] for row in self.get_batch_queryset(
+                queryset.select_related(None).select_for_update(
+                    skip_locked=True
+                ).values_list(*ordering),
+                ordering,
+                cursor,
+            )
+        ]
+
+        if not locked_pks:
+            return []
+
+        return list(queryset.filter(pk__in=locked_pks).order_by(*ordering))
+
+    def process_leased_batches(self, queryset, process_batch, ordering=('pk',)):
+        """Processes batches claimed with a lease on each row.
+
+            Used for databases that do not support skipping locked rows
+            (e.g. SQLite). A batch of candidate rows is claimed with a
+            single ``UPDATE`` that only succeeds for rows without an
+            active lease. The lease is released once the batch has been
+            processed.
+
+            Parameters:
+                queryset (obj): A UserSubscription queryset.
+                process_batch (func): A function accepting a list of
+                    UserSubscription instances.
+                ordering (tuple): The field names to order and batch
+                    the subscriptions by, ending with ``pk``.
+        """
+        cursor = None
+
+        while not self.stopping:
+            current = timezone.now()
+            unleased = Q(date_lease_expires__isnull=True) | Q(date_lease_expires__lte=current)
+            candidates = list(self.get_batch_queryset(
+                queryset.filter(unleased).values_list(*ordering), ordering, cursor
+            ))
+
+            if not candidates:
+                return
+
+            candidate_pks = [candidate[-1] for candidate in candidates]
+
+            # Claim any candidates not leased by another worker meanwhile
+            queryset.filter(unleased, pk__in=candidate_pks).update(
+                lease_holder=self.worker_id,
+                date_lease_expires=current + self.lease_duration,
+            )
+            batch = list(
+                queryset.filter(
+                    pk__in=candidate_pks, lease_holder=self.worker_id
+                ).order_by(*ordering)
+            )
+
+            try:
+                if batch:
+                    process_batch(batch)
+            finally:
+                models.UserSubscription.objects.filter(
+                    pk__in=candidate_pks, lease_holder=self.worker_id
+                ).update(lease_holder=None, date_lease_expires=None)
+
+            cursor = candidates[-1]
 
     def process_expired(self, subscription):
         """Handles processing of expired/cancelled subscriptions.
@@ -45,27 +862,41 @@ class Manager():
             Parameters:
                 subscription (obj): A UserSubscription instance.
         """
-        # Get all user subscriptions
-        user = subscription.user
-        user_subscriptions = user.subscriptions.all()
-        subscription_group = subscription.subscription.plan.group
-        group_matches = 0
+        self.process_expired_batch([subscription])
+
+    def process_expired_batch(self, subscriptions):
+        """Handles processing of a batch of expired/cancelled subscriptions.
+
+            The groups each user loses are found with a single query
+            and the subscriptions are expired with a single update.
+            Notifications are then sent for each subscription.
+
+            Parameters:
+                subscriptions (list): UserSubscription instances.
+        """
+        retained = self.get_retained_memberships(subscriptions)
+
+        # Remove users from groups no other subscription grants
+        removals = {
+            (subscription.user_id, subscription.subscription.plan.group_id)
+            for subscription in subscriptions
+            if subscription.subscription.plan.group_id
+        } - retained
 
-        # Check if there is another subscription for this group
-        for user_subscription in user_subscriptions:
-            if user_subscription.subscription.plan.group == subscription_group:
-                group_matches += 1
+        with transaction.atomic():
+            self.remove_group_members(removals)
+            models.UserSubscription.objects.filter(
+                pk__in=[subscription.pk for subscription in subscriptions]
+            ).update(active=False, cancelled=True)
 
-        # If no other subscription, can remove user from group
-        if group_matches < 2:
-            subscription_group.user_set.remove(user)
+        self.record_stats(processed=len(subscriptions))
 
-        # Update this specific UserSubscription instance
-        subscription.active = False
-        subscription.cancelled = True
-        subscription.save()
+        for subscription in subscriptions:
+            # Update this specific UserSubscription instance
+            subscription.active = False
+            subscription.cancelled = True
 
-        self.notify_expired(subscription)
+            self.notify_expired(subscription)
 
     def process_new(self, subscription):
         """Handles processing of a new subscription.
@@ -73,37 +904,73 @@ class Manager():
             Parameters:
                 subscription (obj): A UserSubscription instance.
         """
-        user = subscription.user
-        cost = subscription.subscription
-        plan = cost.plan
+        self.process_new_batch([subscription])
 
-        payment_transaction = self.process_payment(user=user, cost=cost)
+    def process_new_batch(self, subscriptions):
+        """Handles processing of a batch of new subscriptions.
 
-        if payment_transaction:
-            # Add user to the proper group
-            try:
-                plan.group.user_set.add(user)
-            except AttributeError:
-                # No group available to add user to
-                pass
+            The ``date_billing_attempt`` of every subscription in the
+            batch is set, whether or not it was activated.
 
-            # Update subscription details
-            current = timezone.now()
-            next_billing = cost.next_billing_datetime(
-                subscription.date_billing_start
+            Parameters:
+                subscriptions (list): UserSubscription instances.
+        """
+        activated = []
+        transactions = []
+
+        charges = self.process_charges([
+            (subscription, subscription.date_billing_start)
+            for subscription in subscriptions
+        ])
+        current = timezone.now()
+
+        for subscription, charge in zip(subscriptions, charges):
+            idempotency_key, paid, payment_transaction = charge
+            subscription.date_billing_attempt = current
+
+            if paid:
+                activated.append(subscription)
+
+            if payment_transaction:
+                # Prepare the transaction details
+                transactions.append(self.build_transaction(
+                    subscription,
+                    self.retrieve_transaction_date(payment_transaction),
+                    idempotency_key,
+                ))
+
+        # Update subscription details
+        next_dates = recurrence.next_billing_datetimes([
+            (
+                subscription.subscription,
+                subscription.date_billing_start,
+                subscription.date_billing_start,
             )
+            for subscription in activated
+        ])
+
+        for subscription, next_billing in zip(activated, next_dates):
             subscription.date_billing_last = current
             subscription.date_billing_next = next_billing
             subscription.active = True
-            subscription.save()
 
-            # Record the transaction details
-            self.record_transaction(
-                subscription,
-                self.retrieve_transaction_date(payment_transaction)
+        with transaction.atomic():
+            # Add users to the proper groups (if the plan has a group)
+            self.add_group_members(
+                (subscription.user_id, subscription.subscription.plan.group_id)
+                for subscription in activated
+                if subscription.subscription.plan.group_id
             )
+            self.save_batch(
+                subscriptions,
+                ['date_billing_last', 'date_billing_next', 'date_billing_attempt', 'active'],
+                transactions,
+            )
+
+        self.record_stats(processed=len(activated))
 
-            # Send notifications
+        # Send notifications
+        for subscription in activated:
             self.notify_new(subscription)
 
     def process_due(self, subscription):
@@ -112,32 +979,395 @@ class Manager():
             Parameters:
                 subscription (obj): A UserSubscription instance.
         """
-        user = subscription.user
-        cost = subscription.subscription
+        self.process_due_batch([subscription])
+
+    def process_due_batch(self, subscriptions):
+        """Handles processing of a batch of due subscriptions.
+
+            The ``date_billing_attempt`` of every subscription in the
+            batch is set, whether or not it was renewed.
+
+            Parameters:
+                subscriptions (list): UserSubscription instances.
+        """
+        current = timezone.now()
+        renewed = []
+        transactions = []
+
+        billing_periods = self.get_billing_periods(subscriptions, current)
+        charged_periods = [
+            self.select_charged_periods(periods) for periods, _ in billing_periods
+        ]
+
+        charges = iter(self.process_charges([
+            (subscription, billing_date)
+            for subscription, periods in zip(subscriptions, charged_periods)
+            for billing_date in periods
+        ]))
+
+        for subscription, (_, next_billing), charged in zip(
+                subscriptions, billing_periods, charged_periods
+        ):
+            results = [next(charges) for _ in charged]
+            subscription.date_billing_attempt = current
+
+            for idempotency_key, _, payment_transaction in results:
+                if payment_transaction:
+                    # Prepare the transaction details
+                    transactions.append(self.build_transaction(
+                        subscription,
+                        self.retrieve_transaction_date(payment_transaction),
+                        idempotency_key,
+                    ))
 
-        payment_transaction = self.process_payment(user=user, cost=cost)
+            # Billing periods are only paid up to the first failed payment
+            paid_periods = 0
+
+            while paid_periods < len(results) and results[paid_periods][1]:
+                paid_periods += 1
 
-        if payment_transaction:
             # Update subscription details
-            current = timezone.now()
-            next_billing = cost.next_billing_datetime(
-                subscription.date_billing_next
+            if paid_periods == len(charged):
+                subscription.date_billing_next = next_billing
+            elif paid_periods:
+                subscription.date_billing_next = charged[paid_periods]
+            else:
+                continue
+
+            if paid_periods:
+                subscription.date_billing_last = current
+
+            renewed.append(subscription)
+
+        with transaction.atomic():
+            self.save_batch(
+                subscriptions,
+                ['date_billing_last', 'date_billing_next', 'date_billing_attempt'],
+                transactions,
+            )
+
+        self.record_stats(processed=len(renewed))
+
+    def get_billing_periods(self, subscriptions, current):
+        """Determines the billing periods due for each subscription.
+
+            Without ``catch_up`` only the period starting on
+            ``date_billing_next`` is returned. Otherwise every period
+            starting on or before ``current`` is returned, up to
+            ``catch_up_limit`` periods. Dates are anchored to the
+            billing start date so month end dates are not lost after a
+            shorter month.
+
+            Parameters:
+                subscriptions (list): UserSubscription instances.
+                current (datetime): The datetime of the billing run.
+
+            Returns:
+                list: Tuples of the list of due billing period dates and
+                    the billing date following them, for each
+                    subscription.
+        """
+        limit = 1 if self.catch_up is None else self.catch_up_limit
+        periods = [[subscription.date_billing_next] for subscription in subscriptions]
+        next_dates = [None] * len(subscriptions)
+        pending = list(range(len(subscriptions)))
+
+        while pending:
+            dates = recurrence.next_billing_datetimes([
+                (
+                    subscriptions[index].subscription,
+                    periods[index][-1],
+                    subscriptions[index].date_billing_start,
+                )
+                for index in pending
+            ])
+            missed = []
+
+            for index, next_date in zip(pending, dates):
+                if len(periods[index]) < limit and next_date and next_date <= current:
+                    periods[index].append(next_date)
+                    missed.append(index)
+                else:
+                    next_dates[index] = next_date
+
+            pending = missed
+
+        return list(zip(periods, next_dates))
+
+    def select_charged_periods(self, periods):
+        """Selects the billing periods to charge as per ``catch_up``.
+
+            Parameters:
+                periods (list): The due billing period dates of a
+                    subscription, in order.
+
+            Returns:
+                list: The billing period dates to charge.
+        """
+        if len(periods) == 1 or self.catch_up == CATCH_UP_ALL:
+            return periods
+
+        if self.catch_up == CATCH_UP_LATEST:
+            return periods[-1:]
+
+        return []
+
+    @staticmethod
+    def get_group_membership_model():
+        """Returns the through model and field names for user groups.
+
+            Returns:
+                tuple: The through model of the user model ``groups``
+                    field and the attribute names of its user and group
+                    foreign keys.
+        """
+        field = get_user_model()._meta.get_field('groups')  # pylint: disable=protected-access
+        through = field.remote_field.through
+        user_field = through._meta.get_field(field.m2m_field_name())  # pylint: disable=protected-access
+        group_field = through._meta.get_field(field.m2m_reverse_field_name())  # pylint: disable=protected-access
+
+        return through, user_field.attname, group_field.attname
+
+    @classmethod
+    def add_group_members(cls, memberships):
+        """Adds users to groups with a bulk insert.
+
+            Memberships that already exist are ignored. As the through
+            table is written directly, no ``m2m_changed`` signals are
+            sent.
+
+            Parameters:
+                memberships (list): Tuples of a user ID and group ID.
+        """
+        through, user_field, group_field = cls.get_group_membership_model()
+        rows = [
+            through(**{user_field: user_id, group_field: group_id})
+            for user_id, group_id in set(memberships)
+        ]
+
+        if rows:
+            through.objects.bulk_create(rows, ignore_conflicts=True)
+
+    @classmethod
+    def remove_group_members(cls, memberships):
+        """Removes users from groups with one bulk delete per group.
+
+            As the through table is written directly, no
+            ``m2m_changed`` signals are sent.
+
+            Parameters:
+                memberships (list): Tuples of a user ID and group ID.
+        """
+        through, user_field, group_field = cls.get_group_membership_model()
+        group_users = {}
+
+        for user_id, group_id in memberships:
+            group_users.setdefault(group_id, set()).add(user_id)
+
+        for group_id, user_ids in group_users.items():
+            through.objects.filter(**{
+                group_field: group_id,
+                '{}__in'.format(user_field): user_ids,
+            }).delete()
+
+    @staticmethod
+    def save_batch(subscriptions, fields, transactions=None):
+        """Saves a batch of subscription updates and transactions.
+
+            Parameters:
+                subscriptions (list): UserSubscription instances to
+                    update.
+                fields (list): The UserSubscription fields to update.
+                transactions (list): Unsaved SubscriptionTransaction
+                    instances to create.
+        """
+        if subscriptions:
+            models.UserSubscription.objects.bulk_update(subscriptions, fields)
+
+        if transactions:
+            # Conflicts are transactions already recorded for the billing
+            # period by another process (see ``process_charges``)
+            models.SubscriptionTransaction.objects.bulk_create(
+                transactions, ignore_conflicts=True
+            )
+
+    @staticmethod
+    def build_idempotency_key(subscription, billing_date):
+        """Returns the idempotency key for a subscription billing period.
+
+            Parameters:
+                subscription (obj): A UserSubscription instance.
+                billing_date (obj): The datetime the billing period
+                    starts.
+
+            Returns:
+                str: A key unique to the subscription billing period.
+        """
+        return '{}:{}'.format(subscription.pk, billing_date.isoformat())
+
+    def process_charges(self, charges):
+        """Processes payments for subscription billing periods.
+
+            Each billing period is identified by an idempotency key
+            which is passed to ``process_payment`` and recorded on the
+            SubscriptionTransaction. Billing periods that already have a
+            recorded transaction are not charged again.
+
+            Parameters:
+                charges (list): Tuples of a UserSubscription instance
+                    and the datetime of the billing period to charge.
+
+            Returns:
+                list: Tuples of the idempotency key, whether the billing
+                    period is paid, and the ``process_payment`` result
+                    (``None`` if the period was already paid), in the
+                    same order as the provided charges.
+        """
+        keys = [
+            self.build_idempotency_key(subscription, billing_date)
+            for subscription, billing_date in charges
+        ]
+        billed_keys = set(
+            models.SubscriptionTransaction.objects.filter(
+                idempotency_key__in=keys
+            ).values_list('idempotency_key', flat=True)
+        )
+
+        payments = [
+            {
+                'user': subscription.user,
+                'cost': subscription.subscription,
+                'idempotency_key': key,
+            }
+            for (subscription, _), key in zip(charges, keys)
+            if key not in billed_keys
+        ]
+        payment_results = self.process_payments(payments)
+        payment_successes = sum(1 for result in payment_results if result)
+        self.record_stats(
+            payment_successes=payment_successes,
+            payment_failures=len(payment_results) - payment_successes,
+        )
+
+        if payment_successes:
+            self.metrics.increment(
+                metrics.PAYMENTS,
+                payment_successes,
+                {'source': 'manager', 'result': 'success'},
             )
-            subscription.date_billing_last = current
-            subscription.date_billing_next = next_billing
-            subscription.save()
 
-            # Record the transaction details
-            self.record_transaction(
-                subscription,
-                self.retrieve_transaction_date(payment_transaction)
+        if len(payment_results) > payment_successes:
+            self.metrics.increment(
+                metrics.PAYMENTS,
+                len(payment_results) - payment_successes,
+                {'source': 'manager', 'result': 'failure'},
             )
+        payment_transactions = iter(payment_results)
+
+        results = []
+
+        for key in keys:
+            if key in billed_keys:
+                results.append((key, True, None))
+            else:
+                payment_transaction = next(payment_transactions)
+                results.append((key, bool(payment_transaction), payment_transaction))
+
+        return results
+
+    def process_payments(self, payments):
+        """Calls ``process_payment`` for each of the provided payments.
+
+            Payments are dispatched to a thread pool of
+            ``payment_workers`` threads when it is greater than 1. If
+            ``process_payment`` is a coroutine function, payments are
+            awaited concurrently with at most ``payment_workers``
+            payments in progress at once. Database updates for the
+            results are left to the calling thread.
+
+            Parameters:
+                payments (list): Dictionaries of the keyword arguments
+                    to pass to ``process_payment``.
+
+            Returns:
+                list: The ``process_payment`` results, in the same
+                    order as the provided payments.
+        """
+        if asyncio.iscoroutinefunction(self.process_payment):
+            return self._process_async_payments(payments)
+
+        if self.payment_workers > 1 and len(payments) > 1:
+            with ThreadPoolExecutor(max_workers=self.payment_workers) as executor:
+                return list(executor.map(self._process_threaded_payment, payments))
+
+        return [self._process_timed_payment(payment) for payment in payments]
+
+    def _process_timed_payment(self, payment):
+        """Calls ``process_payment`` and records how long it took."""
+        start = time.perf_counter()
+
+        try:
+            return self.process_payment(**payment)
+        finally:
+            self.record_payment_latency(time.perf_counter() - start)
+
+    def _process_threaded_payment(self, payment):
+        """Calls ``process_payment`` from a thread pool thread.
+
+            Closes any database connections opened by the thread so
+            they are not left open once the pool shuts down.
+        """
+        try:
+            return self._process_timed_payment(payment)
+        finally:
+            connections.close_all()
+
+    def _process_async_payments(self, payments):
+        """Awaits a coroutine ``process_payment`` for each payment."""
+        async def process_all():
+            semaphore = asyncio.Semaphore(max(self.payment_workers, 1))
+
+            async def process(payment):
+                async with semaphore:
+                    start = time.perf_counter()
+
+                    try:
+                        return await self.process_payment(**payment)
+                    finally:
+                        self.record_payment_latency(time.perf_counter() - start)
+
+            return await asyncio.gather(*[process(payment) for payment in payments])
+
+        loop = asyncio.new_event_loop()
+
+        try:
+            return loop.run_until_complete(process_all())
+        finally:
+            loop.close()
+
+    def record_payment_latency(self, seconds):
+        """Records the duration of a ``process_payment`` call.
+
+            Parameters:
+                seconds (float): The seconds the payment took.
+        """
+        self.metrics.observe(metrics.PAYMENT_DURATION, seconds, {'source': 'manager'})
+
+        if self.phase_stats is not None:
+            self.phase_stats.record_payment_latency(seconds)
 
     def process_payment(self, *args, **kwargs):  # pylint: disable=unused-argument, no-self-use
         """Processes payment and confirms if payment is accepted.
 
             This method needs to be overriden in a project to handle
             payment processing with the appropriate payment provider.
+            The Manager calls it with the ``user``, the ``cost`` (a
+            PlanCost instance) and an ``idempotency_key`` unique to the
+            billing period, which should be passed on to the payment
+            provider so that retried charges are not duplicated. It may
+            be overriden with an ``async def`` method to have the
+            payments of a batch processed concurrently (see
+            ``process_payments``).
 
             Can return value that evalutes to ``True`` to indicate
             payment success and any value that evalutes to ``False`` to
@@ -158,28 +1388,53 @@ class Manager():
         return timezone.now()
 
     @staticmethod
-    def record_transaction(subscription, transaction_date=None):
-        """Records transaction details in SubscriptionTransaction.
+    def build_transaction(subscription, transaction_date=None, idempotency_key=None):
+        """Builds an unsaved SubscriptionTransaction instance.
 
             Parameters:
                 subscription (obj): A UserSubscription object.
                 transaction_date (obj): A DateTime object of when
                     payment occurred (defaults to current datetime if
                     none provided).
+                idempotency_key (str): The idempotency key of the
+                    billing period the payment was for.
 
             Returns:
-                obj: The created SubscriptionTransaction instance.
+                obj: The unsaved SubscriptionTransaction instance.
         """
         if transaction_date is None:
             transaction_date = timezone.now()
 
-        return models.SubscriptionTransaction.objects.create(
+        return models.SubscriptionTransaction(
             user=subscription.user,
             subscription=subscription.subscription,
             date_transaction=transaction_date,
             amount=subscription.subscription.cost,
+            currency_locale=subscription.subscription.currency_locale,
+            amount_minor_units=subscription.subscription.cost_minor_units,
+            idempotency_key=idempotency_key,
         )
 
+    @classmethod
+    def record_transaction(cls, subscription, transaction_date=None):
+        """Records transaction details in SubscriptionTransaction.
+
+            Parameters:
+                subscription (obj): A UserSubscription object.
+                transaction_date (obj): A DateTime object of when
+                    payment occurred (defaults to current datetime if
+                    none provided).
+
+            Returns:
+                obj: The created SubscriptionTransaction instance.
+        """
+        subscription_transaction = cls.build_transaction(
+            subscription, transaction_date
+        )
+        subscription_transaction.save()
+
+        return subscription_transaction
+
     def notify_expired(self, subscription):
         """Sends notification of expired subscription.
 
@@ -0,0 +1,53 @@
+"""Django management command to report the billing backlog."""
+import importlib
+import json
+
+from django.core.management.base import BaseCommand
+
+from subscriptions.conf import SETTINGS
+
+
+BACKLOG_ROW = '{:<8} {:>9} {:<32} {:>12}'
+
+
+class Command(BaseCommand):
+    """Django management command to report the billing backlog."""
+    help = 'Reports the subscriptions waiting to be expired, activated or renewed.'
+
+    def add_arguments(self, parser):
+        """Adds optional arguments to control the report format."""
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            dest='json',
+            help='Writes the backlog as JSON.',
+        )
+
+    def handle(self, *args, **options):
+        """Writes the backlog of each billing run phase."""
+        Manager = getattr(  # pylint: disable=invalid-name
+            importlib.import_module(SETTINGS['management_manager']['module']),
+            SETTINGS['management_manager']['class']
+        )
+        backlog = Manager().get_backlog()
+
+        if options.get('json'):
+            self.stdout.write(json.dumps({
+                phase: {
+                    'count': details['count'],
+                    'oldest': details['oldest'].isoformat() if details['oldest'] else None,
+                    'age': details['age'],
+                }
+                for phase, details in backlog.items()
+            }))
+            return
+
+        self.stdout.write(BACKLOG_ROW.format('Phase', 'Waiting', 'Oldest', 'Age s'))
+
+        for phase, details in backlog.items():
+            self.stdout.write(BACKLOG_ROW.format(
+                phase,
+                details['count'],
+                str(details['oldest'] or '-'),
+                '-' if details['age'] is None else '{:.0f}'.format(details['age']),
+            ))
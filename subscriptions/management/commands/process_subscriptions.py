@@ -1,23 +1,318 @@
 """Django management command to process subscriptions via task runner."""
 import importlib
+import json
+import os
+import signal
+import socket
+import threading
+from datetime import timedelta
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
 
+from subscriptions import metrics, models
 from subscriptions.conf import SETTINGS
+from subscriptions.management.commands._manager import CATCH_UP_CHOICES
+
+
+STATS_ROW = '{:<8} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9}'
 
 
 class Command(BaseCommand):
     """Django management command to process subscriptions via task runner."""
     help = 'Processes all subscriptions to handle renewal and expiries.'
 
+    def add_arguments(self, parser):
+        """Adds optional arguments to control subscription processing."""
+        parser.add_argument(
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            help='Number of subscriptions to retrieve and process at once.',
+        )
+        parser.add_argument(
+            '--payment-workers',
+            dest='payment_workers',
+            type=int,
+            help='Maximum number of payments to process at the same time.',
+        )
+        parser.add_argument(
+            '--catch-up',
+            choices=CATCH_UP_CHOICES,
+            dest='catch_up',
+            help=(
+                'Bills all missed periods of overdue subscriptions in one '
+                'run by charging all of them, only the latest, or skipping '
+                'them.'
+            ),
+        )
+        parser.add_argument(
+            '--worker',
+            action='store_true',
+            dest='worker',
+            help=(
+                'Claims each batch before processing so multiple commands '
+                'can run at the same time.'
+            ),
+        )
+        parser.add_argument(
+            '--worker-id',
+            dest='worker_id',
+            help=(
+                'Identifier for this worker (implies --worker; defaults to '
+                'the hostname and process ID).'
+            ),
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            dest='resume',
+            help=(
+                'Resumes the most recent billing run if it is incomplete and '
+                'was not run by a worker.'
+            ),
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            dest='json',
+            help='Writes the statistics of each billing run as a JSON line.',
+        )
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            dest='daemon',
+            help=(
+                'Runs continuously, sleeping until the next subscription is '
+                'due. Stops after the current batch on SIGTERM or SIGINT.'
+            ),
+        )
+        parser.add_argument(
+            '--min-sleep',
+            default=1,
+            dest='min_sleep',
+            type=float,
+            help='Minimum number of seconds to sleep between daemon runs.',
+        )
+        parser.add_argument(
+            '--max-sleep',
+            default=300,
+            dest='max_sleep',
+            type=float,
+            help='Maximum number of seconds to sleep between daemon runs.',
+        )
+        parser.add_argument(
+            '--retry-interval',
+            default=86400,
+            dest='retry_interval',
+            type=float,
+            help=(
+                'Number of seconds between daemon attempts to bill '
+                'subscriptions that could not be renewed (e.g. declined '
+                'payments).'
+            ),
+        )
+        parser.add_argument(
+            '--metrics-file',
+            dest='metrics_file',
+            help=(
+                'Writes the metrics in the Prometheus text format to this '
+                'file after each billing run (e.g. for the node exporter '
+                'textfile collector).'
+            ),
+        )
+
+    json_output = False
+    metrics_file = None
+
     def handle(self, *args, **options):
         """Runs Manager methods required to process subscriptions."""
+        self.json_output = options.get('json', False)
+        self.metrics_file = options.get('metrics_file')
+
+        if self.metrics_file and not hasattr(metrics.get_metrics(), 'render'):
+            raise CommandError(
+                '--metrics-file requires a metrics class that can render '
+                'its metrics (e.g. PrometheusMetrics).'
+            )
+
         Manager = getattr(  # pylint: disable=invalid-name
             importlib.import_module(SETTINGS['management_manager']['module']),
             SETTINGS['management_manager']['class']
         )
-        manager = Manager()
+        manager_kwargs = {}
+
+        if options.get('batch_size'):
+            manager_kwargs['batch_size'] = options['batch_size']
+
+        if options.get('payment_workers'):
+            manager_kwargs['payment_workers'] = options['payment_workers']
+
+        if options.get('catch_up'):
+            manager_kwargs['catch_up'] = options['catch_up']
+
+        if options.get('worker_id'):
+            manager_kwargs['worker_id'] = options['worker_id']
+        elif options.get('worker'):
+            manager_kwargs['worker_id'] = '{}-{}'.format(
+                socket.gethostname(), os.getpid()
+            )
+
+        billing_run = None
+
+        if options.get('resume'):
+            if 'worker_id' in manager_kwargs:
+                raise CommandError('--resume cannot be used with worker mode.')
+
+            # Older incomplete runs are superseded by the later runs and
+            # worker runs have no checkpoint to resume from
+            billing_run = models.BillingRun.objects.first()
+
+            if billing_run and (billing_run.date_completed or billing_run.worker_id):
+                billing_run = None
+
+            if billing_run:
+                self.write_progress(
+                    'Resuming billing run started {}.'.format(billing_run.date_started)
+                )
+            else:
+                self.write_progress('No incomplete billing run to resume.')
+
+        manager = Manager(**manager_kwargs)
+
+        if options.get('daemon'):
+            self.run_daemon(
+                manager,
+                billing_run,
+                options['min_sleep'],
+                options['max_sleep'],
+                options['retry_interval'],
+            )
+            return
+
+        self.write_progress('Processing subscriptions... ', ending='')
+        manager.process_subscriptions(billing_run=billing_run)
+        self.write_progress('Complete!')
+        self.write_stats(manager.stats)
+        self.write_metrics()
+
+    def write_progress(self, message, ending='\n'):
+        """Writes a progress message unless JSON output is requested."""
+        if not self.json_output:
+            self.stdout.write(message, ending=ending)
+
+    def write_stats(self, stats):
+        """Writes the billing run statistics as a table or JSON.
+
+            Parameters:
+                stats (obj): A BillingStats instance (nothing is written
+                    if None).
+        """
+        if stats is None:
+            return
+
+        if self.json_output:
+            self.stdout.write(json.dumps(stats.as_dict()))
+            return
+
+        def milliseconds(seconds):
+            return '-' if seconds is None else '{:.1f}'.format(seconds * 1000)
+
+        self.stdout.write(STATS_ROW.format(
+            'Phase', 'Scanned', 'Processed', 'Paid', 'Declined', 'Queries',
+            'p50 ms', 'p90 ms', 'p99 ms', 'Time s',
+        ))
+
+        for phase in stats.phases:
+            latency = phase.as_dict()['payment_latency']
+            self.stdout.write(STATS_ROW.format(
+                phase.phase,
+                phase.scanned,
+                phase.processed,
+                phase.payment_successes,
+                phase.payment_failures,
+                phase.queries,
+                milliseconds(latency['p50']),
+                milliseconds(latency['p90']),
+                milliseconds(latency['p99']),
+                '{:.3f}'.format(phase.wall_time),
+            ))
+
+        self.stdout.write('Total time: {:.3f}s'.format(stats.wall_time))
+
+    def write_metrics(self):
+        """Writes the rendered metrics to the metrics file, if any.
+
+            The metrics are written to a temporary file that replaces
+            the metrics file, so a reader never sees a partial file.
+        """
+        if not self.metrics_file:
+            return
+
+        temporary_file = '{}.{}.tmp'.format(self.metrics_file, os.getpid())
+
+        with open(temporary_file, 'w', encoding='utf-8') as file:
+            file.write(metrics.get_metrics().render())
+
+        os.replace(temporary_file, self.metrics_file)
+
+    def run_daemon(self, manager, billing_run, min_sleep, max_sleep, retry_interval=86400):
+        """Processes subscriptions until a SIGTERM or SIGINT is received.
+
+            After each billing run the daemon sleeps until the earliest
+            date a subscription becomes due (within ``min_sleep`` and
+            ``max_sleep`` seconds). A signal stops processing after the
+            current batch, leaving the billing run to be resumed.
+
+            Subscriptions a run could not renew (e.g. declined
+            payments) are billed again ``retry_interval`` seconds after
+            their last billing attempt, rather than by every run.
+
+            Parameters:
+                manager (obj): The Manager instance.
+                billing_run (obj): A BillingRun instance to resume first.
+                min_sleep (float): Minimum seconds to sleep between runs.
+                max_sleep (float): Maximum seconds to sleep between runs.
+                retry_interval (float): Seconds between billing
+                    attempts of a subscription that is still due.
+        """
+        manager.stop_event = threading.Event()
+
+        def stop(signum, frame):  # pylint: disable=unused-argument
+            manager.stop_event.set()
+
+        previous_handlers = {
+            signum: signal.signal(signum, stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+
+        retry_interval = timedelta(seconds=retry_interval)
+
+        try:
+            while not manager.stop_event.is_set():
+                self.write_progress('Processing subscriptions... ', ending='')
+                billing_run = manager.process_subscriptions(
+                    billing_run=billing_run,
+                    attempted_after=timezone.now() - retry_interval,
+                )
+
+                if manager.stop_event.is_set():
+                    break
+
+                self.write_progress('Complete!')
+                self.write_stats(manager.stats)
+                self.write_metrics()
+
+                wakeup = manager.get_next_wakeup(retry_interval=retry_interval)
+                billing_run = None
+                sleep = max_sleep
+
+                if wakeup is not None:
+                    sleep = (wakeup - timezone.now()).total_seconds()
+
+                manager.stop_event.wait(min(max(sleep, min_sleep), max_sleep))
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
 
-        self.stdout.write('Processing subscriptions... ', ending='')
-        manager.process_subscriptions()
-        self.stdout.write('Complete!')
+        self.write_progress('Stopped.')
@@ -0,0 +1,231 @@
+"""Metrics collection for Django Flexible Subscriptions.
+
+    The Manager and SubscribeView emit metrics to the object returned by
+    ``get_metrics``, which is an instance of the class set in the
+    ``DFS_METRICS_CLASS`` setting. The default ``Metrics`` class
+    discards all metrics; ``PrometheusMetrics`` keeps them in memory
+    and renders them in the Prometheus text exposition format.
+"""
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.http import Http404, HttpResponse
+
+from subscriptions.conf import SETTINGS
+
+
+# Metric names emitted by the package
+# ----------------------------------------------------------------------------
+BILLING_BACKLOG = 'dfs_billing_backlog'
+BILLING_BACKLOG_AGE = 'dfs_billing_backlog_oldest_age_seconds'
+BILLING_PHASE_DURATION = 'dfs_billing_phase_duration_seconds'
+BILLING_SCANNED = 'dfs_billing_subscriptions_scanned_total'
+BILLING_PROCESSED = 'dfs_billing_subscriptions_processed_total'
+PAYMENT_DURATION = 'dfs_payment_duration_seconds'
+PAYMENTS = 'dfs_payments_total'
+SUBSCRIPTIONS_CREATED = 'dfs_subscriptions_created_total'
+
+# Default histogram buckets (in seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metrics():
+    """Metrics interface that discards all metrics.
+
+        Subclass and override ``increment``, ``observe`` and ``gauge``
+        to send metrics to a monitoring system. Labels are provided as
+        a dictionary of label names and values.
+    """
+    def increment(self, name, value=1, labels=None):
+        """Increments a counter.
+
+            Parameters:
+                name (str): The metric name.
+                value (float): The amount to increment by.
+                labels (dict): Label names and values for the metric.
+        """
+
+    def observe(self, name, value, labels=None):
+        """Records a value in a histogram.
+
+            Parameters:
+                name (str): The metric name.
+                value (float): The observed value.
+                labels (dict): Label names and values for the metric.
+        """
+
+    def gauge(self, name, value, labels=None):
+        """Sets the current value of a gauge.
+
+            Parameters:
+                name (str): The metric name.
+                value (float): The current value.
+                labels (dict): Label names and values for the metric.
+        """
+
+    @contextmanager
+    def timer(self, name, labels=None):
+        """Observes the seconds taken by the wrapped block.
+
+            Parameters:
+                name (str): The histogram metric name.
+                labels (dict): Label names and values for the metric.
+        """
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+
+class PrometheusMetrics(Metrics):
+    """Metrics kept in memory and rendered for Prometheus.
+
+        Metrics are kept per process; with multiple processes each
+        process must be scraped separately.
+
+        Attributes:
+            buckets (tuple): The upper bounds of the histogram buckets.
+    """
+    buckets = DEFAULT_BUCKETS
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        """Returns a hashable key for a metric name and labels."""
+        return name, tuple(sorted((labels or {}).items()))
+
+    def increment(self, name, value=1, labels=None):
+        key = self._key(name, labels)
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        key = self._key(name, labels)
+
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = {
+                    'buckets': [0] * len(self.buckets), 'sum': 0, 'count': 0,
+                }
+
+            histogram = self._histograms[key]
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+
+    def gauge(self, name, value, labels=None):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    @staticmethod
+    def _format_labels(labels):
+        """Formats label pairs as a Prometheus label set."""
+        if not labels:
+            return ''
+
+        escaped = (
+            (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for name, value in labels
+        )
+
+        return '{{{}}}'.format(
+            ','.join('{}="{}"'.format(name, value) for name, value in escaped)
+        )
+
+    def render(self):
+        """Renders all metrics in the Prometheus text exposition format.
+
+            Returns:
+                str: The metrics text.
+        """
+        lines = []
+        types = {}
+
+        with self._lock:
+            samples = []
+
+            for (name, labels), value in self._counters.items():
+                types[name] = 'counter'
+                samples.append((name, name, labels, value))
+
+            for (name, labels), value in self._gauges.items():
+                types[name] = 'gauge'
+                samples.append((name, name, labels, value))
+
+            for (name, labels), histogram in self._histograms.items():
+                types[name] = 'histogram'
+
+                for bound, count in zip(self.buckets, histogram['buckets']):
+                    samples.append((
+                        name,
+                        '{}_bucket'.format(name),
+                        labels + (('le', repr(float(bound))),),
+                        count,
+                    ))
+
+                samples.append((
+                    name,
+                    '{}_bucket'.format(name),
+                    labels + (('le', '+Inf'),),
+                    histogram['count'],
+                ))
+                samples.append((name, '{}_sum'.format(name), labels, histogram['sum']))
+                samples.append((name, '{}_count'.format(name), labels, histogram['count']))
+
+        current_name = None
+
+        for name, sample_name, labels, value in sorted(samples, key=lambda sample: sample[0]):
+            if name != current_name:
+                lines.append('# TYPE {} {}'.format(name, types[name]))
+                current_name = name
+
+            lines.append('{}{} {}'.format(sample_name, self._format_labels(labels), value))
+
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+@lru_cache(maxsize=None)
+def get_metrics():
+    """Returns the metrics instance configured by ``DFS_METRICS_CLASS``."""
+    return getattr(
+        importlib.import_module(SETTINGS['metrics']['module']),
+        SETTINGS['metrics']['class']
+    )()
+
+
+def metrics_view(request):  # pylint: disable=unused-argument
+    """Returns the metrics in the Prometheus text exposition format.
+
+        Only available when the configured metrics class can render its
+        metrics (e.g. ``PrometheusMetrics``). The billing backlog gauges
+        are refreshed on each request, as billing runs in other
+        processes.
+    """
+    metrics = get_metrics()
+
+    if not hasattr(metrics, 'render'):
+        raise Http404('Metrics are not collected.')
+
+    Manager = getattr(  # pylint: disable=invalid-name
+        importlib.import_module(SETTINGS['management_manager']['module']),
+        SETTINGS['management_manager']['class']
+    )
+    Manager().get_backlog()
+
+    return HttpResponse(
+        metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,33 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0006_add_slugs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersubscription',
+            name='lease_holder',
+            field=models.CharField(
+                blank=True,
+                help_text='the billing worker currently processing this subscription',
+                max_length=128,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name='usersubscription',
+            name='date_lease_expires',
+            field=models.DateTimeField(
+                blank=True,
+                help_text='the date the billing worker lease expires',
+                null=True,
+                verbose_name='lease expiry date',
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0007_add_billing_leases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptiontransaction',
+            name='idempotency_key',
+            field=models.CharField(
+                blank=True,
+                help_text='a unique key for the billing period this transaction paid for',
+                max_length=128,
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:41
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0008_add_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRun',
+            fields=[
+                (
+                    'id',
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'date_started',
+                    models.DateTimeField(
+                        help_text='the datetime the run started processing subscriptions',
+                        verbose_name='start date',
+                    ),
+                ),
+                (
+                    'date_completed',
+                    models.DateTimeField(
+                        blank=True,
+                        help_text='the datetime the run finished processing subscriptions',
+                        null=True,
+                        verbose_name='completion date',
+                    ),
+                ),
+                (
+                    'phase',
+                    models.CharField(
+                        choices=[
+                            ('expired', 'expired subscriptions'),
+                            ('new', 'new subscriptions'),
+                            ('due', 'due subscriptions'),
+                        ],
+                        default='expired',
+                        help_text='the phase of processing the run is in',
+                        max_length=16,
+                    ),
+                ),
+                (
+                    'last_processed_id',
+                    models.UUIDField(
+                        blank=True,
+                        help_text='the ID of the last subscription processed in this phase',
+                        null=True,
+                        verbose_name='last processed ID',
+                    ),
+                ),
+                (
+                    'last_processed_date',
+                    models.DateTimeField(
+                        blank=True,
+                        help_text='the phase date of the last subscription processed in this phase',
+                        null=True,
+                        verbose_name='last processed date',
+                    ),
+                ),
+                (
+                    'worker_id',
+                    models.CharField(
+                        blank=True,
+                        help_text='the billing worker of the run (blank for single process runs)',
+                        max_length=128,
+                        null=True,
+                        verbose_name='worker ID',
+                    ),
+                ),
+                (
+                    'expired_count',
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text='the number of expired subscriptions processed',
+                    ),
+                ),
+                (
+                    'new_count',
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text='the number of new subscriptions processed',
+                    ),
+                ),
+                (
+                    'due_count',
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text='the number of due subscriptions processed',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ('-date_started',),
+            },
+        ),
+    ]
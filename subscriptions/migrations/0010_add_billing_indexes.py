@@ -0,0 +1,41 @@
+# Generated by Django 3.0.14 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0009_add_billing_run'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(
+                fields=['active', 'cancelled', 'date_billing_end', 'id'],
+                name='dfs_usersub_expired_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(
+                fields=['active', 'cancelled', 'date_billing_start', 'id'],
+                name='dfs_usersub_new_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(
+                fields=['active', 'cancelled', 'date_billing_next', 'id'],
+                name='dfs_usersub_due_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(
+                fields=['user', 'active'],
+                name='dfs_usersub_user_active_idx',
+            ),
+        ),
+    ]
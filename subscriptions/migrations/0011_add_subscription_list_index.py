@@ -0,0 +1,20 @@
+# Generated by Django 3.0.14 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0010_add_billing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(
+                fields=['user', 'id'],
+                name='dfs_usersub_user_id_idx',
+            ),
+        ),
+    ]
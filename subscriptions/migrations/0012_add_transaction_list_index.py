@@ -0,0 +1,20 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0011_add_subscription_list_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscriptiontransaction',
+            index=models.Index(
+                fields=['date_transaction', 'id'],
+                name='dfs_transaction_date_id_idx',
+            ),
+        ),
+    ]
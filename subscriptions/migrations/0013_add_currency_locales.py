@@ -0,0 +1,52 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+CURRENCY_LOCALE_CHOICES = [
+    ('de_de', 'de_de'),
+    ('en_au', 'en_au'),
+    ('en_ca', 'en_ca'),
+    ('en_in', 'en_in'),
+    ('en_ph', 'en_ph'),
+    ('en_us', 'en_us'),
+    ('fa_ir', 'fa_ir'),
+    ('fr_ca', 'fr_ca'),
+    ('fr_ch', 'fr_ch'),
+    ('fr_fr', 'fr_fr'),
+    ('it_it', 'it_it'),
+    ('pl_pl', 'pl_pl'),
+    ('pt_br', 'pt_br'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0012_add_transaction_list_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plancost',
+            name='currency_locale',
+            field=models.CharField(
+                blank=True,
+                choices=CURRENCY_LOCALE_CHOICES,
+                default='',
+                help_text='the currency of the cost (defaults to DFS_CURRENCY)',
+                max_length=16,
+            ),
+        ),
+        migrations.AddField(
+            model_name='subscriptiontransaction',
+            name='currency_locale',
+            field=models.CharField(
+                blank=True,
+                choices=CURRENCY_LOCALE_CHOICES,
+                default='',
+                help_text='the currency of the amount (defaults to DFS_CURRENCY)',
+                max_length=16,
+            ),
+        ),
+    ]
@@ -0,0 +1,92 @@
+"""Adds integer minor unit amounts and fills them from existing amounts."""
+# pylint: disable=invalid-name, missing-docstring
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+from subscriptions.conf import SETTINGS
+from subscriptions.currency import CURRENCY
+
+
+BATCH_SIZE = 1000
+
+
+def to_minor_units(value, currency_locale):
+    """Returns an amount in the minor units of its currency.
+
+        A copy of the conversion at the time of this migration, so
+        later changes to the models do not change the migration.
+    """
+    if currency_locale:
+        frac_digits = CURRENCY[currency_locale.lower()]['frac_digits']
+    else:
+        frac_digits = SETTINGS['currency'].conventions['frac_digits']
+
+    return int(
+        Decimal(value).scaleb(frac_digits).quantize(
+            Decimal(1), rounding=ROUND_HALF_UP,
+        )
+    )
+
+
+def fill_minor_units(model, value_field, minor_units_field):
+    """Sets the minor units of every instance of a model in batches."""
+    queryset = model.objects.exclude(**{value_field: None}).only(
+        'id', value_field, 'currency_locale'
+    )
+    batch = []
+
+    for instance in queryset.iterator(chunk_size=BATCH_SIZE):
+        setattr(instance, minor_units_field, to_minor_units(
+            getattr(instance, value_field), instance.currency_locale
+        ))
+        batch.append(instance)
+
+        if len(batch) == BATCH_SIZE:
+            model.objects.bulk_update(batch, [minor_units_field])
+            batch = []
+
+    if batch:
+        model.objects.bulk_update(batch, [minor_units_field])
+
+
+def fill_minor_units_forward(apps, schema_editor):  # pylint: disable=unused-argument
+    """Copy the decimal costs and amounts to their minor units."""
+    fill_minor_units(
+        apps.get_model('subscriptions', 'PlanCost'), 'cost', 'cost_minor_units'
+    )
+    fill_minor_units(
+        apps.get_model('subscriptions', 'SubscriptionTransaction'),
+        'amount',
+        'amount_minor_units',
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('subscriptions', '0013_add_currency_locales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plancost',
+            name='cost_minor_units',
+            field=models.BigIntegerField(
+                blank=True,
+                editable=False,
+                help_text='the cost in the minor units of its currency (e.g. cents)',
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name='subscriptiontransaction',
+            name='amount_minor_units',
+            field=models.BigIntegerField(
+                blank=True,
+                editable=False,
+                help_text='the amount in the minor units of its currency (e.g. cents)',
+                null=True,
+            ),
+        ),
+        migrations.RunPython(fill_minor_units_forward, migrations.RunPython.noop),
+    ]
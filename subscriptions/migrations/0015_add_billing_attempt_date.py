@@ -0,0 +1,23 @@
+# Generated by Django 3.0.14 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0014_add_minor_units'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersubscription',
+            name='date_billing_attempt',
+            field=models.DateTimeField(
+                blank=True,
+                help_text='the last date the billing run attempted to bill this subscription',
+                null=True,
+                verbose_name='last billing attempt date',
+            ),
+        ),
+    ]
@@ -1,5 +1,4 @@
 """Models for the Flexible Subscriptions app."""
-from datetime import timedelta
 from uuid import uuid4
 
 from django.contrib.auth import get_user_model
@@ -8,17 +7,16 @@ from django.core.validators import MinValueValidator
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from subscriptions import recurrence
+from subscriptions.conf import get_currency
+from subscriptions.currency import CURRENCY
+from subscriptions.recurrence import (  # pylint: disable=unused-import
+    ONCE, SECOND, MINUTE, HOUR, DAY, WEEK, MONTH, YEAR
+)
+
 
 # Convenience references for units for plan recurrence billing
 # ----------------------------------------------------------------------------
-ONCE = '0'
-SECOND = '1'
-MINUTE = '2'
-HOUR = '3'
-DAY = '4'
-WEEK = '5'
-MONTH = '6'
-YEAR = '7'
 RECURRENCE_UNIT_CHOICES = (
     (ONCE, 'once'),
     (SECOND, 'second'),
@@ -30,6 +28,65 @@ RECURRENCE_UNIT_CHOICES = (
     (YEAR, 'year'),
 )
 
+# Convenience references for the phases of a billing run
+# ----------------------------------------------------------------------------
+PHASE_EXPIRED = 'expired'
+PHASE_NEW = 'new'
+PHASE_DUE = 'due'
+BILLING_PHASE_CHOICES = (
+    (PHASE_EXPIRED, 'expired subscriptions'),
+    (PHASE_NEW, 'new subscriptions'),
+    (PHASE_DUE, 'due subscriptions'),
+)
+
+# Currency locales an amount may be billed in (blank uses DFS_CURRENCY)
+# ----------------------------------------------------------------------------
+CURRENCY_LOCALE_CHOICES = tuple(
+    (currency_locale, currency_locale) for currency_locale in sorted(CURRENCY)
+)
+
+
+def to_minor_units(value, currency_locale):
+    """Returns an amount in the minor units of its currency.
+
+        Parameters:
+            value (dec): The amount (may be None or '').
+            currency_locale (str): The currency locale of the amount.
+
+        Returns:
+            int: The number of minor units, or None without an amount.
+    """
+    if value is None or value == '':
+        return None
+
+    return get_currency(currency_locale).to_minor_units(value)
+
+
+def add_minor_units_field(update_fields, value_field, minor_units_field):
+    """Returns the fields to save, including the minor units if needed.
+
+        Parameters:
+            update_fields (iterable): The fields passed to ``save`` (may
+                be None to save all fields).
+            value_field (str): The field the minor units are from.
+            minor_units_field (str): The minor units field.
+
+        Returns:
+            list: The fields to save, or None to save all fields.
+    """
+    if update_fields is None:
+        return None
+
+    update_fields = list(update_fields)
+
+    if (
+            minor_units_field not in update_fields
+            and {value_field, 'currency_locale'}.intersection(update_fields)
+    ):
+        update_fields.append(minor_units_field)
+
+    return update_fields
+
 
 class PlanTag(models.Model):
     """A tag for a subscription plan."""
@@ -150,10 +207,32 @@ class PlanCost(models.Model):
         max_digits=19,
         null=True,
     )
+    currency_locale = models.CharField(
+        blank=True,
+        choices=CURRENCY_LOCALE_CHOICES,
+        default='',
+        help_text=_('the currency of the cost (defaults to DFS_CURRENCY)'),
+        max_length=16,
+    )
+    cost_minor_units = models.BigIntegerField(
+        blank=True,
+        editable=False,
+        help_text=_('the cost in the minor units of its currency (e.g. cents)'),
+        null=True,
+    )
 
     class Meta:
         ordering = ('recurrence_unit', 'recurrence_period', 'cost',)
 
+    def save(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        """Updates cost_minor_units from cost before saving."""
+        self.cost_minor_units = to_minor_units(self.cost, self.currency_locale)
+        kwargs['update_fields'] = add_minor_units_field(
+            kwargs.get('update_fields'), 'cost', 'cost_minor_units'
+        )
+
+        super().save(*args, **kwargs)
+
     @property
     def display_recurrent_unit_text(self):
         """Converts recurrence_unit integer to text."""
@@ -194,45 +273,28 @@ class PlanCost(models.Model):
             self.recurrence_period, conversion[self.recurrence_unit]['plural']
         )
 
-    def next_billing_datetime(self, current):
+    def next_billing_datetime(self, current, anchor=None):
         """Calculates next billing date for provided datetime.
 
+            Months and years are added on the calendar. If the day of
+            the month does not exist in the next billing month, the
+            last day of that month is used.
+
             Parameters:
                 current (datetime): The current datetime to compare
                     against.
+                anchor (datetime): The datetime billing started on. If
+                    provided, its day of the month is restored after a
+                    month end clamped by a shorter month for monthly
+                    and yearly plans (e.g. a subscription started on 31
+                    January is billed 28 February, then 31 March).
 
             Returns:
                 datetime: The next time billing will be due.
         """
-        if self.recurrence_unit == SECOND:
-            delta = timedelta(seconds=self.recurrence_period)
-        elif self.recurrence_unit == MINUTE:
-            delta = timedelta(minutes=self.recurrence_period)
-        elif self.recurrence_unit == HOUR:
-            delta = timedelta(hours=self.recurrence_period)
-        elif self.recurrence_unit == DAY:
-            delta = timedelta(days=self.recurrence_period)
-        elif self.recurrence_unit == WEEK:
-            delta = timedelta(weeks=self.recurrence_period)
-        elif self.recurrence_unit == MONTH:
-            # Adds the average number of days per month as per:
-            # http://en.wikipedia.org/wiki/Month#Julian_and_Gregorian_calendars
-            # This handle any issues with months < 31 days and leap years
-            delta = timedelta(
-                days=30.4368 * self.recurrence_period
-            )
-        elif self.recurrence_unit == YEAR:
-            # Adds the average number of days per year as per:
-            # http://en.wikipedia.org/wiki/Year#Calendar_year
-            # This handle any issues with leap years
-            delta = timedelta(
-                days=365.2425 * self.recurrence_period
-            )
-        else:
-            # If no recurrence period, no next billing datetime
-            return None
-
-        return current + delta
+        return recurrence.next_billing_datetime(
+            current, self.recurrence_unit, self.recurrence_period, anchor
+        )
 
 
 class UserSubscription(models.Model):
@@ -281,6 +343,12 @@ class UserSubscription(models.Model):
         null=True,
         verbose_name='next start date',
     )
+    date_billing_attempt = models.DateTimeField(
+        blank=True,
+        help_text=_('the last date the billing run attempted to bill this subscription'),
+        null=True,
+        verbose_name='last billing attempt date',
+    )
     active = models.BooleanField(
         default=True,
         help_text=_('whether this subscription is active or not'),
@@ -289,9 +357,46 @@ class UserSubscription(models.Model):
         default=False,
         help_text=_('whether this subscription is cancelled or not'),
     )
+    lease_holder = models.CharField(
+        blank=True,
+        help_text=_('the billing worker currently processing this subscription'),
+        max_length=128,
+        null=True,
+    )
+    date_lease_expires = models.DateTimeField(
+        blank=True,
+        help_text=_('the date the billing worker lease expires'),
+        null=True,
+        verbose_name='lease expiry date',
+    )
 
     class Meta:
         ordering = ('user', 'date_billing_start',)
+        indexes = [
+            # Supports the billing run phase and backlog queries
+            models.Index(
+                fields=['active', 'cancelled', 'date_billing_end', 'id'],
+                name='dfs_usersub_expired_idx',
+            ),
+            models.Index(
+                fields=['active', 'cancelled', 'date_billing_start', 'id'],
+                name='dfs_usersub_new_idx',
+            ),
+            models.Index(
+                fields=['active', 'cancelled', 'date_billing_next', 'id'],
+                name='dfs_usersub_due_idx',
+            ),
+            # Supports listing the active subscriptions of a user
+            models.Index(
+                fields=['user', 'active'],
+                name='dfs_usersub_user_active_idx',
+            ),
+            # Supports the keyset pagination of the subscription list
+            models.Index(
+                fields=['user', 'id'],
+                name='dfs_usersub_user_id_idx',
+            ),
+        ]
 
 
 class SubscriptionTransaction(models.Model):
@@ -327,9 +432,105 @@ class SubscriptionTransaction(models.Model):
         max_digits=19,
         null=True,
     )
+    currency_locale = models.CharField(
+        blank=True,
+        choices=CURRENCY_LOCALE_CHOICES,
+        default='',
+        help_text=_('the currency of the amount (defaults to DFS_CURRENCY)'),
+        max_length=16,
+    )
+    amount_minor_units = models.BigIntegerField(
+        blank=True,
+        editable=False,
+        help_text=_('the amount in the minor units of its currency (e.g. cents)'),
+        null=True,
+    )
+    idempotency_key = models.CharField(
+        blank=True,
+        help_text=_('a unique key for the billing period this transaction paid for'),
+        max_length=128,
+        null=True,
+        unique=True,
+    )
 
     class Meta:
         ordering = ('date_transaction', 'user',)
+        indexes = [
+            # Supports the keyset pagination of the transaction list
+            models.Index(
+                fields=['date_transaction', 'id'],
+                name='dfs_transaction_date_id_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        """Updates amount_minor_units from amount before saving."""
+        self.amount_minor_units = to_minor_units(self.amount, self.currency_locale)
+        kwargs['update_fields'] = add_minor_units_field(
+            kwargs.get('update_fields'), 'amount', 'amount_minor_units'
+        )
+
+        super().save(*args, **kwargs)
+
+
+class BillingRun(models.Model):
+    """Progress details of a subscription processing run."""
+    id = models.UUIDField(
+        default=uuid4,
+        editable=False,
+        primary_key=True,
+        verbose_name='ID',
+    )
+    date_started = models.DateTimeField(
+        help_text=_('the datetime the run started processing subscriptions'),
+        verbose_name='start date',
+    )
+    date_completed = models.DateTimeField(
+        blank=True,
+        help_text=_('the datetime the run finished processing subscriptions'),
+        null=True,
+        verbose_name='completion date',
+    )
+    phase = models.CharField(
+        choices=BILLING_PHASE_CHOICES,
+        default=PHASE_EXPIRED,
+        help_text=_('the phase of processing the run is in'),
+        max_length=16,
+    )
+    last_processed_id = models.UUIDField(
+        blank=True,
+        help_text=_('the ID of the last subscription processed in this phase'),
+        null=True,
+        verbose_name='last processed ID',
+    )
+    last_processed_date = models.DateTimeField(
+        blank=True,
+        help_text=_('the phase date of the last subscription processed in this phase'),
+        null=True,
+        verbose_name='last processed date',
+    )
+    worker_id = models.CharField(
+        blank=True,
+        help_text=_('the billing worker of the run (blank for single process runs)'),
+        max_length=128,
+        null=True,
+        verbose_name='worker ID',
+    )
+    expired_count = models.PositiveIntegerField(
+        default=0,
+        help_text=_('the number of expired subscriptions processed'),
+    )
+    new_count = models.PositiveIntegerField(
+        default=0,
+        help_text=_('the number of new subscriptions processed'),
+    )
+    due_count = models.PositiveIntegerField(
+        default=0,
+        help_text=_('the number of due subscriptions processed'),
+    )
+
+    class Meta:
+        ordering = ('-date_started',)
 
 
 class PlanList(models.Model):
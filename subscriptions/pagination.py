@@ -0,0 +1,289 @@
+"""Keyset pagination for the Django Flexible Subscriptions views.
+
+    Offset pagination (``LIMIT ... OFFSET``) reads and discards every
+    row before the requested page and counts the whole table, so deep
+    pages get slower as tables grow. Keyset pagination instead filters
+    on the ordering values of the last row shown (the cursor), so every
+    page is read directly from an index.
+
+    Keyset pages do not count the rows; where the database keeps table
+    statistics, an estimated count is provided instead.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from subscriptions.conf import SETTINGS
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """JSON encoder keeping the microseconds of datetimes.
+
+        ``DjangoJSONEncoder`` rounds datetimes to milliseconds, which
+        would skip or repeat rows in a datetime keyset.
+    """
+    def default(self, o):  # pylint: disable=method-hidden
+        if isinstance(o, datetime):
+            return o.isoformat()
+
+        return super().default(o)
+
+
+class KeysetPage():
+    """A page of results from a KeysetPaginator.
+
+        Attributes:
+            object_list (list): The instances on this page.
+            paginator (obj): The KeysetPaginator for this page.
+            has_next_page (bool): Whether a following page exists.
+            has_previous_page (bool): Whether a preceding page exists.
+    """
+    def __init__(self, object_list, paginator, has_next_page, has_previous_page):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next_page = has_next_page
+        self.has_previous_page = has_previous_page
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        """Returns True if a following page exists."""
+        return self.has_next_page
+
+    def has_previous(self):
+        """Returns True if a preceding page exists."""
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        """Returns True if a preceding or following page exists."""
+        return self.has_next_page or self.has_previous_page
+
+    def next_cursor(self):
+        """Returns the cursor of the page after this page."""
+        return self.paginator.encode_cursor(self.object_list[-1])
+
+    def previous_cursor(self):
+        """Returns the cursor of the page before this page."""
+        return self.paginator.encode_cursor(self.object_list[0])
+
+
+class KeysetPaginator():
+    """Paginates a queryset by the values of its ordering fields.
+
+        The ordering fields must uniquely identify each row (e.g. end
+        with the primary key), must not be null and should be covered
+        by an index.
+
+        Attributes:
+            queryset (obj): The queryset to paginate.
+            per_page (int): The number of instances per page.
+            ordering (tuple): The (ascending) field names to order and
+                paginate by.
+    """
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+
+    def encode_cursor(self, instance):
+        """Returns the cursor of the provided instance.
+
+            Parameters:
+                instance (obj): An instance from the queryset.
+
+            Returns:
+                str: The URL-safe cursor.
+        """
+        values = [getattr(instance, field) for field in self.ordering]
+
+        return base64.urlsafe_b64encode(
+            json.dumps(values, cls=CursorEncoder).encode()
+        ).decode()
+
+    def decode_cursor(self, cursor):
+        """Returns the ordering values of the provided cursor.
+
+            Parameters:
+                cursor (str): A cursor from ``encode_cursor``.
+
+            Returns:
+                list: The ordering field values.
+
+            Raises:
+                Http404: The cursor is not valid.
+        """
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except (TypeError, ValueError) as error:
+            raise Http404('Invalid page cursor.') from error
+
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise Http404('Invalid page cursor.')
+
+        return values
+
+    @cached_property
+    def estimated_count(self):
+        """Returns the estimated number of rows from table statistics.
+
+            Estimates are available for unfiltered querysets on
+            PostgreSQL and MySQL; the count is skipped (None is
+            returned) otherwise, as counting large tables is slow.
+
+            Returns:
+                int: The estimated number of rows, or None.
+        """
+        if self.queryset.query.where:
+            return None
+
+        connection = connections[self.queryset.db]
+        table = self.queryset.model._meta.db_table  # pylint: disable=protected-access
+
+        if connection.vendor == 'postgresql':
+            sql = 'SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)'
+        elif connection.vendor == 'mysql':
+            sql = (
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s'
+            )
+        else:
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+
+        # PostgreSQL reports -1 for tables that were never analyzed
+        if row is None or row[0] is None or row[0] < 0:
+            return None
+
+        return int(row[0])
+
+    def filter_after(self, values, descending=False):
+        """Returns a Q object for rows after (or before) the values.
+
+            Parameters:
+                values (list): The ordering field values.
+                descending (bool): Whether to return the rows before
+                    the values instead.
+
+            Returns:
+                obj: The Q object of the matching rows.
+        """
+        lookup = 'lt' if descending else 'gt'
+        condition = Q()
+
+        # Builds (a > x) OR (a = x AND b > y) OR ...
+        for index, field in enumerate(self.ordering):
+            equal = {
+                previous: values[position]
+                for position, previous in enumerate(self.ordering[:index])
+            }
+            condition |= Q(
+                **equal, **{'{}__{}'.format(field, lookup): values[index]}
+            )
+
+        return condition
+
+    def get_page(self, after=None, before=None, last=False):
+        """Returns a page of results.
+
+            Parameters:
+                after (str): A cursor to return the page after.
+                before (str): A cursor to return the page before.
+                last (bool): Whether to return the last page.
+
+            Returns:
+                obj: A KeysetPage instance.
+        """
+        descending = bool(before) or last
+        queryset = self.queryset.order_by(*(
+            '-{}'.format(field) if descending else field
+            for field in self.ordering
+        ))
+        cursor = before or after
+
+        if cursor:
+            try:
+                queryset = queryset.filter(
+                    self.filter_after(self.decode_cursor(cursor), descending)
+                )
+            except (TypeError, ValueError, ValidationError) as error:
+                raise Http404('Invalid page cursor.') from error
+
+        # Retrieves an extra instance to know if another page exists
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        if not object_list:
+            return KeysetPage(object_list, self, False, False)
+
+        if descending:
+            object_list.reverse()
+
+            return KeysetPage(object_list, self, bool(before), has_more)
+
+        return KeysetPage(object_list, self, has_more, bool(after))
+
+
+class KeysetPaginationMixin():
+    """Mixin for a ListView to paginate with a KeysetPaginator.
+
+        The page is selected with the ``after`` or ``before`` cursor
+        query parameters, or ``page=last`` for the last page. The
+        ``keyset_pagination`` context variable is True when keyset
+        pagination is used.
+
+        Attributes:
+            keyset_ordering (tuple): The field names to order and
+                paginate by; they must uniquely identify each row.
+            keyset_pagination (bool): Whether to paginate by keyset
+                instead of by page number. Defaults to the
+                ``DFS_KEYSET_PAGINATION`` setting when None.
+    """
+    keyset_ordering = ('pk',)
+    keyset_pagination = None
+
+    def use_keyset_pagination(self):
+        """Returns True if the view paginates by keyset."""
+        if self.keyset_pagination is None:
+            return SETTINGS['keyset_pagination']
+
+        return self.keyset_pagination
+
+    def paginate_queryset(self, queryset, page_size):
+        """Returns the keyset or page number paginated queryset."""
+        if not self.use_keyset_pagination():
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering)
+        page = paginator.get_page(
+            after=self.request.GET.get('after'),
+            before=self.request.GET.get('before'),
+            last=self.request.GET.get('page') == 'last',
+        )
+
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):  # pylint: disable=arguments-differ
+        """Adds whether keyset pagination is used to the context."""
+        context = super().get_context_data(**kwargs)
+
+        context['keyset_pagination'] = self.use_keyset_pagination()
+
+        return context
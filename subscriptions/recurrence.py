@@ -0,0 +1,137 @@
+"""Calendar arithmetic for plan recurrence billing."""
+import calendar
+from datetime import timedelta
+
+
+# Units for plan recurrence billing
+# ----------------------------------------------------------------------------
+ONCE = '0'
+SECOND = '1'
+MINUTE = '2'
+HOUR = '3'
+DAY = '4'
+WEEK = '5'
+MONTH = '6'
+YEAR = '7'
+
+# Units with a fixed length, as keyword arguments for timedelta
+FIXED_UNITS = {
+    SECOND: 'seconds',
+    MINUTE: 'minutes',
+    HOUR: 'hours',
+    DAY: 'days',
+    WEEK: 'weeks',
+}
+
+# Units that follow the calendar, as the number of months per unit
+CALENDAR_UNITS = {
+    MONTH: 1,
+    YEAR: 12,
+}
+
+
+def add_months(value, months, anchor_day=None):
+    """Adds calendar months to a datetime.
+
+        The day of the month is kept where possible. If the month is
+        too short (e.g. 31 January + 1 month), the last day of the month
+        is used instead.
+
+        Parameters:
+            value (datetime): The datetime to add months to.
+            months (int): The number of months to add.
+            anchor_day (int): The day billing started on. It is only
+                used when ``value`` was clamped to the end of a shorter
+                month (i.e. ``value`` is the last day of its month and
+                before the anchor day), so that dates such as 28
+                February return to the original day in longer months.
+                Other dates (e.g. edited billing dates) keep their day.
+
+        Returns:
+            datetime: The datetime the provided months later.
+    """
+    day = value.day
+
+    # Only restores the anchor day of a date clamped to the month end
+    if anchor_day and anchor_day > day:
+        if day == calendar.monthrange(value.year, value.month)[1]:
+            day = anchor_day
+
+    year, month = divmod(value.year * 12 + value.month - 1 + months, 12)
+    month += 1
+    day = min(day, calendar.monthrange(year, month)[1])
+
+    return value.replace(year=year, month=month, day=day)
+
+
+def recurrence_step(recurrence_unit, recurrence_period):
+    """Returns a function to advance a datetime by one recurrence.
+
+        Parameters:
+            recurrence_unit (str): The recurrence unit of the plan.
+            recurrence_period (int): The number of units per recurrence.
+
+        Returns:
+            func: A function accepting the current datetime and an
+                optional anchor datetime and returning the next
+                datetime, or None if the unit does not recur.
+    """
+    if recurrence_unit in FIXED_UNITS:
+        delta = timedelta(**{FIXED_UNITS[recurrence_unit]: recurrence_period})
+
+        return lambda current, anchor=None: current + delta
+
+    if recurrence_unit in CALENDAR_UNITS:
+        months = CALENDAR_UNITS[recurrence_unit] * recurrence_period
+
+        return lambda current, anchor=None: add_months(
+            current, months, anchor.day if anchor else None
+        )
+
+    # If no recurrence period, no next billing datetime
+    return lambda current, anchor=None: None
+
+
+def next_billing_datetime(current, recurrence_unit, recurrence_period, anchor=None):
+    """Calculates the next billing datetime of a recurrence.
+
+        Parameters:
+            current (datetime): The current billing datetime.
+            recurrence_unit (str): The recurrence unit of the plan.
+            recurrence_period (int): The number of units per recurrence.
+            anchor (datetime): The datetime billing started on; its day
+                is kept for monthly and yearly recurrences.
+
+        Returns:
+            datetime: The next time billing will be due.
+    """
+    return recurrence_step(recurrence_unit, recurrence_period)(current, anchor)
+
+
+def next_billing_datetimes(schedules):
+    """Calculates the next billing datetimes of many recurrences.
+
+        The recurrence step of each distinct plan cost unit and period
+        is only determined once, so large batches of subscriptions can
+        be advanced together.
+
+        Parameters:
+            schedules (list): Tuples of the PlanCost instance, the
+                current billing datetime and the anchor datetime (or
+                None) of each subscription.
+
+        Returns:
+            list: The next billing datetime of each schedule.
+    """
+    steps = {}
+    next_dates = []
+
+    for cost, current, anchor in schedules:
+        key = (cost.recurrence_unit, cost.recurrence_period)
+
+        if key not in steps:
+            steps[key] = recurrence_step(*key)
+
+        next_dates.append(steps[key](current, anchor))
+
+    return next_dates
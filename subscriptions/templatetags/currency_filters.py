@@ -1,13 +1,76 @@
 """Template filters for Django Flexible Subscriptions."""
 from django import template
 
-from subscriptions.conf import SETTINGS
+from subscriptions.conf import get_currency
 
 
 register = template.Library()
 
 
+def resolve_attribute(instance, attribute):
+    """Returns the value of a dotted attribute path of an instance."""
+    for name in attribute.split('.'):
+        if instance is None:
+            return None
+
+        instance = getattr(instance, name)
+
+    return instance
+
+
 @register.filter(name='currency')
-def currency(value):
-    """Displays value as a currency based on the provided settings."""
-    return SETTINGS['currency'].format_currency(value)
+def currency(value, currency_locale=None):
+    """Displays value as a currency based on the provided settings.
+
+        A currency locale may be provided to display the value in
+        another currency (e.g. ``cost.cost|currency:cost.currency_locale``).
+    """
+    return get_currency(currency_locale).format_currency(value)
+
+
+@register.filter(name='currency_list')
+def currency_list(values, currency_locale=None):
+    """Displays a list of values as currencies in one call.
+
+        Missing values (None or '') are displayed as zero.
+    """
+    return get_currency(currency_locale).format_many(
+        value or 0 for value in values
+    )
+
+
+@register.filter(name='with_currency')
+def with_currency(instances, attribute):
+    """Pairs each instance with its attribute displayed as a currency.
+
+        The attribute may be a dotted path (e.g. ``subscription.cost``)
+        and missing values are displayed as zero. Each value is shown
+        in the ``currency_locale`` of the object holding it and the
+        values of each currency are formatted in one call, for use in
+        loops::
+
+            {% for transaction, amount in transactions|with_currency:'amount' %}
+    """
+    instances = list(instances)
+    owner_path, _, name = attribute.rpartition('.')
+    positions_by_locale = {}
+    values_by_locale = {}
+
+    for position, instance in enumerate(instances):
+        owner = resolve_attribute(instance, owner_path) if owner_path else instance
+        currency_locale = getattr(owner, 'currency_locale', None) or ''
+
+        positions_by_locale.setdefault(currency_locale, []).append(position)
+        values_by_locale.setdefault(currency_locale, []).append(
+            None if owner is None else getattr(owner, name)
+        )
+
+    formatted = [None] * len(instances)
+
+    for currency_locale, positions in positions_by_locale.items():
+        values = currency_list(values_by_locale[currency_locale], currency_locale)
+
+        for position, value in zip(positions, values):
+            formatted[position] = value
+
+    return list(zip(instances, formatted))
@@ -3,11 +3,11 @@
 from copy import copy
 
 from django.contrib import messages
-from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import (
     LoginRequiredMixin, PermissionRequiredMixin
 )
 from django.contrib.messages.views import SuccessMessageMixin
+from django.db.models import Prefetch
 from django.forms import HiddenInput
 from django.forms.models import inlineformset_factory
 from django.http import HttpResponseRedirect
@@ -17,7 +17,8 @@ from django.template.response import TemplateResponse
 from django.urls import reverse_lazy
 from django.utils import timezone
 
-from subscriptions import models, forms, abstract
+from subscriptions import models, forms, abstract, metrics
+from subscriptions.pagination import KeysetPaginationMixin
 
 
 # Dashboard View
@@ -101,6 +102,7 @@ class PlanListView(PermissionRequiredMixin, abstract.ListView):
     permission_required = 'subscriptions.subscriptions'
     raise_exception = True
     context_object_name = 'plans'
+    queryset = model.objects.prefetch_related('tags', 'costs')
     template_name = 'subscriptions/plan_list.html'
 
 
@@ -332,13 +334,25 @@ class PlanDeleteView(PermissionRequiredMixin, abstract.DeleteView):
 
 # User Subscription Views
 # -----------------------------------------------------------------------------.
-class SubscriptionListView(PermissionRequiredMixin, abstract.ListView):
-    """List of all subscriptions for the users"""
-    model = get_user_model()
+class SubscriptionListView(
+        PermissionRequiredMixin, KeysetPaginationMixin, abstract.ListView
+):
+    """List of all user subscriptions.
+
+        Subscriptions are grouped by user and paginated by keyset (see
+        ``subscriptions.pagination``), so deep pages are as fast as the
+        first page. Subscriptions without a user are not listed, as
+        they cannot be compared in the keyset.
+    """
+    model = models.UserSubscription
     permission_required = 'subscriptions.subscriptions'
     raise_exception = True
-    context_object_name = 'users'
-    queryset = model.objects.all().exclude(subscriptions=None)
+    context_object_name = 'subscriptions'
+    queryset = model.objects.filter(user__isnull=False).select_related(
+        'user', 'subscription__plan'
+    )
+    keyset_ordering = ('user_id', 'id')
+    keyset_pagination = True
     paginate_by = 100
     template_name = 'subscriptions/subscription_list.html'
 
@@ -403,12 +417,20 @@ class SubscriptionDeleteView(PermissionRequiredMixin, abstract.DeleteView):
 
 # Subscription Transaction Views
 # -----------------------------------------------------------------------------
-class TransactionListView(PermissionRequiredMixin, abstract.ListView):
-    """List of all subscription payment transactions."""
+class TransactionListView(
+        PermissionRequiredMixin, KeysetPaginationMixin, abstract.ListView
+):
+    """List of all subscription payment transactions.
+
+        Paginated by keyset on the transaction date when the
+        ``DFS_KEYSET_PAGINATION`` setting is enabled.
+    """
     model = models.SubscriptionTransaction
     permission_required = 'subscriptions.subscriptions'
     raise_exception = True
     context_object_name = 'transactions'
+    queryset = model.objects.select_related('user', 'subscription__plan')
+    keyset_ordering = ('date_transaction', 'id')
     paginate_by = 50
     template_name = 'subscriptions/transaction_list.html'
 
@@ -420,6 +442,7 @@ class TransactionDetailView(PermissionRequiredMixin, abstract.DetailView):
     raise_exception = True
     context_object_name = 'transaction'
     pk_url_kwarg = 'transaction_id'
+    queryset = model.objects.select_related('user', 'subscription__plan')
     template_name = 'subscriptions/transaction_detail.html'
 
 
@@ -496,6 +519,12 @@ class PlanListDetailListView(PermissionRequiredMixin, abstract.DetailView):
     permission_required = 'subscriptions.subscriptions'
     raise_exception = True
     context_object_name = 'plan_list'
+    queryset = model.objects.prefetch_related(
+        Prefetch(
+            'plan_list_details',
+            queryset=models.PlanListDetail.objects.select_related('plan'),
+        )
+    )
     template_name = 'subscriptions/plan_list_detail_list.html'
 
 
@@ -620,7 +649,7 @@ class SubscribeList(abstract.TemplateView):
         # Retrieve the plan details for template display
         details = models.PlanListDetail.objects.filter(
             plan_list=plan_list, plan__costs__isnull=False
-        ).order_by('order')
+        ).select_related('plan').order_by('order')
 
         if plan_list:
             response = TemplateResponse(
@@ -676,6 +705,11 @@ class SubscribeView(LoginRequiredMixin, abstract.TemplateView):
     template_preview = 'subscriptions/subscribe_preview.html'
     template_confirmation = 'subscriptions/subscribe_confirmation.html'
 
+    @property
+    def metrics(self):
+        """Returns the Metrics instance to emit metrics to."""
+        return metrics.get_metrics()
+
     def get_object(self):
         """Gets the subscription plan object."""
         return get_object_or_404(
@@ -803,10 +837,16 @@ class SubscribeView(LoginRequiredMixin, abstract.TemplateView):
 
         if all([payment_form.is_valid(), plan_cost_form.is_valid()]):
             # Attempt to process payment
-            payment_transaction = self.process_payment(
-                payment_form=payment_form,
-                plan_cost_form=plan_cost_form,
-            )
+            with self.metrics.timer(metrics.PAYMENT_DURATION, {'source': 'subscribe'}):
+                payment_transaction = self.process_payment(
+                    payment_form=payment_form,
+                    plan_cost_form=plan_cost_form,
+                )
+
+            self.metrics.increment(metrics.PAYMENTS, labels={
+                'source': 'subscribe',
+                'result': 'success' if payment_transaction else 'failure',
+            })
 
             if payment_transaction:
                 # Payment successful - can handle subscription processing
@@ -819,6 +859,9 @@ class SubscribeView(LoginRequiredMixin, abstract.TemplateView):
                     subscription,
                     self.retrieve_transaction_date(payment_transaction)
                 )
+                self.metrics.increment(
+                    metrics.SUBSCRIPTIONS_CREATED, labels={'source': 'subscribe'}
+                )
 
                 return HttpResponseRedirect(
                     self.get_success_url(transaction_id=transaction.id)
@@ -922,6 +965,7 @@ class SubscribeView(LoginRequiredMixin, abstract.TemplateView):
             subscription=subscription.subscription,
             date_transaction=transaction_date,
             amount=subscription.subscription.cost,
+            currency_locale=subscription.subscription.currency_locale,
         )
 
 
@@ -933,7 +977,9 @@ class SubscribeUserList(LoginRequiredMixin, abstract.ListView):
 
     def get_queryset(self):
         """Overrides get_queryset to restrict list to logged in user."""
-        return self.model.objects.filter(user=self.request.user, active=True)
+        return self.model.objects.filter(
+            user=self.request.user, active=True
+        ).select_related('subscription__plan')
 
 
 class SubscribeThankYouView(LoginRequiredMixin, abstract.TemplateView):
@@ -49,3 +49,59 @@ def dfs():
     from . import factories  # pylint: disable=import-outside-toplevel
 
     return factories.DFS()
+
+
+@pytest.fixture
+def prometheus_metrics():
+    """Fixture that configures PrometheusMetrics as the metrics class."""
+    from unittest.mock import patch  # pylint: disable=import-outside-toplevel
+
+    from subscriptions import metrics  # pylint: disable=import-outside-toplevel
+
+    metrics.get_metrics.cache_clear()
+
+    with patch.dict(
+        metrics.SETTINGS,
+        {'metrics': {'module': 'subscriptions.metrics', 'class': 'PrometheusMetrics'}},
+    ):
+        yield metrics.get_metrics()
+
+    metrics.get_metrics.cache_clear()
+
+
+@pytest.fixture
+def assert_query_budget():
+    """Fixture to check a page makes a bounded, constant number of queries.
+
+        Returns a function accepting a client, a URL, a function that
+        adds rows to the page and the maximum number of queries. The
+        page is requested before and after the rows are added and
+        must make the same number of queries (within the budget) both
+        times, so N+1 queries fail the test.
+    """
+    from django.db import connection  # pylint: disable=import-outside-toplevel
+    from django.test.utils import CaptureQueriesContext  # pylint: disable=import-outside-toplevel
+
+    def count_queries(client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+
+        assert response.status_code == 200
+
+        return context.captured_queries
+
+    def check(client, url, add_rows, budget):
+        # Warm up any per-process caches (e.g. content types)
+        client.get(url)
+
+        before = count_queries(client, url)
+        add_rows()
+        after = count_queries(client, url)
+        queries = '\n'.join(query['sql'] for query in after)
+
+        assert len(before) == len(after), queries
+        assert len(after) <= budget, queries
+
+        return len(after)
+
+    return check
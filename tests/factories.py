@@ -185,3 +185,51 @@ class DFS:
         )
 
         return self._subscription
+
+
+# Billing subscriptions for the Manager tests
+# -----------------------------------------------------------------------------
+def create_cost(group):
+    """Creates and returns a PlanCost instance."""
+    plan = models.SubscriptionPlan.objects.create(
+        plan_name='Test Plan',
+        plan_description='This is a test plan',
+        group=group
+    )
+
+    return models.PlanCost.objects.create(
+        plan=plan, recurrence_period=1, recurrence_unit=models.MONTH, cost='1.00'
+    )
+
+
+def create_due_subscription(user, group=None):
+    """Creates a standard UserSubscription object due for billing."""
+    cost = create_cost(group)
+
+    return models.UserSubscription.objects.create(
+        user=user,
+        subscription=cost,
+        date_billing_start=datetime(2018, 1, 1, 1, 1, 1),
+        date_billing_end=None,
+        date_billing_last=datetime(2018, 1, 1, 1, 1, 1),
+        date_billing_next=datetime(2018, 2, 1, 1, 1, 1),
+        active=True,
+        cancelled=False,
+    )
+
+
+def create_expired_subscription(user, group=None, **kwargs):
+    """Creates a UserSubscription object due for expiry."""
+    details = {
+        'user': user,
+        'subscription': create_cost(group),
+        'date_billing_start': datetime(2018, 1, 1, 1, 1, 1),
+        'date_billing_end': datetime(2018, 12, 31, 1, 1, 1),
+        'date_billing_last': datetime(2018, 12, 1, 1, 1, 1),
+        'date_billing_next': None,
+        'active': True,
+        'cancelled': False,
+    }
+    details.update(kwargs)
+
+    return models.UserSubscription.objects.create(**details)
@@ -1,4 +1,6 @@
 """Tests for the conf module."""
+import pytest
+
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.test import override_settings
@@ -123,20 +125,25 @@ def test__determine_currency_settings__not_declared():
     DFS_CURRENCY='en_us',
     DFS_BASE_TEMPLATE='3',
     DFS_SUBSCRIBE_VIEW='a.b',
+    DFS_KEYSET_PAGINATION=True,
     DFS_MANAGER_CLASS='a.b',
+    DFS_METRICS_CLASS='c.d',
 )
 def test__compile_settings__assigned_properly():
     """Tests that Django settings all proper populate SETTINGS."""
     subscription_settings = conf.compile_settings()
 
-    assert len(subscription_settings) == 5
+    assert len(subscription_settings) == 7
     assert subscription_settings['enable_admin'] == 1
     assert subscription_settings['currency'].locale == 'en_us'
     assert subscription_settings['base_template'] == '3'
     assert subscription_settings['subscribe_view']['module'] == 'a'
     assert subscription_settings['subscribe_view']['class'] == 'b'
+    assert subscription_settings['keyset_pagination'] is True
     assert subscription_settings['management_manager']['module'] == 'a'
     assert subscription_settings['management_manager']['class'] == 'b'
+    assert subscription_settings['metrics']['module'] == 'c'
+    assert subscription_settings['metrics']['class'] == 'd'
 
 
 @override_settings()
@@ -147,11 +154,13 @@ def test__compile_settings__defaults():
     del settings.DFS_CURRENCY
     del settings.DFS_BASE_TEMPLATE
     del settings.DFS_SUBSCRIBE_VIEW
+    del settings.DFS_KEYSET_PAGINATION
     del settings.DFS_MANAGER_CLASS
+    del settings.DFS_METRICS_CLASS
 
     subscription_settings = conf.compile_settings()
 
-    assert len(subscription_settings) == 5
+    assert len(subscription_settings) == 7
     assert subscription_settings['enable_admin'] is False
     assert subscription_settings['currency'].locale == 'en_us'
     assert subscription_settings['base_template'] == 'subscriptions/base.html'
@@ -161,9 +170,40 @@ def test__compile_settings__defaults():
     assert subscription_settings['subscribe_view']['class'] == (
         'SubscribeView'
     )
+    assert subscription_settings['keyset_pagination'] is False
     assert subscription_settings['management_manager']['module'] == (
         'subscriptions.management.commands._manager'
     )
     assert subscription_settings['management_manager']['class'] == (
         'Manager'
     )
+    assert subscription_settings['metrics']['module'] == 'subscriptions.metrics'
+    assert subscription_settings['metrics']['class'] == 'Metrics'
+
+
+def test__get_currency__blank_returns_default():
+    """Tests the DFS_CURRENCY Currency is returned for a blank locale."""
+    assert conf.get_currency('') is conf.SETTINGS['currency']
+    assert conf.get_currency(None) is conf.SETTINGS['currency']
+
+
+def test__get_currency__default_locale_returns_default():
+    """Tests the DFS_CURRENCY Currency is returned for its own locale."""
+    currency_locale = conf.SETTINGS['currency'].locale
+
+    assert conf.get_currency(currency_locale.upper()) is conf.SETTINGS['currency']
+
+
+def test__get_currency__caches_one_currency_per_locale():
+    """Tests one Currency is built and reused for each locale."""
+    currency = conf.get_currency('fr_ca')
+
+    assert currency.locale == 'fr_ca'
+    assert conf.get_currency('FR_CA') is currency
+    assert conf.get_currency('de_de') is not currency
+
+
+def test__get_currency__invalid_locale():
+    """Tests a ValueError is raised for an unsupported locale."""
+    with pytest.raises(ValueError):
+        conf.get_currency('xx_xx')
@@ -1,6 +1,10 @@
 """Tests for the currency module."""
 # pylint: disable=protected-access, too-many-lines
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
 
 from subscriptions import currency
 
@@ -100,6 +104,59 @@ def test__currency__assign_currency_conventions__str():
     assert conventions == currency.CURRENCY['en_us']
 
 
+def test__currency__init__compiles_plans():
+    """Confirms a plan is compiled for each kind of value."""
+    test_currency = currency.Currency('en_us')
+
+    assert set(test_currency.plans) == {
+        (False, False), (False, True), (True, False), (True, True),
+    }
+    assert test_currency.plans[False, False].prefix == '$'
+    assert test_currency.plans[False, True].prefix == '($'
+    assert test_currency.plans[False, True].suffix == ')'
+    assert test_currency.plans[True, False].prefix == 'USD'
+    assert test_currency.plans[True, True].prefix == '(USD'
+
+
+def test__currency__compile_plan__details():
+    """Confirms the plan details follow the conventions."""
+    conventions = {
+        'currency_symbol': '!',
+        'int_curr_symbol': 'INT',
+        'p_cs_precedes': False,
+        'p_sep_by_space': True,
+        'mon_decimal_point': ',',
+        'mon_thousands_sep': ' ',
+        'mon_grouping': 4,
+        'frac_digits': 0,
+        'int_frac_digits': 3,
+    }
+    test_currency = currency.Currency(conventions)
+
+    local_plan = test_currency._compile_plan(False, False)
+    international_plan = test_currency._compile_plan(True, False)
+
+    assert local_plan.quantum == Decimal('1')
+    assert local_plan.decimal_point == ''
+    assert local_plan.grouping == 4
+    assert local_plan.thousands_sep == ' '
+    assert local_plan.translation is None
+    assert local_plan.prefix == ''
+    assert local_plan.suffix == ' !'
+    assert international_plan.quantum == Decimal('0.001')
+    assert international_plan.decimal_point == ','
+    assert international_plan.suffix == ' INT'
+
+
+def test__currency__compile_plan__translation_for_groups_of_3():
+    """Confirms Python grouping is translated for groups of 3."""
+    test_currency = currency.Currency('de_de')
+
+    plan = test_currency._compile_plan(False, False)
+
+    assert '1,234.56'.translate(plan.translation) == '1.234,56'
+
+
 def test__currency__determine_frac_digits__local():
     """Confirms expected locale value is returned."""
     conventions = {'frac_digits': 1, 'int_frac_digits': 2}
@@ -1178,3 +1235,192 @@ def test__currency__format_currency__output__sign_position_other_negative_follow
     test_currency = currency.Currency(conventions)
 
     assert test_currency.format_currency('-1.00') == '-1.00$'
+
+
+def test__currency__format_currency__does_not_modify_instance():
+    """Tests that formatting does not change the instance state."""
+    test_currency = currency.Currency('en_us')
+
+    test_currency.format_currency('1.00', international=True)
+
+    assert test_currency.international is False
+
+
+def test__currency__format_currency__threads_share_instance():
+    """Tests concurrent local and international formatting."""
+    test_currency = currency.Currency('en_us')
+
+    def format_value(index):
+        return test_currency.format_currency('1234.5', international=bool(index % 2))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(format_value, range(2000)))
+
+    assert results[0::2] == ['$1,234.50'] * 1000
+    assert results[1::2] == ['USD1,234.50'] * 1000
+
+
+def test__currency__format_currency__output__large_grouped_value():
+    """Tests grouping of large values with and without Python grouping."""
+    assert currency.Currency('de_de').format_currency('-1234567.891') == (
+        '(1.234.567,89 €)'
+    )
+    assert currency.Currency({
+        'mon_grouping': 2, 'mon_thousands_sep': '\'', 'frac_digits': 0,
+    }).format_currency('1234567') == "1'23'45'67"
+
+
+def test__currency__format_many__matches_format_currency():
+    """Tests that format_many gives the same output as format_currency."""
+    test_currency = currency.Currency('de_de')
+    values = [Decimal('1234.567'), '-5', 0, Decimal('1234.567'), '0.005']
+
+    for international in (False, True):
+        assert test_currency.format_many(values, international) == [
+            test_currency.format_currency(value, international)
+            for value in values
+        ]
+
+
+def test__currency__format_many__formats_repeated_values_once():
+    """Tests that repeated values are only formatted once."""
+    test_currency = currency.Currency('en_us')
+
+    with patch.object(
+        currency.Currency, '_apply_plan', wraps=currency.Currency._apply_plan
+    ) as mock_apply_plan:
+        formatted = test_currency.format_many(
+            [Decimal('9.99'), Decimal('9.99'), Decimal('-9.99'), Decimal('9.990')]
+        )
+
+    assert formatted == ['$9.99', '$9.99', '($9.99)', '$9.99']
+    assert mock_apply_plan.call_count == 2
+
+
+def test__currency__format_many__empty():
+    """Tests that no values returns an empty list."""
+    assert currency.Currency('en_us').format_many([]) == []
+
+
+def test__currency__format_currency__caches_values():
+    """Tests that repeated values are served from the cache."""
+    test_currency = currency.Currency('en_us')
+
+    assert test_currency.format_currency(Decimal('9.99')) == '$9.99'
+    assert test_currency.format_currency(Decimal('9.99')) == '$9.99'
+    assert test_currency.format_currency(Decimal('9.99'), True) == 'USD9.99'
+
+    cache_info = test_currency.cache_info()
+
+    assert cache_info.hits == 1
+    assert cache_info.misses == 2
+    assert cache_info.currsize == 2
+    assert cache_info.maxsize == 1024
+
+
+def test__currency__format_currency__cache_is_bounded():
+    """Tests that the least recently used values are evicted."""
+    test_currency = currency.Currency('en_us', cache_size=2)
+
+    for value in ['1', '2', '3', '1']:
+        test_currency.format_currency(value)
+
+    cache_info = test_currency.cache_info()
+
+    assert cache_info.hits == 0
+    assert cache_info.misses == 4
+    assert cache_info.currsize == 2
+
+
+def test__currency__format_currency__cache_disabled():
+    """Tests that a cache size of 0 disables the cache."""
+    test_currency = currency.Currency('en_us', cache_size=0)
+
+    assert test_currency.format_currency('1') == '$1.00'
+    assert test_currency.format_currency('1') == '$1.00'
+    assert test_currency.cache_info().hits == 0
+    assert test_currency.cache_info().currsize == 0
+
+
+def test__currency__cache_clear():
+    """Tests that clearing the cache resets the values and statistics."""
+    test_currency = currency.Currency('en_us')
+    test_currency.format_currency('1')
+    test_currency.format_currency('1')
+
+    test_currency.cache_clear()
+
+    assert test_currency.cache_info().hits == 0
+    assert test_currency.cache_info().currsize == 0
+
+
+def test__currency__cache_is_per_instance():
+    """Tests that each locale formats from its own cache."""
+    us_currency = currency.Currency('en_us')
+    de_currency = currency.Currency('de_de')
+
+    assert us_currency.format_currency('1') == '$1.00'
+    assert de_currency.format_currency('1') == '1,00 €'
+
+
+def test__currency__to_minor_units():
+    """Tests that values are converted to rounded minor units."""
+    test_currency = currency.Currency('en_us')
+
+    assert test_currency.to_minor_units('1234.56') == 123456
+    assert test_currency.to_minor_units(Decimal('0.005')) == 1
+    assert test_currency.to_minor_units('-0.005') == -1
+    assert currency.Currency('fa_ir').to_minor_units('1.5') == 2
+
+
+def test__currency__from_minor_units():
+    """Tests that minor units are converted back to decimals."""
+    assert currency.Currency('en_us').from_minor_units(123456) == Decimal('1234.56')
+    assert currency.Currency('fa_ir').from_minor_units(12) == Decimal('12')
+
+
+@pytest.mark.parametrize('locale, value, international, expected', [
+    ('en_us', 123456789, False, '$1,234,567.89'),
+    ('en_us', -5, False, '($0.05)'),
+    ('en_us', 0, True, 'USD0.00'),
+    ('de_de', 123456, False, '1.234,56 €'),
+    ('fa_ir', 1234567, False, '1,234,567 ﷼'),
+])
+def test__currency__format_minor_units(locale, value, international, expected):
+    """Tests that minor units are formatted like their decimal values."""
+    test_currency = currency.Currency(locale)
+
+    assert test_currency.format_minor_units(value, international) == expected
+    assert test_currency.format_currency(
+        test_currency.from_minor_units(value), international
+    ) == expected
+
+
+@pytest.mark.parametrize('value', [0, 1, 4, 5, 15, -15, 123456789, -999])
+def test__currency__format_minor_units_fewer_international_digits(value):
+    """Tests rounding when fewer international digits are displayed."""
+    test_currency = currency.Currency({
+        'currency_symbol': '$',
+        'frac_digits': 2,
+        'int_frac_digits': 1,
+        'mon_grouping': 4,
+        'mon_thousands_sep': ' ',
+    })
+
+    assert test_currency.format_minor_units(value, True) == (
+        test_currency.format_currency(test_currency.from_minor_units(value), True)
+    )
+
+
+@pytest.mark.parametrize('locale', sorted(currency.CURRENCY))
+def test__currency__format_minor_units_all_locales(locale):
+    """Tests that minor units of every locale match their decimal values."""
+    test_currency = currency.Currency(locale)
+
+    for value in (0, 5, -5, 123456789, -123456789):
+        for international in (False, True):
+            assert test_currency.format_minor_units(value, international) == (
+                test_currency.format_currency(
+                    test_currency.from_minor_units(value), international
+                )
+            )
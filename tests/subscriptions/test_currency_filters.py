@@ -1,10 +1,56 @@
 """Tests the currency_filters module."""
+from decimal import Decimal
+from types import SimpleNamespace
 from unittest.mock import patch
 
-from subscriptions.templatetags.currency_filters import currency
+from subscriptions.templatetags.currency_filters import (
+    currency, currency_list, with_currency
+)
 
 
 @patch.dict('subscriptions.conf.SETTINGS', currency_locale='en_us')
 def test_currency_filter():
     """Tests that value is properly returned as currency."""
     assert currency('1000.005') == '$1,000.01'
+
+
+@patch.dict('subscriptions.conf.SETTINGS', currency_locale='en_us')
+def test_currency_list_filter():
+    """Tests that values are returned as currencies with zero for blanks."""
+    assert currency_list(['1000.005', None, '', Decimal('-2')]) == [
+        '$1,000.01', '$0.00', '$0.00', '($2.00)'
+    ]
+
+
+@patch.dict('subscriptions.conf.SETTINGS', currency_locale='en_us')
+def test_with_currency_filter():
+    """Tests that instances are paired with their formatted attribute."""
+    first = SimpleNamespace(subscription=SimpleNamespace(cost=Decimal('5')))
+    second = SimpleNamespace(subscription=None)
+
+    assert with_currency(
+        iter([first, second]), 'subscription.cost'
+    ) == [(first, '$5.00'), (second, '$0.00')]
+
+
+def test_currency_filter_with_locale():
+    """Tests that value is returned in the provided currency locale."""
+    assert currency('1000.005', 'en_ca') == '$1,000.01'
+    assert currency('1000.005', 'de_de') == '1.000,01 €'
+
+
+def test_currency_list_filter_with_locale():
+    """Tests that values are returned in the provided currency locale."""
+    assert currency_list(['1', None], 'de_de') == ['1,00 €', '0,00 €']
+
+
+@patch.dict('subscriptions.conf.SETTINGS', currency_locale='en_us')
+def test_with_currency_filter_uses_owner_locale():
+    """Tests that values are displayed in the locale of their owner."""
+    first = SimpleNamespace(amount=Decimal('5'), currency_locale='de_de')
+    second = SimpleNamespace(amount=Decimal('6'), currency_locale='')
+    third = SimpleNamespace(amount=Decimal('7'), currency_locale='de_de')
+
+    assert with_currency([first, second, third], 'amount') == [
+        (first, '5,00 €'), (second, '$6.00'), (third, '7,00 €')
+    ]
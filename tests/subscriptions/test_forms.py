@@ -79,6 +79,18 @@ def test_subscription_plan_cost_form_proper_widget_values():
     assert choices[2][1] == '$3.00 every 3 hours'
 
 
+def test_subscription_plan_cost_form_uses_cost_currency_locale():
+    """Tests that widget values are shown in the currency of the cost."""
+    plan = create_plan()
+    cost = create_cost(plan, cost='1.00')
+    cost.currency_locale = 'de_de'
+    cost.save()
+
+    form = forms.SubscriptionPlanCostForm(subscription_plan=plan)
+
+    assert form.fields['plan_cost'].widget.choices[0][1] == '1,00 € per month'
+
+
 def test_subscription_plan_cost_form_clean_plan_cost_value():
     """Tests that clean returns PlanCost instance."""
     plan = create_plan()
@@ -0,0 +1,71 @@
+"""Tests for the billing_backlog management command."""
+import json
+from datetime import datetime
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+
+from django.core.management import call_command
+
+from subscriptions import models
+
+
+pytestmark = pytest.mark.django_db  # pylint: disable=invalid-name
+
+
+def create_subscription(user, **kwargs):
+    """Creates and returns a UserSubscription instance."""
+    plan = models.SubscriptionPlan.objects.create(plan_name='Test Plan')
+    cost = models.PlanCost.objects.create(plan=plan, cost='1.00')
+    details = {
+        'user': user,
+        'subscription': cost,
+        'date_billing_start': datetime(2018, 1, 1),
+        'active': True,
+        'cancelled': False,
+    }
+    details.update(kwargs)
+
+    return models.UserSubscription.objects.create(**details)
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 2, 1)
+)
+def test_billing_backlog_json(django_user_model):
+    """Tests that the backlog is written as JSON."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    create_subscription(user, date_billing_next=datetime(2018, 1, 1))
+    create_subscription(user, date_billing_next=datetime(2018, 1, 31))
+    create_subscription(user, date_billing_next=datetime(2018, 3, 1))
+    output = StringIO()
+
+    call_command('billing_backlog', json=True, stdout=output)
+
+    backlog = json.loads(output.getvalue())
+
+    assert backlog['due'] == {
+        'count': 2, 'oldest': '2018-01-01T00:00:00', 'age': 31 * 86400,
+    }
+    assert backlog['expired'] == {'count': 0, 'oldest': None, 'age': None}
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 2, 1)
+)
+def test_billing_backlog_table(django_user_model):
+    """Tests that the backlog is written as a table."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    create_subscription(user, active=False)
+    output = StringIO()
+
+    call_command('billing_backlog', stdout=output)
+
+    lines = output.getvalue().splitlines()
+
+    assert lines[0].split() == ['Phase', 'Waiting', 'Oldest', 'Age', 's']
+    assert lines[2].split() == ['new', '1', '2018-01-01', '00:00:00', '2678400']
+    assert lines[3].split() == ['due', '0', '-', '-']
@@ -5,43 +5,17 @@ from unittest.mock import patch
 import pytest
 
 from django.contrib.auth.models import Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from subscriptions import models
 from subscriptions.management.commands import _manager
+from tests.factories import create_cost, create_due_subscription, create_expired_subscription
 
 
 pytestmark = pytest.mark.django_db  # pylint: disable=invalid-name
 
 
-def create_cost(group):
-    """Creates and returns a PlanCost instance."""
-    plan = models.SubscriptionPlan.objects.create(
-        plan_name='Test Plan',
-        plan_description='This is a test plan',
-        group=group
-    )
-
-    return models.PlanCost.objects.create(
-        plan=plan, recurrence_period=1, recurrence_unit=models.MONTH, cost='1.00'
-    )
-
-
-def create_due_subscription(user, group=None):
-    """Creates a standard UserSubscription object due for billing."""
-    cost = create_cost(group)
-
-    return models.UserSubscription.objects.create(
-        user=user,
-        subscription=cost,
-        date_billing_start=datetime(2018, 1, 1, 1, 1, 1),
-        date_billing_end=None,
-        date_billing_last=datetime(2018, 1, 1, 1, 1, 1),
-        date_billing_next=datetime(2018, 2, 1, 1, 1, 1),
-        active=True,
-        cancelled=False,
-    )
-
-
 def test_manager_process_expired_single_group(django_user_model):
     """Tests handling expiry with user with single group."""
     user = django_user_model.objects.create_user(username='a', password='b')
@@ -167,6 +141,70 @@ def test_manager_process_expired_multiple_same_groups(django_user_model):
     assert subscription_2.cancelled is False
 
 
+def test_manager_process_expired_retains_granted_group(django_user_model):
+    """Tests that a group granted by another subscription is kept."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    group = Group.objects.create(name='test')
+    group.user_set.add(user)
+    subscription = create_expired_subscription(user, group)
+    create_expired_subscription(user, group, date_billing_end=None)
+
+    manager = _manager.Manager()
+    manager.process_expired(subscription)
+
+    assert group.user_set.filter(pk=user.pk).exists()
+
+
+def test_manager_process_expired_ignores_cancelled_subscriptions(django_user_model):
+    """Tests that cancelled subscriptions do not keep the group."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    group = Group.objects.create(name='test')
+    group.user_set.add(user)
+    subscription = create_expired_subscription(user, group)
+    create_expired_subscription(user, group, active=False, cancelled=True)
+
+    manager = _manager.Manager()
+    manager.process_expired(subscription)
+
+    assert not group.user_set.filter(pk=user.pk).exists()
+
+
+def test_manager_process_expired_batch_same_group(django_user_model):
+    """Tests that expiring all subscriptions for a group removes it."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    group = Group.objects.create(name='test')
+    group.user_set.add(user)
+    subscriptions = [create_expired_subscription(user, group) for _ in range(2)]
+
+    manager = _manager.Manager()
+    manager.process_expired_batch(subscriptions)
+
+    assert not group.user_set.filter(pk=user.pk).exists()
+    assert not models.UserSubscription.objects.filter(active=True).exists()
+
+
+def test_manager_process_expired_batch_single_update(django_user_model):
+    """Tests that a batch is expired with one update and notified."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscriptions = [create_expired_subscription(user) for _ in range(5)]
+
+    manager = _manager.Manager()
+
+    with CaptureQueriesContext(connection) as context:
+        with patch.object(manager, 'notify_expired') as notify_expired:
+            manager.process_expired_batch(subscriptions)
+
+    updates = [
+        query for query in context.captured_queries
+        if query['sql'].startswith('UPDATE')
+    ]
+
+    assert len(updates) == 1
+    assert notify_expired.call_count == 5
+    assert all(call[0][0].cancelled for call in notify_expired.call_args_list)
+    assert models.UserSubscription.objects.filter(cancelled=True).count() == 5
+
+
 def test_manager_process_new_with_group(django_user_model):
     """Tests processing of new subscription with group."""
     user = django_user_model.objects.create_user(username='a', password='b')
@@ -242,7 +280,7 @@ def test_manager_process_new_next_date(django_user_model):
     manager.process_new(subscription)
 
     subscription = models.UserSubscription.objects.get(id=subscription_id)
-    next_date = datetime(2018, 1, 31, 11, 30, 0, 520000)
+    next_date = datetime(2018, 2, 1, 1, 1, 1)
 
     assert subscription.date_billing_next == next_date
 
@@ -294,12 +332,64 @@ def test_manager_process_due_billing_dates(django_user_model):
     manager.process_due(subscription)
 
     subscription = models.UserSubscription.objects.get(id=subscription_id)
-    next_date = datetime(2018, 3, 3, 11, 30, 0, 520000)
+    next_date = datetime(2018, 3, 1, 1, 1, 1)
 
     assert subscription.date_billing_next == next_date
     assert subscription.date_billing_last == datetime(2018, 2, 1, 2, 2, 2)
 
 
+def test_manager_process_due_keeps_month_end_anchor(django_user_model):
+    """Tests that renewals return to the billing start day of month."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = models.UserSubscription.objects.create(
+        user=user,
+        subscription=create_cost(None),
+        date_billing_start=datetime(2018, 1, 31, 1, 1, 1),
+        date_billing_end=None,
+        date_billing_last=datetime(2018, 1, 31, 1, 1, 1),
+        date_billing_next=datetime(2018, 2, 28, 1, 1, 1),
+        active=True,
+        cancelled=False,
+    )
+    subscription_id = subscription.id
+
+    manager = _manager.Manager()
+    manager.process_due(subscription)
+
+    subscription = models.UserSubscription.objects.get(id=subscription_id)
+
+    assert subscription.date_billing_next == datetime(2018, 3, 31, 1, 1, 1)
+
+
+@pytest.mark.parametrize('billing_start, billing_next, expected', [
+    # Moved to 1 March by the previous fixed-length months
+    (datetime(2018, 1, 30, 1, 1, 1), datetime(2018, 3, 1, 1, 1, 1), datetime(2018, 4, 1, 1, 1, 1)),
+    # Billing date edited later in the month
+    (datetime(2018, 1, 10, 1, 1, 1), datetime(2018, 2, 25, 1, 1, 1), datetime(2018, 3, 25, 1, 1, 1)),
+])
+def test_manager_process_due_keeps_changed_billing_day(
+        django_user_model, billing_start, billing_next, expected
+):
+    """Tests that drifted or edited billing dates keep their day of month."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = models.UserSubscription.objects.create(
+        user=user,
+        subscription=create_cost(None),
+        date_billing_start=billing_start,
+        date_billing_end=None,
+        date_billing_last=billing_start,
+        date_billing_next=billing_next,
+        active=True,
+        cancelled=False,
+    )
+
+    _manager.Manager().process_due(subscription)
+
+    subscription = models.UserSubscription.objects.get(id=subscription.id)
+
+    assert subscription.date_billing_next == expected
+
+
 @patch(
     'subscriptions.management.commands._manager.Manager.process_payment',
     lambda self, **kwargs: False
@@ -432,6 +522,29 @@ def test_manager_record_transaction_without_date(django_user_model):
     assert transaction.date_transaction == datetime(2018, 1, 1, 1, 1, 1)
 
 
+def test_manager_record_transaction_copies_currency_locale(django_user_model):
+    """Tests that the transaction is recorded in the currency of the cost."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+    subscription.subscription.currency_locale = 'en_ca'
+    subscription.subscription.save()
+
+    transaction = _manager.Manager().record_transaction(subscription)
+
+    assert transaction.currency_locale == 'en_ca'
+
+
+def test_manager_build_transaction_copies_cost_minor_units(django_user_model):
+    """Tests that built transactions copy the minor units of the cost."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+
+    transaction = _manager.Manager.build_transaction(subscription)
+
+    assert transaction.amount_minor_units == subscription.subscription.cost_minor_units
+    assert transaction.amount_minor_units is not None
+
+
 def test_manager_record_transaction_with_date(django_user_model):
     """Tests handling of record_transaction with date provided."""
     transaction_count = models.SubscriptionTransaction.objects.all().count()
@@ -447,3 +560,287 @@ def test_manager_record_transaction_with_date(django_user_model):
         transaction_count + 1
     )
     assert transaction.date_transaction == transaction_date
+
+
+def test_manager_iterate_batches_respects_batch_size(django_user_model):
+    """Tests that iterate_batches yields batches of batch_size."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+
+    for _ in range(5):
+        create_due_subscription(user)
+
+    manager = _manager.Manager(batch_size=2)
+    batches = list(
+        manager.iterate_batches(models.UserSubscription.objects.all())
+    )
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+
+def test_manager_iterate_batches_keyset_order(django_user_model):
+    """Tests that iterate_batches returns every row once in pk order."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+
+    for _ in range(4):
+        create_due_subscription(user)
+
+    manager = _manager.Manager(batch_size=2)
+    ids = [
+        subscription.id
+        for batch in manager.iterate_batches(models.UserSubscription.objects.all())
+        for subscription in batch
+    ]
+
+    assert ids == sorted(
+        models.UserSubscription.objects.values_list('id', flat=True)
+    )
+
+
+def test_manager_iterate_batches_date_keyset_order(django_user_model):
+    """Tests that iterate_batches follows a (date, pk) keyset."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+
+    for day in [3, 1, 2, 1, 3, 1]:
+        subscription = create_due_subscription(user)
+        subscription.date_billing_next = datetime(2018, 2, day, 1, 1, 1)
+        subscription.save()
+
+    ordering = ('date_billing_next', 'pk')
+    manager = _manager.Manager(batch_size=2)
+    rows = [
+        (subscription.date_billing_next, subscription.id)
+        for batch in manager.iterate_batches(
+            models.UserSubscription.objects.all(), ordering=ordering
+        )
+        for subscription in batch
+    ]
+
+    assert rows == sorted(
+        models.UserSubscription.objects.values_list('date_billing_next', 'id')
+    )
+
+
+def test_manager_batch_queries_read_phase_indexes():
+    """Tests that each phase batch is read in index order without sorting."""
+    manager = _manager.Manager()
+    current = datetime(2018, 12, 2)
+
+    for phase, field, predicate in manager.get_phase_filters(current):
+        plan = manager.get_batch_queryset(
+            manager.get_phase_queryset(phase, predicate, current),
+            (field, 'pk'),
+            (current, '00000000000000000000000000000000'),
+        ).explain()
+
+        assert 'dfs_usersub_{}_idx'.format(phase) in plan
+        assert 'TEMP B-TREE' not in plan
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 12, 2)
+)
+def test_manager_process_subscriptions_multiple_batches(django_user_model):
+    """Tests that process_subscriptions processes all batches."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+
+    for _ in range(5):
+        create_due_subscription(user)
+
+    manager = _manager.Manager(batch_size=2)
+    manager.process_subscriptions()
+
+    assert models.UserSubscription.objects.filter(
+        date_billing_next=datetime(2018, 2, 1, 1, 1, 1)
+    ).count() == 0
+    assert models.SubscriptionTransaction.objects.count() == 5
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2019, 1, 1)
+)
+def test_manager_process_subscriptions_select_query_budget(django_user_model):
+    """Tests that read queries do not scale with the subscription count."""
+    group = Group.objects.create(name='test')
+
+    for i in range(5):
+        user = django_user_model.objects.create_user(username=str(i), password='b')
+        group.user_set.add(user)
+
+        # Expired subscription
+        models.UserSubscription.objects.create(
+            user=user,
+            subscription=create_cost(group),
+            date_billing_start=datetime(2018, 1, 1, 1, 1, 1),
+            date_billing_end=datetime(2018, 12, 31, 1, 1, 1),
+            date_billing_last=datetime(2018, 12, 1, 1, 1, 1),
+            date_billing_next=None,
+            active=True,
+            cancelled=False,
+        )
+
+        # New subscription
+        models.UserSubscription.objects.create(
+            user=user,
+            subscription=create_cost(None),
+            date_billing_start=datetime(2018, 12, 31, 1, 1, 1),
+            date_billing_end=None,
+            date_billing_last=None,
+            date_billing_next=None,
+            active=False,
+            cancelled=False,
+        )
+
+        # Due subscription
+        create_due_subscription(user)
+
+    manager = _manager.Manager(batch_size=10)
+
+    with CaptureQueriesContext(connection) as context:
+        manager.process_subscriptions()
+
+    select_queries = [
+        query for query in context.captured_queries
+        if query['sql'].startswith('SELECT')
+    ]
+
+    # One query per phase batch, one for the retained expiry groups and one
+    # for the billed idempotency keys of each new and due batch
+    assert len(select_queries) == 6
+
+
+def test_manager_process_due_batch_bulk_writes(django_user_model):
+    """Tests that a due batch is written with bulk queries."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscriptions = [create_due_subscription(user) for _ in range(5)]
+
+    manager = _manager.Manager()
+
+    with CaptureQueriesContext(connection) as context:
+        manager.process_due_batch(subscriptions)
+
+    write_queries = [
+        query for query in context.captured_queries
+        if query['sql'].startswith(('UPDATE', 'INSERT'))
+    ]
+
+    assert len(write_queries) == 2
+    assert models.SubscriptionTransaction.objects.count() == 5
+
+
+def test_manager_process_new_batch_calls_hooks(django_user_model):
+    """Tests that batch processing still calls the overridable hooks."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscriptions = [
+        models.UserSubscription.objects.create(
+            user=user,
+            subscription=create_cost(None),
+            date_billing_start=datetime(2018, 1, 1, 1, 1, 1),
+            active=False,
+            cancelled=False,
+        )
+        for _ in range(3)
+    ]
+    transaction_date = datetime(2018, 1, 2, 1, 1, 1)
+
+    manager = _manager.Manager()
+
+    with patch.object(manager, 'notify_new') as notify_new, patch.object(
+        manager, 'retrieve_transaction_date', return_value=transaction_date
+    ):
+        manager.process_new_batch(subscriptions)
+
+    assert notify_new.call_count == 3
+    assert models.SubscriptionTransaction.objects.filter(
+        date_transaction=transaction_date
+    ).count() == 3
+
+
+def test_manager_process_expired_batch_bulk_group_removal(django_user_model):
+    """Tests that group removals for a batch are one delete per group."""
+    groups = [Group.objects.create(name='test {}'.format(i)) for i in range(2)]
+    kept_group = Group.objects.create(name='kept')
+    subscriptions = []
+
+    for i in range(6):
+        user = django_user_model.objects.create_user(username=str(i), password='b')
+        group = groups[i % 2]
+        user.groups.add(group, kept_group)
+        subscription = create_due_subscription(user, group)
+        subscription.date_billing_end = datetime(2018, 1, 1, 1, 1, 1)
+        subscriptions.append(subscription)
+
+    manager = _manager.Manager()
+
+    with CaptureQueriesContext(connection) as queries:
+        manager.process_expired_batch(manager.get_subscriptions().filter(
+            pk__in=[subscription.pk for subscription in subscriptions]
+        ))
+
+    deletes = [
+        query for query in queries.captured_queries
+        if query['sql'].startswith('DELETE')
+    ]
+
+    assert len(deletes) == 2
+    assert not groups[0].user_set.exists()
+    assert not groups[1].user_set.exists()
+    assert kept_group.user_set.count() == 6
+
+
+def test_manager_process_new_batch_bulk_group_addition(django_user_model):
+    """Tests that group additions for a batch are a single insert."""
+    group = Group.objects.create(name='test')
+    cost = create_cost(group)
+    existing_user = django_user_model.objects.create_user(username='a', password='b')
+    existing_user.groups.add(group)
+    subscriptions = [
+        models.UserSubscription.objects.create(
+            user=user,
+            subscription=cost,
+            date_billing_start=datetime(2018, 1, 1, 1, 1, 1),
+            active=False,
+            cancelled=False,
+        )
+        for user in [existing_user] + [
+            django_user_model.objects.create_user(username=str(i), password='b')
+            for i in range(4)
+        ]
+    ]
+
+    manager = _manager.Manager()
+
+    with patch.object(
+        manager,
+        'process_charges',
+        side_effect=lambda charges: [(None, True, None)] * len(charges),
+    ):
+        with CaptureQueriesContext(connection) as queries:
+            manager.process_new_batch(subscriptions)
+
+    group_inserts = [
+        query for query in queries.captured_queries
+        if query['sql'].startswith('INSERT') and 'auth_user_groups' in query['sql']
+    ]
+
+    assert len(group_inserts) == 1
+    assert group.user_set.count() == 5
+
+
+def test_manager_process_due_batch_rolls_back_on_error(django_user_model):
+    """Tests that a failed batch write leaves subscriptions unchanged."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+
+    manager = _manager.Manager()
+
+    with patch.object(
+        models.SubscriptionTransaction.objects, 'bulk_create', side_effect=ValueError
+    ):
+        with pytest.raises(ValueError):
+            manager.process_due_batch([subscription])
+
+    subscription = models.UserSubscription.objects.get(id=subscription.id)
+
+    assert subscription.date_billing_next == datetime(2018, 2, 1, 1, 1, 1)
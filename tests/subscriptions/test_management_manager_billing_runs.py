@@ -0,0 +1,248 @@
+"""Tests for the billing runs of the _manager module."""
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from subscriptions import models
+from subscriptions.management.commands import _manager
+from tests.factories import create_cost, create_due_subscription, create_expired_subscription
+
+
+pytestmark = pytest.mark.django_db  # pylint: disable=invalid-name
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 12, 2)
+)
+def test_manager_process_subscriptions_renews_once_per_run(django_user_model):
+    """Tests that a renewal still due later in the phase is not billed again."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+
+    manager = _manager.Manager(batch_size=1)
+    manager.process_subscriptions()
+
+    subscription = models.UserSubscription.objects.get(id=subscription.id)
+
+    assert subscription.date_billing_next == datetime(2018, 3, 1, 1, 1, 1)
+    assert models.SubscriptionTransaction.objects.count() == 1
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 12, 2)
+)
+def test_manager_process_subscriptions_attempted_after(django_user_model):
+    """Tests that only subscriptions awaiting a retry are skipped."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    attempts = [
+        # Never attempted (e.g. backdated)
+        None,
+        # Declined after attempted_after
+        datetime(2018, 12, 1, 12),
+        # Declined before attempted_after
+        datetime(2018, 11, 30),
+    ]
+    subscriptions = []
+
+    for attempt in attempts:
+        subscription = create_due_subscription(user)
+        subscription.date_billing_attempt = attempt
+        subscription.save()
+        subscriptions.append(subscription)
+
+    # Renewed after attempted_after and due again since
+    renewed = create_due_subscription(user)
+    renewed.date_billing_attempt = datetime(2018, 12, 1, 12)
+    renewed.date_billing_next = datetime(2018, 12, 1, 18)
+    renewed.save()
+    subscriptions.append(renewed)
+
+    _manager.Manager().process_subscriptions(attempted_after=datetime(2018, 12, 1))
+
+    assert [
+        models.UserSubscription.objects.get(id=subscription.id).date_billing_attempt
+        for subscription in subscriptions
+    ] == [
+        datetime(2018, 12, 2),
+        datetime(2018, 12, 1, 12),
+        datetime(2018, 12, 2),
+        datetime(2018, 12, 2),
+    ]
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 12, 2)
+)
+def test_manager_process_subscriptions_calls_overridden_methods(django_user_model):
+    """Tests that overridden single subscription methods process each subscription."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscriptions = [create_due_subscription(user) for _ in range(3)]
+    processed = []
+
+    class CustomManager(_manager.Manager):
+        """Manager skipping the renewals of its due subscriptions."""
+        def process_due(self, subscription):
+            processed.append(subscription.id)
+
+    manager = CustomManager(batch_size=2)
+    manager.process_subscriptions()
+
+    assert sorted(processed) == sorted(subscription.id for subscription in subscriptions)
+    assert manager.stats.phases[-1].processed == 0
+    assert [
+        models.UserSubscription.objects.get(id=subscription.id).date_billing_attempt
+        for subscription in subscriptions
+    ] == [datetime(2018, 12, 2)] * 3
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 12, 2)
+)
+def test_manager_process_subscriptions_records_billing_run(django_user_model):
+    """Tests that process_subscriptions records a completed run."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+
+    for _ in range(3):
+        create_due_subscription(user)
+
+    manager = _manager.Manager(batch_size=2)
+    billing_run = manager.process_subscriptions()
+    billing_run = models.BillingRun.objects.get(id=billing_run.id)
+
+    assert billing_run.date_started == datetime(2018, 12, 2)
+    assert billing_run.date_completed == datetime(2018, 12, 2)
+    assert billing_run.phase == models.PHASE_DUE
+    assert billing_run.due_count == 3
+    assert billing_run.worker_id is None
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 12, 2)
+)
+def test_manager_process_subscriptions_worker_run_without_checkpoint(django_user_model):
+    """Tests that worker runs record their worker and counts but no cursor."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+
+    for _ in range(3):
+        create_due_subscription(user)
+
+    manager = _manager.Manager(worker_id='billing-1', batch_size=2)
+    billing_run = manager.process_subscriptions()
+    billing_run = models.BillingRun.objects.get(id=billing_run.id)
+
+    assert billing_run.worker_id == 'billing-1'
+    assert billing_run.due_count == 3
+    assert billing_run.last_processed_id is None
+    assert billing_run.last_processed_date is None
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 12, 2)
+)
+def test_manager_process_subscriptions_resumes_billing_run(django_user_model):
+    """Tests that a resumed run continues after the last processed row."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscriptions = sorted(
+        [create_due_subscription(user) for _ in range(3)],
+        key=lambda subscription: subscription.id,
+    )
+    billing_run = models.BillingRun.objects.create(
+        date_started=datetime(2018, 12, 1),
+        phase=models.PHASE_DUE,
+        last_processed_id=subscriptions[0].id,
+        last_processed_date=subscriptions[0].date_billing_next,
+        due_count=1,
+    )
+
+    processed = []
+    manager = _manager.Manager()
+
+    with patch.object(manager, 'process_expired_batch') as expired, patch.object(
+        manager, 'process_due_batch', side_effect=processed.extend
+    ):
+        manager.process_subscriptions(billing_run=billing_run)
+
+    assert expired.called is False
+    assert processed == subscriptions[1:]
+    assert billing_run.due_count == 3
+    assert billing_run.date_completed == datetime(2018, 12, 2)
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 12, 2)
+)
+def test_manager_process_subscriptions_stops_after_batch(django_user_model):
+    """Tests that a set stop event leaves the run incomplete."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+
+    for _ in range(3):
+        create_due_subscription(user)
+
+    manager = _manager.Manager(batch_size=1, stop_event=threading.Event())
+
+    with patch.object(
+        manager,
+        'process_due_batch',
+        side_effect=lambda batch: manager.stop_event.set(),
+    ) as process_due_batch:
+        billing_run = manager.process_subscriptions()
+
+    assert process_due_batch.call_count == 1
+    assert billing_run.due_count == 1
+    assert billing_run.date_completed is None
+
+
+def test_manager_get_next_wakeup(django_user_model):
+    """Tests that the earliest pending billing date is returned."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    create_due_subscription(user)
+    create_expired_subscription(user, date_billing_end=datetime(2018, 3, 1))
+    models.UserSubscription.objects.create(
+        user=user,
+        subscription=create_cost(None),
+        date_billing_start=datetime(2018, 1, 15),
+        active=False,
+        cancelled=False,
+    )
+    create_expired_subscription(
+        user, date_billing_end=datetime(2017, 1, 1), active=False, cancelled=True
+    )
+
+    manager = _manager.Manager()
+
+    assert manager.get_next_wakeup() == datetime(2018, 1, 15)
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 12, 2)
+)
+def test_manager_get_next_wakeup_retry_interval(django_user_model):
+    """Tests that subscriptions awaiting a retry wake up after the retry interval."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    declined = create_due_subscription(user)
+    declined.date_billing_attempt = datetime(2018, 12, 1, 12)
+    declined.save()
+    later = create_due_subscription(user)
+    later.date_billing_next = datetime(2018, 12, 5)
+    later.save()
+
+    manager = _manager.Manager()
+
+    assert manager.get_next_wakeup() == datetime(2018, 2, 1, 1, 1, 1)
+    assert manager.get_next_wakeup(retry_interval=timedelta(days=1)) == datetime(2018, 12, 2, 12)
+    assert manager.get_next_wakeup(retry_interval=timedelta(days=5)) == datetime(2018, 12, 5)
+
+
+def test_manager_get_next_wakeup_without_subscriptions():
+    """Tests that None is returned when nothing is pending."""
+    assert _manager.Manager().get_next_wakeup() is None
@@ -0,0 +1,252 @@
+"""Tests for the catch-up billing of the _manager module."""
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from subscriptions import models
+from subscriptions.management.commands import _manager
+from tests.factories import create_due_subscription
+
+
+pytestmark = pytest.mark.django_db  # pylint: disable=invalid-name
+
+
+def test_manager_build_idempotency_key(django_user_model):
+    """Tests that the idempotency key identifies the billing period."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+
+    key = _manager.Manager.build_idempotency_key(
+        subscription, datetime(2018, 2, 1, 1, 1, 1)
+    )
+
+    assert key == '{}:2018-02-01T01:01:01'.format(subscription.id)
+
+
+def test_manager_process_due_passes_idempotency_key(django_user_model):
+    """Tests that the idempotency key is passed and recorded."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+    key = '{}:2018-02-01T01:01:01'.format(subscription.id)
+
+    manager = _manager.Manager()
+
+    with patch.object(manager, 'process_payment', return_value=True) as payment:
+        manager.process_due(subscription)
+
+    assert payment.call_args[1]['idempotency_key'] == key
+    assert models.SubscriptionTransaction.objects.get().idempotency_key == key
+
+
+def test_manager_process_due_skips_billed_period(django_user_model):
+    """Tests that an already billed period is not charged again."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+    models.SubscriptionTransaction.objects.create(
+        user=user,
+        subscription=subscription.subscription,
+        date_transaction=datetime(2018, 2, 1, 1, 1, 1),
+        amount=subscription.subscription.cost,
+        idempotency_key='{}:2018-02-01T01:01:01'.format(subscription.id),
+    )
+
+    manager = _manager.Manager()
+
+    with patch.object(manager, 'process_payment', return_value=True) as payment:
+        manager.process_due(subscription)
+
+    subscription = models.UserSubscription.objects.get(id=subscription.id)
+
+    assert payment.called is False
+    assert subscription.date_billing_next > datetime(2018, 2, 1, 1, 1, 1)
+    assert models.SubscriptionTransaction.objects.count() == 1
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 6, 15)
+)
+def test_manager_process_due_without_catch_up(django_user_model):
+    """Tests that one missed period is billed per run by default."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+
+    manager = _manager.Manager()
+
+    with patch.object(manager, 'process_payment', return_value=True) as payment:
+        manager.process_due(subscription)
+
+    subscription = models.UserSubscription.objects.get(id=subscription.id)
+
+    assert payment.call_count == 1
+    assert subscription.date_billing_next == datetime(2018, 3, 1, 1, 1, 1)
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 6, 15)
+)
+def test_manager_process_due_catch_up_all(django_user_model):
+    """Tests that all missed periods are charged in one run."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+
+    manager = _manager.Manager(catch_up=_manager.CATCH_UP_ALL)
+
+    with patch.object(manager, 'process_payment', return_value=True) as payment:
+        manager.process_due(subscription)
+
+    subscription = models.UserSubscription.objects.get(id=subscription.id)
+    keys = models.SubscriptionTransaction.objects.values_list(
+        'idempotency_key', flat=True
+    )
+
+    assert payment.call_count == 5
+    assert sorted(keys) == [
+        '{}:2018-0{}-01T01:01:01'.format(subscription.id, month)
+        for month in range(2, 7)
+    ]
+    assert subscription.date_billing_next == datetime(2018, 7, 1, 1, 1, 1)
+    assert subscription.date_billing_last == datetime(2018, 6, 15)
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 6, 15)
+)
+def test_manager_process_due_catch_up_all_payment_error(django_user_model):
+    """Tests that billing stops at the first unpaid period."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+
+    def process_payment(**kwargs):
+        return not kwargs['idempotency_key'].endswith('2018-04-01T01:01:01')
+
+    manager = _manager.Manager(catch_up=_manager.CATCH_UP_ALL)
+    manager.process_payment = process_payment
+    manager.process_due(subscription)
+
+    subscription = models.UserSubscription.objects.get(id=subscription.id)
+
+    assert subscription.date_billing_next == datetime(2018, 4, 1, 1, 1, 1)
+    assert models.SubscriptionTransaction.objects.count() == 4
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 6, 15)
+)
+def test_manager_process_due_catch_up_latest(django_user_model):
+    """Tests that only the latest missed period is charged."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+
+    manager = _manager.Manager(catch_up=_manager.CATCH_UP_LATEST)
+
+    with patch.object(manager, 'process_payment', return_value=True) as payment:
+        manager.process_due(subscription)
+
+    subscription = models.UserSubscription.objects.get(id=subscription.id)
+    key = '{}:2018-06-01T01:01:01'.format(subscription.id)
+
+    assert payment.call_count == 1
+    assert payment.call_args[1]['idempotency_key'] == key
+    assert subscription.date_billing_next == datetime(2018, 7, 1, 1, 1, 1)
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 6, 15)
+)
+def test_manager_process_due_catch_up_skip(django_user_model):
+    """Tests that missed periods are skipped without charging."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+
+    manager = _manager.Manager(catch_up=_manager.CATCH_UP_SKIP)
+
+    with patch.object(manager, 'process_payment', return_value=True) as payment:
+        manager.process_due(subscription)
+
+    subscription = models.UserSubscription.objects.get(id=subscription.id)
+
+    assert payment.called is False
+    assert subscription.date_billing_next == datetime(2018, 7, 1, 1, 1, 1)
+    assert subscription.date_billing_last == datetime(2018, 1, 1, 1, 1, 1)
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 2, 15)
+)
+def test_manager_process_due_catch_up_skip_single_period(django_user_model):
+    """Tests that a single due period is still charged when skipping."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+
+    manager = _manager.Manager(catch_up=_manager.CATCH_UP_SKIP)
+
+    with patch.object(manager, 'process_payment', return_value=True) as payment:
+        manager.process_due(subscription)
+
+    assert payment.call_count == 1
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 6, 15)
+)
+def test_manager_process_due_catch_up_limit(django_user_model):
+    """Tests that catch up is limited to catch_up_limit periods."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+
+    manager = _manager.Manager(catch_up=_manager.CATCH_UP_ALL, catch_up_limit=2)
+
+    with patch.object(manager, 'process_payment', return_value=True) as payment:
+        manager.process_due(subscription)
+
+    subscription = models.UserSubscription.objects.get(id=subscription.id)
+
+    assert payment.call_count == 2
+    assert subscription.date_billing_next == datetime(2018, 4, 1, 1, 1, 1)
+
+
+def test_manager_save_batch_ignores_duplicate_keys(django_user_model):
+    """Tests that a transaction recorded by another process is ignored."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+    manager = _manager.Manager()
+    manager.record_transaction(subscription)
+    manager.build_transaction(subscription, idempotency_key='key').save()
+
+    manager.save_batch(
+        [], [], [manager.build_transaction(subscription, idempotency_key='key')]
+    )
+
+    assert models.SubscriptionTransaction.objects.filter(idempotency_key='key').count() == 1
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2019, 2, 15)
+)
+def test_manager_process_subscriptions_catch_up_skip_limit_once(django_user_model):
+    """Tests that skipped subscriptions still due are handled once per run."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscriptions = [create_due_subscription(user) for _ in range(2)]
+
+    manager = _manager.Manager(
+        catch_up=_manager.CATCH_UP_SKIP, catch_up_limit=2, batch_size=1
+    )
+    billing_run = manager.process_subscriptions()
+    due_stats = manager.stats.phases[-1]
+
+    assert (due_stats.scanned, due_stats.processed) == (2, 2)
+    assert billing_run.due_count == 2
+
+    for subscription in subscriptions:
+        subscription.refresh_from_db()
+
+        assert subscription.date_billing_next == datetime(2018, 4, 1, 1, 1, 1)
@@ -0,0 +1,125 @@
+"""Tests for the statistics and metrics of the _manager module."""
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from subscriptions import metrics, models
+from subscriptions.management.commands import _manager
+from tests.factories import create_due_subscription, create_expired_subscription
+
+
+pytestmark = pytest.mark.django_db  # pylint: disable=invalid-name
+
+
+def test_percentile():
+    """Tests nearest-rank percentiles."""
+    values = [5, 1, 4, 2, 3]
+
+    assert _manager.percentile(values, 50) == 3
+    assert _manager.percentile(values, 90) == 5
+    assert _manager.percentile(values, 0) == 1
+    assert _manager.percentile([], 50) is None
+
+
+def test_phase_stats_payment_latency_sample():
+    """Tests that the payment latency sample is bounded."""
+    phase_stats = _manager.PhaseStats(models.PHASE_DUE)
+    phase_stats.latency_sample_size = 10
+
+    for seconds in range(5):
+        phase_stats.record_payment_latency(seconds)
+
+    assert phase_stats.payment_latencies == [0, 1, 2, 3, 4]
+
+    for seconds in range(5, 1000):
+        phase_stats.record_payment_latency(seconds)
+
+    assert len(phase_stats.payment_latencies) == 10
+    assert set(phase_stats.payment_latencies) <= set(range(1000))
+    assert phase_stats.as_dict()['payment_latency']['p99'] is not None
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 12, 2)
+)
+def test_manager_process_subscriptions_records_stats(django_user_model):
+    """Tests that the statistics of each phase are recorded."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    create_expired_subscription(user, date_billing_end=datetime(2018, 12, 1))
+    subscriptions = [create_due_subscription(user) for _ in range(3)]
+    declined_key = '{}:2018-02-01T01:01:01'.format(subscriptions[0].id)
+
+    def process_payment(**kwargs):
+        return kwargs['idempotency_key'] != declined_key
+
+    manager = _manager.Manager(batch_size=2)
+    manager.process_payment = process_payment
+    manager.process_subscriptions()
+
+    expired, new, due = manager.stats.phases  # pylint: disable=unbalanced-tuple-unpacking
+
+    assert (expired.phase, expired.scanned, expired.processed) == ('expired', 1, 1)
+    # The phase checkpoint and an empty batch query
+    assert (new.scanned, new.processed, new.queries) == (0, 0, 2)
+    assert (due.scanned, due.processed) == (3, 2)
+    assert (due.payment_successes, due.payment_failures) == (2, 1)
+    assert len(due.payment_latencies) == 3
+    assert due.queries > 0
+    assert manager.stats.wall_time >= due.wall_time
+    assert manager.phase_stats is None
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 12, 2)
+)
+def test_manager_process_subscriptions_emits_metrics(django_user_model):
+    """Tests that phase and payment metrics are emitted."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+
+    for _ in range(2):
+        create_due_subscription(user)
+
+    test_metrics = metrics.PrometheusMetrics()
+    manager = _manager.Manager(metrics=test_metrics)
+    manager.process_subscriptions()
+
+    output = test_metrics.render()
+
+    assert 'dfs_billing_subscriptions_scanned_total{phase="due"} 2' in output
+    assert 'dfs_billing_subscriptions_processed_total{phase="due"} 2' in output
+    assert 'dfs_billing_phase_duration_seconds_count{phase="expired"} 1' in output
+    assert 'dfs_payments_total{result="success",source="manager"} 2' in output
+    assert 'dfs_payment_duration_seconds_count{source="manager"} 2' in output
+
+
+def test_manager_get_backlog(django_user_model):
+    """Tests the backlog counts and oldest dates of each phase."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    create_due_subscription(user)
+    create_due_subscription(user).delete()
+    create_expired_subscription(user, date_billing_end=datetime(2018, 3, 1))
+    create_expired_subscription(user, date_billing_end=datetime(2018, 5, 1))
+    create_expired_subscription(
+        user, date_billing_end=datetime(2018, 1, 1), active=False, cancelled=True
+    )
+
+    test_metrics = metrics.PrometheusMetrics()
+    manager = _manager.Manager(metrics=test_metrics)
+
+    with CaptureQueriesContext(connection) as context:
+        backlog = manager.get_backlog(current=datetime(2018, 4, 1))
+
+    assert len(context.captured_queries) == 3
+    assert backlog[models.PHASE_EXPIRED] == {
+        'count': 1, 'oldest': datetime(2018, 3, 1), 'age': 31 * 86400,
+    }
+    assert backlog[models.PHASE_NEW] == {'count': 0, 'oldest': None, 'age': None}
+    assert backlog[models.PHASE_DUE]['count'] == 1
+    assert backlog[models.PHASE_DUE]['oldest'] == datetime(2018, 2, 1, 1, 1, 1)
+    assert 'dfs_billing_backlog{phase="expired"} 1' in test_metrics.render()
@@ -0,0 +1,217 @@
+"""Tests for the worker and payment concurrency of the _manager module."""
+import asyncio
+import threading
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from subscriptions import models
+from subscriptions.management.commands import _manager
+from tests.factories import create_due_subscription
+
+
+pytestmark = pytest.mark.django_db  # pylint: disable=invalid-name
+
+
+def test_manager_process_leased_batches_skips_leased_rows(django_user_model):
+    """Tests that rows leased by another worker are not processed."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    leased = create_due_subscription(user)
+    leased.lease_holder = 'other'
+    leased.date_lease_expires = datetime(2100, 1, 1)
+    leased.save()
+    unleased = create_due_subscription(user)
+
+    processed = []
+    manager = _manager.Manager(worker_id='worker', batch_size=1)
+    manager.process_leased_batches(
+        models.UserSubscription.objects.all(), processed.extend
+    )
+
+    assert [subscription.id for subscription in processed] == [unleased.id]
+
+
+def test_manager_process_leased_batches_claims_expired_leases(django_user_model):
+    """Tests that rows with an expired lease are claimed."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscription = create_due_subscription(user)
+    subscription.lease_holder = 'other'
+    subscription.date_lease_expires = datetime(2000, 1, 1)
+    subscription.save()
+
+    lease_holders = []
+    manager = _manager.Manager(worker_id='worker')
+    manager.process_leased_batches(
+        models.UserSubscription.objects.all(),
+        lambda batch: lease_holders.extend(
+            models.UserSubscription.objects.values_list('lease_holder', flat=True)
+        )
+    )
+
+    assert lease_holders == ['worker']
+
+
+def test_manager_process_leased_batches_releases_leases(django_user_model):
+    """Tests that leases are released after a batch is processed."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    create_due_subscription(user)
+
+    manager = _manager.Manager(worker_id='worker')
+    manager.process_leased_batches(
+        models.UserSubscription.objects.all(), lambda batch: None
+    )
+
+    subscription = models.UserSubscription.objects.get()
+
+    assert subscription.lease_holder is None
+    assert subscription.date_lease_expires is None
+
+
+def test_manager_process_batches_uses_leases_without_skip_locked():
+    """Tests that leases are used when SKIP LOCKED is not supported."""
+    manager = _manager.Manager(worker_id='worker')
+
+    with patch.object(
+        connection.features, 'has_select_for_update_skip_locked', False
+    ), patch.object(manager, 'process_leased_batches') as leased:
+        manager.process_batches(models.UserSubscription.objects.all(), None)
+
+    assert leased.called
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 12, 2)
+)
+def test_manager_process_subscriptions_with_skip_locked(django_user_model):
+    """Tests processing of due subscriptions with locked batches."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+
+    for _ in range(3):
+        create_due_subscription(user)
+
+    manager = _manager.Manager(worker_id='worker', batch_size=2)
+
+    with patch.object(
+        connection.features, 'has_select_for_update_skip_locked', True
+    ):
+        manager.process_subscriptions()
+
+    assert models.SubscriptionTransaction.objects.count() == 3
+
+
+@patch(
+    'subscriptions.management.commands._manager.timezone.now',
+    lambda: datetime(2018, 12, 2)
+)
+def test_manager_process_subscriptions_with_skip_locked_without_of(django_user_model):
+    """Tests locked batches only lock subscription keys without FOR UPDATE OF."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+
+    for _ in range(3):
+        create_due_subscription(user)
+
+    manager = _manager.Manager(worker_id='worker', batch_size=2)
+
+    with patch.object(
+        connection.features, 'has_select_for_update_skip_locked', True
+    ), patch.object(connection.features, 'has_select_for_update_of', False):
+        manager.process_subscriptions()
+
+    assert models.SubscriptionTransaction.objects.count() == 3
+
+
+def test_manager_get_locked_batch_locks_keys_without_joins(django_user_model):
+    """Tests that the key query has no joins and related rows are loaded."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    subscriptions = sorted(
+        [create_due_subscription(user) for _ in range(3)],
+        key=lambda subscription: subscription.id,
+    )
+    manager = _manager.Manager(batch_size=2)
+
+    with CaptureQueriesContext(connection) as queries:
+        batch = manager.get_locked_batch(
+            manager.get_subscriptions(), ('pk',), (subscriptions[0].id,)
+        )
+
+    assert 'JOIN' not in queries[0]['sql']
+    assert batch == subscriptions[1:]
+
+    with CaptureQueriesContext(connection) as queries:
+        assert batch[0].subscription.plan.plan_name == 'Test Plan'
+
+    assert len(queries) == 0
+
+
+def test_manager_process_payments_serial():
+    """Tests that payments are processed in order by default."""
+    manager = _manager.Manager()
+
+    with patch.object(manager, 'process_payment', side_effect=lambda **kwargs: kwargs['cost']):
+        results = manager.process_payments([{'cost': 1}, {'cost': 2}, {'cost': 3}])
+
+    assert results == [1, 2, 3]
+
+
+def test_manager_process_payments_thread_pool():
+    """Tests that payments are processed concurrently in a thread pool."""
+    # Barrier only releases if all payments are in progress at once
+    barrier = threading.Barrier(3, timeout=5)
+
+    class ThreadedManager(_manager.Manager):
+        """Manager with a payment that waits on the other payments."""
+        def process_payment(self, *args, **kwargs):
+            barrier.wait()
+            return kwargs['cost']
+
+    manager = ThreadedManager(payment_workers=3)
+    results = manager.process_payments([{'cost': 1}, {'cost': 2}, {'cost': 3}])
+
+    assert results == [1, 2, 3]
+
+
+def test_manager_process_payments_async():
+    """Tests that coroutine payments are awaited with a bounded pool."""
+    in_progress = []
+    maximum_in_progress = []
+
+    class AsyncManager(_manager.Manager):
+        """Manager with an asynchronous payment method."""
+        async def process_payment(self, *args, **kwargs):  # pylint: disable=invalid-overridden-method
+            in_progress.append(kwargs['cost'])
+            maximum_in_progress.append(len(in_progress))
+            await asyncio.sleep(0.01)
+            in_progress.remove(kwargs['cost'])
+
+            return kwargs['cost']
+
+    manager = AsyncManager(payment_workers=2)
+    results = manager.process_payments([{'cost': cost} for cost in range(5)])
+
+    assert results == [0, 1, 2, 3, 4]
+    assert max(maximum_in_progress) == 2
+
+
+def test_manager_process_due_batch_async_payment(django_user_model):
+    """Tests that due batches record coroutine payment results."""
+    class AsyncManager(_manager.Manager):
+        """Manager with an asynchronous payment method."""
+        async def process_payment(self, *args, **kwargs):  # pylint: disable=invalid-overridden-method
+            return kwargs['user'].username == 'a'
+
+    user_a = django_user_model.objects.create_user(username='a', password='b')
+    user_b = django_user_model.objects.create_user(username='b', password='b')
+
+    manager = AsyncManager(payment_workers=2)
+    manager.process_due_batch([
+        create_due_subscription(user_a), create_due_subscription(user_b)
+    ])
+
+    assert list(
+        models.SubscriptionTransaction.objects.values_list('user__username', flat=True)
+    ) == ['a']
@@ -0,0 +1,276 @@
+"""Tests for the process_subscriptions management command."""
+import json
+import os
+import signal
+import threading
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from subscriptions import models
+
+
+@patch('subscriptions.management.commands._manager.Manager.process_subscriptions')
+def test_process_subscriptions_output(mock_process):
+    """Tests that the command runs the Manager and reports completion."""
+    output = StringIO()
+
+    call_command('process_subscriptions', stdout=output)
+
+    assert mock_process.called
+    assert output.getvalue() == 'Processing subscriptions... Complete!\n'
+
+
+@patch('subscriptions.management.commands._manager.Manager.__init__', return_value=None)
+@patch('subscriptions.management.commands._manager.Manager.process_subscriptions')
+def test_process_subscriptions_batch_size(mock_process, mock_init):  # pylint: disable=unused-argument
+    """Tests that the batch size option is passed to the Manager."""
+    call_command('process_subscriptions', batch_size=10, stdout=StringIO())
+
+    mock_init.assert_called_once_with(batch_size=10)
+
+
+@patch('subscriptions.management.commands._manager.Manager.__init__', return_value=None)
+@patch('subscriptions.management.commands._manager.Manager.process_subscriptions')
+def test_process_subscriptions_worker_id(mock_process, mock_init):  # pylint: disable=unused-argument
+    """Tests that the worker ID option is passed to the Manager."""
+    call_command('process_subscriptions', worker_id='worker-1', stdout=StringIO())
+
+    mock_init.assert_called_once_with(worker_id='worker-1')
+
+
+@patch('subscriptions.management.commands._manager.Manager.__init__', return_value=None)
+@patch('subscriptions.management.commands._manager.Manager.process_subscriptions')
+def test_process_subscriptions_worker_default_id(mock_process, mock_init):  # pylint: disable=unused-argument
+    """Tests that worker mode assigns a default worker ID."""
+    call_command('process_subscriptions', worker=True, stdout=StringIO())
+
+    assert mock_init.call_args[1]['worker_id']
+
+
+@patch('subscriptions.management.commands._manager.Manager.__init__', return_value=None)
+@patch('subscriptions.management.commands._manager.Manager.process_subscriptions')
+def test_process_subscriptions_payment_workers(mock_process, mock_init):  # pylint: disable=unused-argument
+    """Tests that the payment workers option is passed to the Manager."""
+    call_command('process_subscriptions', payment_workers=4, stdout=StringIO())
+
+    mock_init.assert_called_once_with(payment_workers=4)
+
+
+@patch('subscriptions.management.commands._manager.Manager.__init__', return_value=None)
+@patch('subscriptions.management.commands._manager.Manager.process_subscriptions')
+def test_process_subscriptions_catch_up(mock_process, mock_init):  # pylint: disable=unused-argument
+    """Tests that the catch up option is passed to the Manager."""
+    call_command('process_subscriptions', catch_up='latest', stdout=StringIO())
+
+    mock_init.assert_called_once_with(catch_up='latest')
+
+
+def test_process_subscriptions_catch_up_invalid():
+    """Tests that an unknown catch up policy is rejected."""
+    with pytest.raises(CommandError):
+        call_command('process_subscriptions', '--catch-up', 'some', stdout=StringIO())
+
+
+@pytest.mark.django_db
+@patch('subscriptions.management.commands._manager.Manager.process_subscriptions')
+def test_process_subscriptions_resume(mock_process):
+    """Tests that --resume passes the latest run if it is incomplete."""
+    models.BillingRun.objects.create(date_started=datetime(2018, 1, 1))
+    models.BillingRun.objects.create(
+        date_started=datetime(2018, 1, 2), date_completed=datetime(2018, 1, 2)
+    )
+    latest_run = models.BillingRun.objects.create(date_started=datetime(2018, 1, 3))
+    output = StringIO()
+
+    call_command('process_subscriptions', resume=True, stdout=output)
+
+    assert mock_process.call_args[1]['billing_run'] == latest_run
+    assert 'Resuming billing run' in output.getvalue()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('latest_run', [
+    {'date_completed': datetime(2018, 1, 2)},
+    {'worker_id': 'billing-1'},
+])
+@patch('subscriptions.management.commands._manager.Manager.process_subscriptions')
+def test_process_subscriptions_resume_skips_superseded_runs(mock_process, latest_run):
+    """Tests that --resume ignores runs older than a completed or worker run."""
+    models.BillingRun.objects.create(date_started=datetime(2018, 1, 1))
+    models.BillingRun.objects.create(date_started=datetime(2018, 1, 2), **latest_run)
+    output = StringIO()
+
+    call_command('process_subscriptions', resume=True, stdout=output)
+
+    assert mock_process.call_args[1]['billing_run'] is None
+    assert 'No incomplete billing run to resume.' in output.getvalue()
+
+
+@pytest.mark.django_db
+@patch('subscriptions.management.commands._manager.Manager.process_subscriptions')
+def test_process_subscriptions_resume_without_run(mock_process):
+    """Tests that --resume starts a new run if none is incomplete."""
+    output = StringIO()
+
+    call_command('process_subscriptions', resume=True, stdout=output)
+
+    assert mock_process.call_args[1]['billing_run'] is None
+    assert 'No incomplete billing run to resume.' in output.getvalue()
+
+
+def test_process_subscriptions_resume_with_worker():
+    """Tests that --resume cannot be combined with worker mode."""
+    with pytest.raises(CommandError):
+        call_command('process_subscriptions', resume=True, worker=True)
+
+
+@patch('subscriptions.management.commands._manager.Manager.get_next_wakeup', return_value=None)
+@patch('subscriptions.management.commands._manager.Manager.process_subscriptions')
+def test_process_subscriptions_daemon_stops_on_sigterm(mock_process, mock_wakeup):  # pylint: disable=unused-argument
+    """Tests that the daemon repeats runs until SIGTERM is received."""
+    def process_subscriptions(billing_run=None, attempted_after=None):  # pylint: disable=unused-argument
+        if mock_process.call_count == 3:
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        return models.BillingRun(date_started=datetime(2018, 1, 1))
+
+    mock_process.side_effect = process_subscriptions
+    handler = signal.getsignal(signal.SIGTERM)
+    output = StringIO()
+
+    call_command('process_subscriptions', daemon=True, max_sleep=0, stdout=output)
+
+    assert mock_process.call_count == 3
+    assert output.getvalue().endswith('Processing subscriptions... Stopped.\n')
+    assert signal.getsignal(signal.SIGTERM) == handler
+
+
+@patch(
+    'subscriptions.management.commands.process_subscriptions.timezone.now',
+    lambda: datetime(2018, 1, 1, 0, 0, 0)
+)
+@patch('subscriptions.management.commands._manager.Manager.get_next_wakeup')
+@patch('subscriptions.management.commands._manager.Manager.process_subscriptions')
+def test_process_subscriptions_daemon_sleeps_until_wakeup(mock_process, mock_wakeup):
+    """Tests that the daemon sleeps until the next subscription is due."""
+    mock_process.return_value = models.BillingRun(date_started=datetime(2018, 1, 1))
+    sleeps = []
+
+    def wait(event, timeout):
+        sleeps.append(timeout)
+
+        if len(sleeps) == 3:
+            event.set()
+
+    mock_wakeup.side_effect = [
+        datetime(2018, 1, 1, 0, 0, 30),
+        datetime(2018, 1, 1, 0, 0, 0, 1),
+        None,
+    ]
+
+    with patch.object(threading.Event, 'wait', autospec=True, side_effect=wait):
+        call_command(
+            'process_subscriptions', daemon=True, min_sleep=5, max_sleep=60,
+            stdout=StringIO(),
+        )
+
+    assert sleeps == [30, 5, 60]
+    assert mock_wakeup.call_args[1]['retry_interval'] == timedelta(days=1)
+
+
+@patch('subscriptions.management.commands._manager.Manager.get_next_wakeup', return_value=None)
+@patch('subscriptions.management.commands._manager.Manager.process_subscriptions')
+def test_process_subscriptions_daemon_retry_interval(mock_process, mock_wakeup):  # pylint: disable=unused-argument
+    """Tests that the daemon skips subscriptions attempted within the retry interval."""
+    starts = [
+        datetime(2018, 1, 1, 0, 0),
+        datetime(2018, 1, 1, 0, 5),
+        datetime(2018, 1, 1, 0, 10),
+        datetime(2018, 1, 2, 0, 1),
+    ]
+    clock = list(starts)
+    sleeps = []
+
+    def process_subscriptions(billing_run=None, attempted_after=None):  # pylint: disable=unused-argument
+        return models.BillingRun(date_started=clock[0])
+
+    def wait(event, timeout):
+        sleeps.append(timeout)
+        clock.pop(0)
+
+        if not clock:
+            event.set()
+
+    mock_process.side_effect = process_subscriptions
+
+    with patch(
+        'subscriptions.management.commands.process_subscriptions.timezone.now',
+        lambda: clock[0],
+    ), patch.object(threading.Event, 'wait', autospec=True, side_effect=wait):
+        call_command(
+            'process_subscriptions', daemon=True, max_sleep=300,
+            retry_interval=86400, stdout=StringIO(),
+        )
+
+    assert [call[1]['attempted_after'] for call in mock_process.call_args_list] == [
+        start - timedelta(days=1) for start in starts
+    ]
+    assert sleeps == [300, 300, 300, 300]
+
+
+@pytest.mark.django_db
+def test_process_subscriptions_stats_report():
+    """Tests that the statistics of each phase are reported."""
+    output = StringIO()
+
+    call_command('process_subscriptions', stdout=output)
+
+    lines = output.getvalue().splitlines()
+
+    assert lines[0] == 'Processing subscriptions... Complete!'
+    assert lines[1].split()[:3] == ['Phase', 'Scanned', 'Processed']
+    assert [line.split()[0] for line in lines[2:5]] == ['expired', 'new', 'due']
+    assert lines[5].startswith('Total time: ')
+
+
+@pytest.mark.django_db
+def test_process_subscriptions_stats_json():
+    """Tests that --json only writes the statistics as JSON."""
+    output = StringIO()
+
+    call_command('process_subscriptions', json=True, stdout=output)
+
+    stats = json.loads(output.getvalue())
+
+    assert [phase['phase'] for phase in stats['phases']] == ['expired', 'new', 'due']
+    assert stats['phases'][0]['payment_latency'] == {'p50': None, 'p90': None, 'p99': None}
+    assert stats['wall_time'] >= 0
+
+
+@pytest.mark.django_db
+def test_process_subscriptions_metrics_file(prometheus_metrics, tmp_path):  # pylint: disable=unused-argument
+    """Tests that --metrics-file writes the metrics of the command."""
+    metrics_file = tmp_path / 'dfs.prom'
+
+    call_command('process_subscriptions', metrics_file=str(metrics_file), stdout=StringIO())
+
+    assert 'dfs_billing_subscriptions_scanned_total{phase="due"} 0' in (
+        metrics_file.read_text().splitlines()
+    )
+    assert os.listdir(str(tmp_path)) == ['dfs.prom']
+
+
+def test_process_subscriptions_metrics_file_without_render(tmp_path):
+    """Tests that --metrics-file requires metrics that can be rendered."""
+    with pytest.raises(CommandError):
+        call_command(
+            'process_subscriptions',
+            metrics_file=str(tmp_path / 'dfs.prom'),
+            stdout=StringIO(),
+        )
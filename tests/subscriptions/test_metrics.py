@@ -0,0 +1,134 @@
+"""Tests for the metrics module."""
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from django.http import Http404
+from django.test import RequestFactory
+
+from subscriptions import metrics, models
+
+
+def test_metrics_discards_metrics():
+    """Tests that the default Metrics class accepts all metrics."""
+    default_metrics = metrics.Metrics()
+
+    default_metrics.increment('a')
+    default_metrics.observe('b', 1)
+    default_metrics.gauge('c', 1)
+
+    with default_metrics.timer('d'):
+        pass
+
+
+def test_metrics_timer_observes_duration():
+    """Tests that timer observes the seconds of the block."""
+    test_metrics = metrics.Metrics()
+
+    with patch.object(test_metrics, 'observe') as observe:
+        with test_metrics.timer('a', {'b': 'c'}):
+            pass
+
+    name, seconds, labels = observe.call_args[0]
+
+    assert name == 'a'
+    assert seconds >= 0
+    assert labels == {'b': 'c'}
+
+
+def test_prometheus_metrics_render_counter():
+    """Tests rendering of counters with labels."""
+    test_metrics = metrics.PrometheusMetrics()
+    test_metrics.increment('a_total', labels={'result': 'success'})
+    test_metrics.increment('a_total', 2, labels={'result': 'success'})
+    test_metrics.increment('a_total', labels={'result': 'failure'})
+
+    output = test_metrics.render()
+
+    assert output.startswith('# TYPE a_total counter\n')
+    assert 'a_total{result="success"} 3\n' in output
+    assert 'a_total{result="failure"} 1\n' in output
+
+
+def test_prometheus_metrics_render_gauge():
+    """Tests that gauges keep the latest value."""
+    test_metrics = metrics.PrometheusMetrics()
+    test_metrics.gauge('a', 5)
+    test_metrics.gauge('a', 2)
+
+    assert test_metrics.render() == '# TYPE a gauge\na 2\n'
+
+
+def test_prometheus_metrics_render_histogram():
+    """Tests rendering of cumulative histogram buckets."""
+    test_metrics = metrics.PrometheusMetrics()
+    test_metrics.buckets = (0.1, 1)
+    test_metrics.observe('a', 0.05)
+    test_metrics.observe('a', 0.5)
+    test_metrics.observe('a', 5)
+
+    assert test_metrics.render().splitlines() == [
+        '# TYPE a histogram',
+        'a_bucket{le="0.1"} 1',
+        'a_bucket{le="1.0"} 2',
+        'a_bucket{le="+Inf"} 3',
+        'a_sum 5.55',
+        'a_count 3',
+    ]
+
+
+def test_prometheus_metrics_escapes_label_values():
+    """Tests that label values are escaped."""
+    test_metrics = metrics.PrometheusMetrics()
+    test_metrics.increment('a', labels={'b': 'c"d\\e\nf'})
+
+    assert 'a{b="c\\"d\\\\e\\nf"} 1' in test_metrics.render()
+
+
+def test_prometheus_metrics_render_empty():
+    """Tests that no metrics renders an empty string."""
+    assert metrics.PrometheusMetrics().render() == ''
+
+
+def test_get_metrics_returns_configured_class(prometheus_metrics):
+    """Tests that get_metrics returns one configured instance."""
+    assert isinstance(prometheus_metrics, metrics.PrometheusMetrics)
+    assert metrics.get_metrics() is prometheus_metrics
+
+
+@pytest.mark.django_db
+def test_metrics_view(prometheus_metrics):
+    """Tests that the view renders the collected metrics."""
+    prometheus_metrics.increment('a')
+
+    response = metrics.metrics_view(RequestFactory().get('/metrics/'))
+
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+    assert response.content.decode().startswith('# TYPE a counter\na 1\n')
+
+
+@pytest.mark.django_db
+def test_metrics_view_refreshes_backlog(prometheus_metrics, django_user_model):
+    """Tests that the view measures the billing backlog on each request."""
+    plan = models.SubscriptionPlan.objects.create(plan_name='Test Plan')
+    models.UserSubscription.objects.create(
+        user=django_user_model.objects.create_user(username='a', password='b'),
+        subscription=models.PlanCost.objects.create(plan=plan, cost='1.00'),
+        date_billing_start=datetime(2018, 1, 1),
+        date_billing_next=datetime(2018, 1, 1),
+        active=True,
+        cancelled=False,
+    )
+    prometheus_metrics.gauge(metrics.BILLING_BACKLOG, 5, {'phase': 'due'})
+
+    response = metrics.metrics_view(RequestFactory().get('/metrics/'))
+
+    assert 'dfs_billing_backlog{phase="due"} 1' in response.content.decode().splitlines()
+
+
+def test_metrics_view_404_without_render():
+    """Tests that the view is unavailable for the default metrics."""
+    with pytest.raises(Http404):
+        metrics.metrics_view(RequestFactory().get('/metrics/'))
@@ -1,5 +1,7 @@
 """Tests for the models module."""
 from datetime import datetime
+from importlib import import_module
+from unittest.mock import patch
 
 import pytest
 
@@ -616,7 +618,25 @@ def test_plan_cost_next_billing_datetime_months():
     current = datetime(2018, 1, 1, 1, 1, 1)
     next_billing = cost.next_billing_datetime(current)
 
-    assert next_billing == datetime(2018, 1, 31, 11, 30, 0, 520000)
+    assert next_billing == datetime(2018, 2, 1, 1, 1, 1)
+
+
+@pytest.mark.django_db
+def test_plan_cost_next_billing_datetime_months_anchor():
+    """Tests next_billing_datetime with 'months' and an anchor date."""
+    plan = models.SubscriptionPlan.objects.create(
+        plan_name='Test Plan',
+        plan_description='This is a test plan',
+    )
+    cost = models.PlanCost.objects.create(
+        plan=plan, recurrence_period=1, recurrence_unit=models.MONTH
+    )
+    current = datetime(2018, 2, 28, 1, 1, 1)
+    next_billing = cost.next_billing_datetime(
+        current, anchor=datetime(2018, 1, 31, 1, 1, 1)
+    )
+
+    assert next_billing == datetime(2018, 3, 31, 1, 1, 1)
 
 
 @pytest.mark.django_db
@@ -632,7 +652,7 @@ def test_plan_cost_next_billing_datetime_12_months():
     current = datetime(2018, 1, 1, 1, 1, 1)
     next_billing = cost.next_billing_datetime(current)
 
-    assert next_billing == datetime(2019, 1, 1, 6, 48, 55, 240000)
+    assert next_billing == datetime(2019, 1, 1, 1, 1, 1)
 
 
 @pytest.mark.django_db
@@ -648,7 +668,7 @@ def test_plan_cost_next_billing_datetime_48_months():
     current = datetime(2018, 1, 1, 1, 1, 1)
     next_billing = cost.next_billing_datetime(current)
 
-    assert next_billing == datetime(2022, 1, 1, 0, 12, 37, 960000)
+    assert next_billing == datetime(2022, 1, 1, 1, 1, 1)
 
 
 @pytest.mark.django_db
@@ -664,7 +684,7 @@ def test_plan_cost_next_billing_datetime_years():
     current = datetime(2018, 1, 1, 1, 1, 1)
     next_billing = cost.next_billing_datetime(current)
 
-    assert next_billing == datetime(2019, 1, 1, 6, 50, 13)
+    assert next_billing == datetime(2019, 1, 1, 1, 1, 1)
 
 
 @pytest.mark.django_db
@@ -680,7 +700,7 @@ def test_plan_cost_next_billing_datetime_4_years():
     current = datetime(2018, 1, 1, 1, 1, 1)
     next_billing = cost.next_billing_datetime(current)
 
-    assert next_billing == datetime(2022, 1, 1, 0, 17, 49)
+    assert next_billing == datetime(2022, 1, 1, 1, 1, 1)
 
 
 @pytest.mark.django_db
@@ -699,6 +719,97 @@ def test_plan_cost_next_billing_datetime_once():
     assert next_billing is None
 
 
+@pytest.mark.django_db
+def test_plan_cost_save_sets_cost_minor_units():
+    """Tests that saving a cost stores it in minor units."""
+    plan = models.SubscriptionPlan.objects.create(plan_name='Test Plan')
+    cost = models.PlanCost.objects.create(plan=plan, cost='12.345')
+
+    assert cost.cost_minor_units == 1235
+
+    cost.cost = None
+    cost.save()
+
+    assert cost.cost_minor_units is None
+
+
+@pytest.mark.django_db
+def test_plan_cost_save_uses_currency_locale_minor_units():
+    """Tests that the minor units follow the currency of the cost."""
+    plan = models.SubscriptionPlan.objects.create(plan_name='Test Plan')
+    cost = models.PlanCost.objects.create(
+        plan=plan, cost='1234.56', currency_locale='fa_ir'
+    )
+
+    assert cost.cost_minor_units == 1235
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('changes, update_fields, cost_minor_units', [
+    ({'cost': '2.50'}, ['cost'], 250),
+    ({'currency_locale': 'fa_ir'}, ['currency_locale'], 1),
+    ({'cost': '2.50'}, ['cost', 'cost_minor_units'], 250),
+    ({'cost': '2.50'}, ['plan'], 100),
+])
+def test_plan_cost_save_update_fields_minor_units(changes, update_fields, cost_minor_units):
+    """Tests that the minor units are saved with the cost or currency."""
+    plan = models.SubscriptionPlan.objects.create(plan_name='Test Plan')
+    cost = models.PlanCost.objects.create(plan=plan, cost='1.00')
+
+    for field, value in changes.items():
+        setattr(cost, field, value)
+
+    cost.save(update_fields=update_fields)
+    cost.refresh_from_db()
+
+    assert cost.cost_minor_units == cost_minor_units
+
+
+# SubscriptionTransaction Model
+# -----------------------------------------------------------------------------
+@pytest.mark.django_db
+def test_subscription_transaction_save_sets_amount_minor_units():
+    """Tests that saving a transaction stores the amount in minor units."""
+    transaction = models.SubscriptionTransaction.objects.create(
+        date_transaction=datetime(2018, 1, 1, 1, 1, 1), amount='-9.99'
+    )
+
+    assert transaction.amount_minor_units == -999
+
+
+@pytest.mark.django_db
+def test_subscription_transaction_save_update_fields_minor_units():
+    """Tests that the minor units are saved with the amount."""
+    transaction = models.SubscriptionTransaction.objects.create(
+        date_transaction=datetime(2018, 1, 1, 1, 1, 1), amount='-9.99'
+    )
+    transaction.amount = '5.00'
+    transaction.save(update_fields=('amount',))
+    transaction.refresh_from_db()
+
+    assert transaction.amount_minor_units == 500
+
+
+@pytest.mark.django_db
+def test_fill_minor_units_migration():
+    """Tests that the migration fills the minor units of existing rows."""
+    migration = import_module('subscriptions.migrations.0014_add_minor_units')
+    plan = models.SubscriptionPlan.objects.create(plan_name='Test Plan')
+    models.PlanCost.objects.create(plan=plan, cost='1.00')
+    models.PlanCost.objects.create(plan=plan, cost='2.50', currency_locale='de_de')
+    models.PlanCost.objects.create(plan=plan, cost='2.50', currency_locale='fa_ir')
+    models.PlanCost.objects.create(plan=plan)
+    models.PlanCost.objects.update(cost_minor_units=None)
+
+    with patch.object(migration, 'BATCH_SIZE', 1):
+        migration.fill_minor_units(models.PlanCost, 'cost', 'cost_minor_units')
+
+    assert sorted(
+        models.PlanCost.objects.values_list('cost_minor_units', flat=True),
+        key=str,
+    ) == [100, 250, 3, None]
+
+
 # PlanList Model
 # -----------------------------------------------------------------------------
 @pytest.mark.django_db
@@ -0,0 +1,159 @@
+"""Tests for the pagination module."""
+import base64
+from unittest.mock import patch
+
+import pytest
+
+from django.http import Http404
+
+from subscriptions import models
+from subscriptions.pagination import KeysetPaginator
+
+
+pytestmark = pytest.mark.django_db  # pylint: disable=invalid-name
+
+
+def create_plan_lists():
+    """Creates plan lists with duplicate titles to test multi-field ordering."""
+    return [
+        models.PlanList.objects.create(title=title)
+        for title in ['b', 'a', 'c', 'a', 'b']
+    ]
+
+
+def create_paginator(per_page=2):
+    """Returns a paginator of plan lists ordered by title and ID."""
+    return KeysetPaginator(
+        models.PlanList.objects.all(), per_page, ('title', 'id')
+    )
+
+
+def page_values(page):
+    """Returns the (title, ID) values of a page."""
+    return [(plan_list.title, plan_list.id) for plan_list in page]
+
+
+def test_get_page_first_page():
+    """Tests the first page is returned without a cursor."""
+    plan_lists = create_plan_lists()
+
+    page = create_paginator().get_page()
+
+    assert page_values(page) == [('a', plan_lists[1].id), ('a', plan_lists[3].id)]
+    assert page.has_next() is True
+    assert page.has_previous() is False
+    assert page.has_other_pages() is True
+
+
+def test_get_page_after_cursor():
+    """Tests the page after a cursor continues from the cursor row."""
+    plan_lists = create_plan_lists()
+    paginator = create_paginator()
+
+    page = paginator.get_page(after=paginator.get_page().next_cursor())
+
+    assert page_values(page) == [('b', plan_lists[0].id), ('b', plan_lists[4].id)]
+    assert page.has_next() is True
+    assert page.has_previous() is True
+
+
+def test_get_page_before_cursor():
+    """Tests the page before a cursor returns the preceding rows."""
+    plan_lists = create_plan_lists()
+    paginator = create_paginator()
+    second = paginator.get_page(after=paginator.get_page().next_cursor())
+
+    page = paginator.get_page(before=second.previous_cursor())
+
+    assert page_values(page) == [('a', plan_lists[1].id), ('a', plan_lists[3].id)]
+    assert page.has_next() is True
+    assert page.has_previous() is False
+
+
+def test_get_page_last_page():
+    """Tests the last page returns the final rows in order."""
+    plan_lists = create_plan_lists()
+
+    page = create_paginator().get_page(last=True)
+
+    assert page_values(page) == [('b', plan_lists[4].id), ('c', plan_lists[2].id)]
+    assert page.has_next() is False
+    assert page.has_previous() is True
+
+
+def test_get_page_single_page():
+    """Tests a page with all rows has no other pages."""
+    create_plan_lists()
+
+    page = create_paginator(per_page=5).get_page()
+
+    assert len(page) == 5
+    assert page.has_other_pages() is False
+
+
+def test_get_page_past_end_is_empty():
+    """Tests a cursor past the last row returns an empty page."""
+    create_plan_lists()
+    paginator = create_paginator()
+
+    page = paginator.get_page(
+        after=paginator.get_page(last=True).next_cursor()
+    )
+
+    assert list(page) == []
+    assert page.has_other_pages() is False
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    base64.urlsafe_b64encode(b'not json').decode(),
+    base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+    base64.urlsafe_b64encode(b'{"title": "a"}').decode(),
+    base64.urlsafe_b64encode(b'["a"]').decode(),
+    base64.urlsafe_b64encode(b'["a", "not an id"]').decode(),
+])
+def test_get_page_invalid_cursor(cursor):
+    """Tests invalid cursors raise Http404."""
+    with pytest.raises(Http404):
+        create_paginator().get_page(after=cursor)
+
+
+def test_estimated_count_skipped_on_sqlite():
+    """Tests no estimate is made where table statistics are unavailable."""
+    create_plan_lists()
+
+    assert create_paginator().estimated_count is None
+
+
+def test_estimated_count_skipped_for_filtered_queryset():
+    """Tests no estimate is made for a filtered queryset."""
+    paginator = KeysetPaginator(
+        models.PlanList.objects.filter(active=True), 2, ('title', 'id')
+    )
+
+    with patch('subscriptions.pagination.connections') as mock_connections:
+        assert paginator.estimated_count is None
+
+    mock_connections.__getitem__.assert_not_called()
+
+
+@pytest.mark.parametrize('vendor, row, expected', [
+    ('postgresql', (1234.0,), 1234),
+    ('postgresql', (-1.0,), None),
+    ('postgresql', None, None),
+    ('mysql', (56,), 56),
+    ('mysql', (None,), None),
+])
+def test_estimated_count_from_table_statistics(vendor, row, expected):
+    """Tests the estimate is read from the database table statistics."""
+    paginator = create_paginator()
+
+    with patch('subscriptions.pagination.connections') as mock_connections:
+        connection = mock_connections.__getitem__.return_value
+        connection.vendor = vendor
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = row
+
+        assert paginator.estimated_count == expected
+
+    assert cursor.execute.call_args[0][1] == ['subscriptions_planlist']
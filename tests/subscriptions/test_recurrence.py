@@ -0,0 +1,127 @@
+"""Tests for the recurrence module."""
+from datetime import datetime
+from types import SimpleNamespace
+
+from subscriptions import recurrence
+
+
+def test_add_months_keeps_day_of_month():
+    """Tests that the day of the month is kept when it exists."""
+    output = recurrence.add_months(datetime(2018, 1, 15, 1, 1, 1), 1)
+
+    assert output == datetime(2018, 2, 15, 1, 1, 1)
+
+
+def test_add_months_clamps_to_month_end():
+    """Tests that short months use their last day."""
+    output = recurrence.add_months(datetime(2018, 1, 31, 1, 1, 1), 1)
+
+    assert output == datetime(2018, 2, 28, 1, 1, 1)
+
+
+def test_add_months_clamps_to_leap_day():
+    """Tests that leap years use 29 February."""
+    output = recurrence.add_months(datetime(2020, 1, 31, 1, 1, 1), 1)
+
+    assert output == datetime(2020, 2, 29, 1, 1, 1)
+
+
+def test_add_months_crosses_years():
+    """Tests adding months past the end of the year."""
+    output = recurrence.add_months(datetime(2018, 11, 30, 1, 1, 1), 3)
+
+    assert output == datetime(2019, 2, 28, 1, 1, 1)
+
+
+def test_add_months_anchor_day_restores_day():
+    """Tests that the anchor day is used in longer months."""
+    output = recurrence.add_months(datetime(2018, 2, 28, 1, 1, 1), 1, 31)
+
+    assert output == datetime(2018, 3, 31, 1, 1, 1)
+
+
+def test_add_months_anchor_day_ignored_for_drifted_date():
+    """Tests that the anchor day is not used for dates not at a month end."""
+    output = recurrence.add_months(datetime(2018, 3, 1, 1, 1, 1), 1, 30)
+
+    assert output == datetime(2018, 4, 1, 1, 1, 1)
+
+
+def test_add_months_anchor_day_ignored_for_edited_date():
+    """Tests that edited billing dates keep their own day."""
+    later = recurrence.add_months(datetime(2018, 2, 25, 1, 1, 1), 1, 10)
+    earlier = recurrence.add_months(datetime(2018, 2, 5, 1, 1, 1), 1, 10)
+
+    assert later == datetime(2018, 3, 25, 1, 1, 1)
+    assert earlier == datetime(2018, 3, 5, 1, 1, 1)
+
+
+def test_add_months_anchor_day_ignored_when_not_later():
+    """Tests that a month end after the anchor day keeps its day."""
+    output = recurrence.add_months(datetime(2018, 4, 30, 1, 1, 1), 1, 15)
+
+    assert output == datetime(2018, 5, 30, 1, 1, 1)
+
+
+def test_next_billing_datetime_years_from_leap_day():
+    """Tests that yearly plans started on a leap day clamp and return."""
+    anchor = datetime(2020, 2, 29, 1, 1, 1)
+    current = anchor
+
+    dates = []
+
+    for _ in range(4):
+        current = recurrence.next_billing_datetime(
+            current, recurrence.YEAR, 1, anchor
+        )
+        dates.append(current)
+
+    assert dates == [
+        datetime(2021, 2, 28, 1, 1, 1),
+        datetime(2022, 2, 28, 1, 1, 1),
+        datetime(2023, 2, 28, 1, 1, 1),
+        datetime(2024, 2, 29, 1, 1, 1),
+    ]
+
+
+def test_next_billing_datetime_does_not_drift():
+    """Tests that monthly renewals stay on the same day and time."""
+    anchor = datetime(2018, 1, 31, 1, 1, 1)
+    current = anchor
+
+    for _ in range(120):
+        current = recurrence.next_billing_datetime(
+            current, recurrence.MONTH, 1, anchor
+        )
+
+    assert current == datetime(2028, 1, 31, 1, 1, 1)
+
+
+def test_next_billing_datetime_once():
+    """Tests that one-time plans have no next billing datetime."""
+    output = recurrence.next_billing_datetime(
+        datetime(2018, 1, 1), recurrence.ONCE, 1
+    )
+
+    assert output is None
+
+
+def test_next_billing_datetimes():
+    """Tests that next billing datetimes are calculated per schedule."""
+    monthly = SimpleNamespace(recurrence_unit=recurrence.MONTH, recurrence_period=1)
+    weekly = SimpleNamespace(recurrence_unit=recurrence.WEEK, recurrence_period=2)
+    once = SimpleNamespace(recurrence_unit=recurrence.ONCE, recurrence_period=1)
+
+    output = recurrence.next_billing_datetimes([
+        (monthly, datetime(2018, 2, 28), datetime(2018, 1, 31)),
+        (monthly, datetime(2018, 1, 31), None),
+        (weekly, datetime(2018, 1, 1), None),
+        (once, datetime(2018, 1, 1), None),
+    ])
+
+    assert output == [
+        datetime(2018, 3, 31),
+        datetime(2018, 2, 28),
+        datetime(2018, 1, 15),
+        None,
+    ]
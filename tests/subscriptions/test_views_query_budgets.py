@@ -0,0 +1,231 @@
+"""Tests that the views make a constant number of queries.
+
+    Each page is requested with a few rows and again after more rows
+    are added; the number of queries must not change and must stay
+    within the budget of the page.
+"""
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+
+from django.contrib.auth.models import Group
+from django.urls import reverse
+from django.utils import timezone
+
+from subscriptions import models
+from subscriptions.conf import SETTINGS
+
+
+pytestmark = pytest.mark.django_db  # pylint: disable=invalid-name
+
+
+def create_plan(number, tags=2, costs=2):
+    """Creates and returns a SubscriptionPlan with tags and costs."""
+    plan = models.SubscriptionPlan.objects.create(
+        plan_name='Plan {}'.format(number),
+        group=Group.objects.create(name='Group {}'.format(number)),
+    )
+
+    for tag_number in range(tags):
+        plan.tags.add(models.PlanTag.objects.get_or_create(
+            tag='Tag {}'.format(tag_number)
+        )[0])
+
+    for cost_number in range(costs):
+        models.PlanCost.objects.create(
+            plan=plan,
+            recurrence_period=cost_number + 1,
+            recurrence_unit=models.MONTH,
+            cost='{}.99'.format(cost_number),
+        )
+
+    return plan
+
+
+def create_subscriptions(django_user_model, count, user=None):
+    """Creates subscriptions (and transactions) for users."""
+    offset = models.UserSubscription.objects.count()
+
+    for number in range(offset, offset + count):
+        cost = create_plan(number).costs.first()
+        subscriber = user or django_user_model.objects.create_user(
+            username='user_{}'.format(number)
+        )
+        models.UserSubscription.objects.create(
+            user=subscriber,
+            subscription=cost,
+            date_billing_start=timezone.now() - timedelta(days=number),
+            active=True,
+        )
+        models.SubscriptionTransaction.objects.create(
+            user=subscriber,
+            subscription=cost,
+            date_transaction=timezone.now() - timedelta(days=number),
+            amount=cost.cost,
+        )
+
+
+def create_plan_list_details(plan_list, count):
+    """Adds new plans to a plan list."""
+    offset = models.PlanListDetail.objects.count()
+
+    for number in range(offset, offset + count):
+        models.PlanListDetail.objects.create(
+            plan=create_plan('Detail {}'.format(number)),
+            plan_list=plan_list,
+            order=number,
+        )
+
+
+def test_dashboard_query_budget(admin_client, assert_query_budget):
+    """Tests the dashboard makes a constant number of queries."""
+    assert_query_budget(
+        admin_client, reverse('dfs_dashboard'), lambda: create_plan(1), 2
+    )
+
+
+def test_tag_list_query_budget(admin_client, assert_query_budget):
+    """Tests the tag list makes a constant number of queries."""
+    models.PlanTag.objects.create(tag='First')
+
+    assert_query_budget(
+        admin_client,
+        reverse('dfs_tag_list'),
+        lambda: models.PlanTag.objects.bulk_create(
+            models.PlanTag(tag='Tag {}'.format(number)) for number in range(5)
+        ),
+        3,
+    )
+
+
+def test_plan_list_query_budget(admin_client, assert_query_budget):
+    """Tests the plan list makes a constant number of queries."""
+    create_plan(0)
+
+    assert_query_budget(
+        admin_client,
+        reverse('dfs_plan_list'),
+        lambda: [create_plan(number, tags=5) for number in range(1, 6)],
+        5,
+    )
+
+
+def test_subscription_list_query_budget(
+        admin_client, django_user_model, assert_query_budget
+):
+    """Tests the subscription list makes a constant number of queries."""
+    create_subscriptions(django_user_model, 1)
+
+    assert_query_budget(
+        admin_client,
+        reverse('dfs_subscription_list'),
+        lambda: create_subscriptions(django_user_model, 5),
+        3,
+    )
+
+
+def test_transaction_list_query_budget(
+        admin_client, django_user_model, assert_query_budget
+):
+    """Tests the transaction list makes a constant number of queries."""
+    create_subscriptions(django_user_model, 1)
+
+    assert_query_budget(
+        admin_client,
+        reverse('dfs_transaction_list'),
+        lambda: create_subscriptions(django_user_model, 5),
+        4,
+    )
+
+
+def test_transaction_list_keyset_query_budget(
+        admin_client, django_user_model, assert_query_budget
+):
+    """Tests the keyset paginated transaction list makes constant queries."""
+    create_subscriptions(django_user_model, 1)
+
+    with patch.dict(SETTINGS, {'keyset_pagination': True}):
+        assert_query_budget(
+            admin_client,
+            reverse('dfs_transaction_list'),
+            lambda: create_subscriptions(django_user_model, 5),
+            3,
+        )
+
+
+def test_transaction_detail_query_budget(
+        admin_client, django_user_model, assert_query_budget
+):
+    """Tests the transaction detail makes a constant number of queries."""
+    create_subscriptions(django_user_model, 1)
+    transaction = models.SubscriptionTransaction.objects.first()
+
+    assert_query_budget(
+        admin_client,
+        reverse(
+            'dfs_transaction_detail',
+            kwargs={'transaction_id': transaction.id}
+        ),
+        lambda: create_subscriptions(django_user_model, 5),
+        3,
+    )
+
+
+def test_plan_list_list_query_budget(admin_client, assert_query_budget):
+    """Tests the plan list list makes a constant number of queries."""
+    models.PlanList.objects.create(title='First')
+
+    assert_query_budget(
+        admin_client,
+        reverse('dfs_plan_list_list'),
+        lambda: [
+            models.PlanList.objects.create(title='List {}'.format(number))
+            for number in range(5)
+        ],
+        3,
+    )
+
+
+def test_plan_list_detail_list_query_budget(admin_client, assert_query_budget):
+    """Tests the plan list detail list makes a constant number of queries."""
+    plan_list = models.PlanList.objects.create(title='List')
+    create_plan_list_details(plan_list, 1)
+
+    assert_query_budget(
+        admin_client,
+        reverse(
+            'dfs_plan_list_detail_list', kwargs={'plan_list_id': plan_list.id}
+        ),
+        lambda: create_plan_list_details(plan_list, 5),
+        4,
+    )
+
+
+def test_subscribe_list_query_budget(client, assert_query_budget):
+    """Tests the subscribe list makes a constant number of queries."""
+    plan_list = models.PlanList.objects.create(title='List', active=True)
+    create_plan_list_details(plan_list, 1)
+
+    assert_query_budget(
+        client,
+        reverse('dfs_subscribe_list'),
+        lambda: create_plan_list_details(plan_list, 5),
+        2,
+    )
+
+
+def test_subscribe_user_list_query_budget(
+        client, django_user_model, assert_query_budget
+):
+    """Tests the user subscription list makes a constant number of queries."""
+    user = django_user_model.objects.create_user(username='subscriber')
+    client.force_login(user)
+    create_subscriptions(django_user_model, 1, user=user)
+
+    assert_query_budget(
+        client,
+        reverse('dfs_subscribe_user_list'),
+        lambda: create_subscriptions(django_user_model, 5, user=user),
+        3,
+    )
@@ -10,7 +10,7 @@ from django.forms import HiddenInput
 from django.urls import reverse
 from django.utils import timezone
 
-from subscriptions import models, views, forms
+from subscriptions import metrics, models, views, forms
 
 
 pytestmark = pytest.mark.django_db  # pylint: disable=invalid-name
@@ -496,6 +496,35 @@ def test_subscribe_view_post_confirm_payment_error(admin_client, dfs):
     assert messages[0].message == 'Error processing payment'
 
 
+def test_subscribe_view_post_process_emits_metrics(admin_client, dfs):
+    """Tests that processing a subscription emits payment metrics."""
+    post_data = {
+        'action': 'process',
+        'plan_id': dfs.plan.id,
+        'plan_cost': dfs.cost.id,
+        'cardholder_name': 'a',
+        'card_number': '1111222233334444',
+        'card_expiry_month': '1',
+        'card_expiry_year': '2050',
+        'card_cvv': '100',
+        'address_name': 'a',
+        'address_line_1': 'b',
+        'address_city': 'c',
+        'address_province': 'd',
+        'address_country': 'e',
+    }
+    test_metrics = metrics.PrometheusMetrics()
+
+    with patch('subscriptions.metrics.get_metrics', return_value=test_metrics):
+        admin_client.post(reverse('dfs_subscribe_add'), post_data)
+
+    output = test_metrics.render()
+
+    assert 'dfs_payments_total{result="success",source="subscribe"} 1' in output
+    assert 'dfs_payment_duration_seconds_count{source="subscribe"} 1' in output
+    assert 'dfs_subscriptions_created_total{source="subscribe"} 1' in output
+
+
 def test_subscribe_view_post_process_200_response(admin_client, dfs):
     """Tests post returns 200 response on process request."""
     post_data = {
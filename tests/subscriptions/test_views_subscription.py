@@ -1,4 +1,6 @@
 """Tests for the django-flexible-subscriptions UserSubscription views."""
+from unittest.mock import patch
+
 import pytest
 
 from django.contrib.auth.models import Permission
@@ -92,10 +94,79 @@ def test_subscription_list_retrives_all_users(admin_client, django_user_model):
 
     response = admin_client.get(reverse('dfs_subscription_list'))
 
-    assert len(response.context['users']) == 3
-    assert response.context['users'][0].username == 'user_1'
-    assert response.context['users'][1].username == 'user_2'
-    assert response.context['users'][2].username == 'user_3'
+    assert len(response.context['subscriptions']) == 3
+    assert response.context['subscriptions'][0].user.username == 'user_1'
+    assert response.context['subscriptions'][1].user.username == 'user_2'
+    assert response.context['subscriptions'][2].user.username == 'user_3'
+
+
+@pytest.mark.django_db
+def test_subscription_list_pages_by_cursor(admin_client, django_user_model):
+    """Tests that the list view pages through subscriptions by cursor."""
+    cost = create_cost(plan=create_plan())
+
+    for number in range(5):
+        user = django_user_model.objects.create_user(
+            username='user_{}'.format(number)
+        )
+        create_subscription(user, cost)
+
+    url = reverse('dfs_subscription_list')
+
+    with patch('subscriptions.views.SubscriptionListView.paginate_by', 2):
+        first = admin_client.get(url)
+        second = admin_client.get(url, {
+            'after': first.context['page_obj'].next_cursor()
+        })
+        last = admin_client.get(url, {'page': 'last'})
+
+    assert [
+        subscription.user.username for subscription in first.context['subscriptions']
+    ] == ['user_0', 'user_1']
+    assert [
+        subscription.user.username for subscription in second.context['subscriptions']
+    ] == ['user_2', 'user_3']
+    assert second.context['page_obj'].has_previous()
+    assert second.context['page_obj'].has_next()
+    assert [
+        subscription.user.username for subscription in last.context['subscriptions']
+    ] == ['user_3', 'user_4']
+    assert not last.context['page_obj'].has_next()
+
+
+@pytest.mark.django_db
+def test_subscription_list_skips_subscriptions_without_user(
+        admin_client, django_user_model
+):
+    """Tests that subscriptions without a user do not break paging."""
+    cost = create_cost(plan=create_plan())
+    user = django_user_model.objects.create_user(username='user_0')
+    create_subscription(user, cost)
+
+    for _ in range(3):
+        create_subscription(None, cost)
+
+    url = reverse('dfs_subscription_list')
+
+    with patch('subscriptions.views.SubscriptionListView.paginate_by', 2):
+        first = admin_client.get(url)
+        last = admin_client.get(url, {'page': 'last'})
+
+    assert [
+        subscription.user for subscription in first.context['subscriptions']
+    ] == [user]
+    assert not first.context['page_obj'].has_next()
+    assert last.status_code == 200
+
+
+@pytest.mark.django_db
+def test_subscription_list_404_on_invalid_cursor(admin_client):
+    """Tests that an invalid cursor returns a 404 response."""
+    response = admin_client.get(
+        reverse('dfs_subscription_list'), {'after': 'invalid'}
+    )
+
+    assert response.status_code == 404
 
 
 # SubscriptionCreateView
@@ -1,5 +1,7 @@
 """Tests for the django-flexible-subscriptions PlanTag views."""
 from decimal import Decimal
+from unittest.mock import patch
+
 import pytest
 
 from django.contrib.auth.models import Permission
@@ -8,6 +10,7 @@ from django.urls import reverse
 from django.utils import timezone
 
 from subscriptions import models
+from subscriptions.conf import SETTINGS
 
 
 def create_plan(plan_name='1', plan_description='2'):
@@ -94,6 +97,50 @@ def test_transaction_list_retrives_all(admin_client, django_user_model):
     assert response.context['transactions'][2].amount == Decimal('3.0000')
 
 
+@pytest.mark.django_db
+def test_transaction_list_pages_by_number_by_default(admin_client):
+    """Tests that the list view uses page number pagination by default."""
+    response = admin_client.get(reverse('dfs_transaction_list'))
+
+    assert response.context['keyset_pagination'] is False
+    assert 'subscriptions/snippets/pagination.html' in [
+        t.name for t in response.templates
+    ]
+
+
+@pytest.mark.django_db
+def test_transaction_list_pages_by_cursor_when_enabled(
+        admin_client, django_user_model
+):
+    """Tests that the list view pages by cursor with keyset pagination."""
+    user = django_user_model.objects.create_user(username='a', password='b')
+    cost = create_cost(plan=create_plan())
+
+    for amount in ['1.00', '2.00', '3.00']:
+        create_transaction(user, cost, amount)
+
+    url = reverse('dfs_transaction_list')
+
+    with patch.dict(SETTINGS, {'keyset_pagination': True}):
+        with patch('subscriptions.views.TransactionListView.paginate_by', 2):
+            first = admin_client.get(url)
+            second = admin_client.get(url, {
+                'after': first.context['page_obj'].next_cursor()
+            })
+
+    assert first.context['keyset_pagination'] is True
+    assert 'subscriptions/snippets/keyset_pagination.html' in [
+        t.name for t in first.templates
+    ]
+    assert [
+        transaction.amount for transaction in first.context['transactions']
+    ] == [Decimal('1.0000'), Decimal('2.0000')]
+    assert [
+        transaction.amount for transaction in second.context['transactions']
+    ] == [Decimal('3.0000')]
+    assert not second.context['page_obj'].has_next()
+
+
 # TransactionDetailView
 # -----------------------------------------------------------------------------
 @pytest.mark.django_db